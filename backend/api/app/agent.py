@@ -1,8 +1,9 @@
-from app.constant import OPENAI_API_KEY
+from app.cache import TTLCache
+from app.constant import OPENAI_API_KEY, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECONDS
 from langchain_core.messages import SystemMessage
 from langgraph.graph import MessagesState
 from langchain_openai import ChatOpenAI
-from app.repository import fetch_docs, MATERIAL_STORE
+from app.repository import fetch_docs, normalize_query, MATERIAL_STORE
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from typing import List
@@ -10,6 +11,9 @@ from langchain_core.messages import AIMessage
 
 llm = ChatOpenAI(model="gpt-4o", openai_api_key=OPENAI_API_KEY)
 
+# Serialized retrieve results by (normalized query, knowledge-base version)
+RETRIEVAL_CACHE = TTLCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL_SECONDS)
+
 class CitedAnswer(BaseModel):
     """Answer the user question based only on the given sources, and cite the sources used."""
     answer: str = Field(
@@ -28,12 +32,14 @@ class CitedAnswer(BaseModel):
 @tool
 def retrieve(query: str):
     """Retrieve information related to a query."""
-    retrieved_docs = fetch_docs(query)
-    serialized = "\n\n".join([
-        f"Source: {doc.metadata['source']}\nInformation: {doc.page_content}"
-        for doc in retrieved_docs
-    ])
-    return serialized
+    def serialize() -> str:
+        retrieved_docs = fetch_docs(query)
+        return "\n\n".join([
+            f"Source: {doc.metadata['source']}\nInformation: {doc.page_content}"
+            for doc in retrieved_docs
+        ])
+    # A new version after any material change keys fresh entries, so results are never stale
+    return RETRIEVAL_CACHE.get_or_set((normalize_query(query), MATERIAL_STORE.version), serialize)
 
 def query_or_respond(state: MessagesState):
     llm_with_tools = llm.bind_tools([retrieve])
@@ -1,4 +1,5 @@
 from app.clients.db import CONVERSATION_DB
+from app.clients.async_db import ASYNC_CONVERSATION_DB
 from app.clients.vector_store import VECTOR_STORE
 
-__all__ = ['CONVERSATION_DB', 'VECTOR_STORE'] 
\ No newline at end of file
+__all__ = ['CONVERSATION_DB', 'ASYNC_CONVERSATION_DB', 'VECTOR_STORE'] 
\ No newline at end of file
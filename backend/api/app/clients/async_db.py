@@ -0,0 +1,65 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+from app.clients.db import ConversationDB, CONVERSATION_DB
+from app.constant import ANALYTICS_MAX_READERS, DB_EXECUTOR_WORKERS
+
+class AsyncConversationDB:
+    """
+    Awaitable facade over ConversationDB for the async routers.
+
+    Every public ConversationDB method is exposed as a coroutine that runs the
+    synchronous call on a dedicated, bounded DB executor, so SQLite work never
+    blocks the event loop and at most `max_workers` queries run at once.
+    Analytics methods run on a separate executor sized to the analytics
+    connections, so a burst of dashboard requests cannot occupy the threads
+    that chat reads and writes need.
+    """
+
+    # Pure helpers that never touch the database stay synchronous
+    SYNC_METHODS = {'encode_cursor', 'decode_cursor'}
+    ANALYTICS_METHODS = {
+        'get_hot_keywords', 'get_hourly_query_count', 'get_top_users', 'get_citation_counts',
+        'get_daily_average_scores', 'get_daily_top_keywords', 'get_daily_user_engagement',
+        'get_dashboard', 'get_partitions'
+    }
+
+    def __init__(self, db: ConversationDB, max_workers: int = DB_EXECUTOR_WORKERS, analytics_workers: int = ANALYTICS_MAX_READERS):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="conversation-db")
+        self.analytics_executor = ThreadPoolExecutor(max_workers=analytics_workers, thread_name_prefix="conversation-db-analytics")
+
+    async def run(self, func, *args, executor: Optional[ThreadPoolExecutor] = None, **kwargs):
+        """Run a blocking callable on the DB executor (or `executor`) and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor or self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or name in self.SYNC_METHODS or not callable(attr):
+            return attr
+        executor = self.analytics_executor if name in self.ANALYTICS_METHODS else self.executor
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, executor=executor, **kwargs)
+        return call
+
+    async def iter_messages(self, conversation_id: str, keywords: Optional[List[str]] = None, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Async counterpart of ConversationDB.iter_messages, fetching one page per executor call."""
+        after = None
+        while True:
+            page = await self.run(self.db.get_messages, conversation_id, keywords, limit=batch_size, after=after)
+            for message in page:
+                yield message
+            if len(page) < batch_size:
+                return
+            after = self.db.encode_cursor(page[-1])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.analytics_executor.shutdown(wait=True)
+
+# Initialize async facade used by the routers
+ASYNC_CONVERSATION_DB = AsyncConversationDB(CONVERSATION_DB)
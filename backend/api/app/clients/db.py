@@ -1,26 +1,312 @@
-import sqlite3
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import base64
+import json
 import uuid
+import functools
+import gzip
 import hashlib
+import inspect
+import itertools
+import os
 import secrets
-from typing import List, Dict, Optional, Tuple
-from app.constant import SLACK_CONVERSATION_ID, BOT_ID
+from contextlib import contextmanager
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Optional, Tuple
+from app.cache import TTLCache
+from app.columnar import ColumnarEvents
+from app.sketches import AnalyticsSketches
+from app.clients.group_commit import GroupCommitWriter
+from app.clients.pool import ConnectionPool
+from app.constant import (
+    SLACK_CONVERSATION_ID, BOT_ID, DB_PATH, DB_BUSY_TIMEOUT_MS, DB_MAX_READERS, MESSAGE_SEARCH_SCAN_ROWS,
+    DB_GROUP_COMMIT, DB_GROUP_COMMIT_INTERVAL_MS, DB_GROUP_COMMIT_BATCH_SIZE,
+    ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL_SECONDS, ANALYTICS_SKETCHES, ANALYTICS_SKETCH_CAPACITY,
+    ANALYTICS_SKETCH_RETENTION_DAYS, ANALYTICS_SKETCH_PATH, ANALYTICS_SKETCH_CHECKPOINT_SECONDS,
+    ANALYTICS_ENGINE, EVENT_RETENTION_DAYS, MESSAGE_RETENTION_DAYS, ARCHIVE_DIR, DB_SHARDS,
+    ANALYTICS_MAX_READERS, ANALYTICS_DB_CACHE_KB, ANALYTICS_DB_MMAP_BYTES
+)
+
+# PRAGMA user_version of the schema built by `_create_tables`; bump it with each new migration
+SCHEMA_VERSION = 2
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+DASHBOARD_PANELS = (
+    'hot_keywords', 'hourly_query_count', 'top_users', 'citation_counts',
+    'daily_scores', 'daily_top_keywords', 'daily_user_engagement'
+)
+# Bulk record types in export order, with their table and columns
+BULK_RECORDS = {
+    'conversation': ('conversations', ('id', 'user_id', 'created_at', 'updated_at')),
+    'message': ('messages', ('id', 'conversation_id', 'user_id', 'content', 'created_at', 'created_at_ms')),
+    'event': ('events', ('event_id', 'conversation_id', 'user_id', 'query', 'score', 'citations', 'key_words', 'timestamp', 'ts')),
+}
+# Tables whose secondary indexes a deferred bulk import drops and rebuilds
+BULK_INDEXED_TABLES = ('messages', 'events', 'event_keywords', 'event_citations')
+
+def batched(records: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """Split an iterable of records into lists of up to `batch_size` records."""
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def cached_analytics(method):
+    """
+    Serve an analytics method from `self.analytics_cache`, keyed by method name and bound arguments.
+    On a miss the result comes from the columnar engine's method of the same name
+    when it is enabled and the window (`days`, None for all time) only covers live
+    partitions, and from the SQL implementation otherwise.
+    Cached results are shared between callers and must not be mutated.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Bound with defaults, so f(7), f(days=7) and f() share one entry and both engines get the same question
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments['self']
+
+        def compute():
+            if self.columnar and self._is_live_window(arguments.get('days')):
+                return getattr(self.columnar, method.__name__)(**arguments)
+            return method(self, **arguments)
+        key = (method.__name__, tuple(arguments.items()))
+        return self.analytics_cache.get_or_set(key, compute)
+    return wrapper
 
 class ConversationDB:
-    def __init__(self, db_path: str = 'conversations.db'):
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        self._init_tables()
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        max_readers: int = DB_MAX_READERS,
+        busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS,
+        analytics_readers: int = ANALYTICS_MAX_READERS,
+        analytics_cache_kb: int = ANALYTICS_DB_CACHE_KB,
+        analytics_mmap_bytes: int = ANALYTICS_DB_MMAP_BYTES,
+        group_commit: bool = DB_GROUP_COMMIT,
+        group_commit_interval_ms: int = DB_GROUP_COMMIT_INTERVAL_MS,
+        group_commit_batch_size: int = DB_GROUP_COMMIT_BATCH_SIZE,
+        analytics_cache_size: int = ANALYTICS_CACHE_SIZE,
+        analytics_cache_ttl: float = ANALYTICS_CACHE_TTL_SECONDS,
+        analytics_sketches: bool = ANALYTICS_SKETCHES,
+        sketch_capacity: int = ANALYTICS_SKETCH_CAPACITY,
+        sketch_retention_days: int = ANALYTICS_SKETCH_RETENTION_DAYS,
+        sketch_path: Optional[str] = ANALYTICS_SKETCH_PATH,
+        sketch_checkpoint_seconds: float = ANALYTICS_SKETCH_CHECKPOINT_SECONDS,
+        analytics_engine: str = ANALYTICS_ENGINE,
+        search_scan_rows: int = MESSAGE_SEARCH_SCAN_ROWS,
+    ):
+        # Every method goes through the pool: reads borrow one of the reader
+        # connections, writes are serialized on the single writer connection,
+        # and analytics queries run on their own read-only connections.
+        self.pool = ConnectionPool(
+            db_path,
+            max_readers=max_readers,
+            busy_timeout_ms=busy_timeout_ms,
+            analytics_readers=analytics_readers,
+            analytics_cache_kb=analytics_cache_kb,
+            analytics_mmap_bytes=analytics_mmap_bytes
+        )
+        migrated_from = self._init_tables()
+        # Messages a keyword search scans before it turns to the full-text index, see `get_messages`
+        self.search_scan_rows = search_scan_rows
+        # Events before this epoch-ms month start only survive in rollups, see `compact_partitions`
+        self.compacted_until = self._load_compacted_until()
+        # Last message time handed out; only touched on the writer, see `_insert_message`.
+        # Starts from the newest stored message so order survives a restart with a clock step back.
+        self._last_message_ms = self._fetchall('SELECT COALESCE(MAX(created_at_ms), 0) FROM messages')[0][0]
+        # Approximate rankings, updated by `_insert_event` as each write transaction commits
+        self.sketches = None
+        if analytics_sketches:
+            self.sketches = AnalyticsSketches(capacity=sketch_capacity, retention_days=sketch_retention_days)
+            # Migrating an unversioned database renumbers events, so an older checkpoint no longer lines up
+            if sketch_path and migrated_from > 0:
+                self.sketches.load(sketch_path)
+            self._catch_up_sketches()
+            if sketch_path:
+                self.sketches.start_checkpointing(sketch_path, sketch_checkpoint_seconds)
+        # Optionally batch request writes from concurrent callers into shared commits
+        self.group_writer = GroupCommitWriter(
+            self.pool,
+            flush_interval_ms=group_commit_interval_ms,
+            batch_size=group_commit_batch_size
+        ) if group_commit else None
+        # Analytics results are cached until the next event write (or TTL expiry)
+        self.analytics_cache = TTLCache(maxsize=analytics_cache_size, ttl=analytics_cache_ttl)
+        # Optionally answer analytics from an in-memory columnar copy of `events`
+        if analytics_engine not in ('sql', 'columnar'):
+            raise ValueError(f"Unknown analytics engine: {analytics_engine}")
+        self.columnar = ColumnarEvents(self) if analytics_engine == 'columnar' else None
+        if self.columnar:
+            self.columnar.refresh()
     
-    def _init_tables(self):
-        # Drop existing tables to recreate with correct schema
-        self.cursor.execute('DROP TABLE IF EXISTS messages')
-        self.cursor.execute('DROP TABLE IF EXISTS conversations')
-        self.cursor.execute('DROP TABLE IF EXISTS events')
-        self.cursor.execute('DROP TABLE IF EXISTS users')
+    def _init_tables(self) -> int:
+        """
+        Bring the schema up to SCHEMA_VERSION without losing data.
+        A new database gets the current schema; an older one runs each pending
+        migration in turn. Everything happens in one transaction, so an
+        interrupted upgrade leaves the previous version intact.
+        Returns:
+            Schema version found on disk (0 for a new or unversioned database)
+        """
+        with self.pool.writer() as cursor:
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(
+                    f"Database schema version {version} is newer than supported version {SCHEMA_VERSION}"
+                )
+            if version < SCHEMA_VERSION:
+                if version == 0 and not self._table_exists(cursor, 'users'):
+                    self._create_tables(cursor)
+                else:
+                    for target, migrate in self._migrations():
+                        if version < target:
+                            migrate(cursor)
+                    print(f"Migrated {self.pool.db_path} from schema version {version} to {SCHEMA_VERSION}")
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            
+            cursor.execute(
+                'INSERT OR IGNORE INTO conversations (id, user_id) VALUES (?, ?)',
+                (SLACK_CONVERSATION_ID, "admin")
+            )
+        return version
+
+    @staticmethod
+    def _table_exists(cursor, name: str) -> bool:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def _migrations(self) -> List[Tuple[int, Callable[[Any], None]]]:
+        """(version, migration) steps in order; each upgrades the previous version in place."""
+        return [
+            (1, self._migrate_unversioned),
+            (2, self._migrate_trigram_search),
+        ]
+
+    def _migrate_unversioned(self, cursor):
+        """
+        Upgrade a database written before the schema was versioned.
+        Those releases recreated the schema on every start, so only users,
+        conversations, messages and events are carried over. Messages and events
+        get their epoch-ms time columns and an events `seq`, and everything derived
+        from them (search index, keyword and citation indexes, rollups) is rebuilt.
+        """
+        if self._table_exists(cursor, 'partitions'):
+            # Already the current schema, just not stamped with a version yet
+            return
+        
+        def columns(table: str) -> set:
+            cursor.execute(f'PRAGMA table_info({table})')
+            return {row[1] for row in cursor.fetchall()}
+        
+        def epoch_ms(column: str) -> str:
+            return f"COALESCE(CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER), 0)"
         
+        # Drop derived tables first, so renaming the sources does not rewrite their references
+        for trigger in ('messages_fts_insert', 'messages_fts_delete', 'messages_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for table in ('messages_fts', 'event_keywords', 'keywords', 'event_citations', 'hourly_rollups', 'daily_rollups'):
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute('ALTER TABLE messages RENAME TO legacy_messages')
+        cursor.execute('ALTER TABLE events RENAME TO legacy_events')
+        # Renamed tables keep their indexes, whose names the new tables reuse
+        cursor.execute('''
+            SELECT name FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ('legacy_messages', 'legacy_events')
+        ''')
+        for (index,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX {index}')
+        self._create_tables(cursor)
+        
+        # Second-precision times are spread over the milliseconds of their second in
+        # insertion order, so a turn and its reply keep their order under keyset pagination
+        if 'created_at_ms' in columns('legacy_messages'):
+            created_at_ms = 'created_at_ms'
+        else:
+            created_at_ms = f"{epoch_ms('created_at')} + ROW_NUMBER() OVER (PARTITION BY created_at ORDER BY rowid) - 1"
+        cursor.execute(f'''
+            INSERT INTO messages (id, conversation_id, user_id, content, created_at, created_at_ms)
+            SELECT id, conversation_id, user_id, content, created_at, {created_at_ms}
+            FROM legacy_messages
+            ORDER BY rowid
+        ''')
+        ts = 'ts' if 'ts' in columns('legacy_events') else epoch_ms('timestamp')
+        cursor.execute(f'''
+            INSERT INTO events (event_id, conversation_id, user_id, query, score, citations, key_words, timestamp, ts)
+            SELECT event_id, conversation_id, user_id, query, score, citations, key_words, timestamp, {ts}
+            FROM legacy_events
+            ORDER BY rowid
+        ''')
+        cursor.execute('DROP TABLE legacy_messages')
+        cursor.execute('DROP TABLE legacy_events')
+        
+        # The message search index is filled by its insert trigger; index the events here
+        events = cursor.connection.cursor()
+        try:
+            for columns_sql, source_column, index_events in (
+                ("event_id, conversation_id, date(ts / 1000, 'unixepoch'), ts, key_words", 'key_words', self._index_event_keywords),
+                ('event_id, conversation_id, ts, citations', 'citations', self._index_event_citations),
+            ):
+                events.execute(f'SELECT {columns_sql} FROM events WHERE {source_column} IS NOT NULL ORDER BY rowid')
+                while True:
+                    rows = events.fetchmany(1000)
+                    if not rows:
+                        break
+                    index_events(cursor, rows)
+        finally:
+            events.close()
+        self._rebuild_rollups(cursor, 0)
+
+    def _migrate_trigram_search(self, cursor):
+        """
+        Re-create the message search index with the trigram tokenizer, so keyword
+        filters keep the substring semantics of `content LIKE '%keyword%'`.
+        """
+        for trigger in ('messages_fts_insert', 'messages_fts_delete', 'messages_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute('DROP TABLE IF EXISTS messages_fts')
+        self._create_message_search(cursor)
+        cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+    def _create_message_search(self, cursor):
+        # Create full-text index over message content, kept in sync by triggers.
+        # It is an external content table keyed on messages.rowid, so it has to be
+        # rebuilt (see `rebuild_message_search_index`) after a VACUUM. The trigram
+        # tokenizer indexes every three-character substring, so a quoted keyword
+        # matches wherever `content LIKE '%keyword%'` would.
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='rowid',
+            tokenize='trigram'
+        )
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+        END
+        ''')
+
+    def _create_tables(self, cursor):
         # Create users table
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
             user_id TEXT PRIMARY KEY,
             password_hash TEXT NOT NULL,
@@ -30,7 +316,7 @@ class ConversationDB:
         ''')
         
         # Create conversations table
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS conversations (
             id TEXT PRIMARY KEY,
             user_id TEXT NOT NULL,
@@ -41,21 +327,27 @@ class ConversationDB:
         ''')
         
         # Create messages table with new schema
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             id TEXT PRIMARY KEY,
             conversation_id TEXT NOT NULL,
             user_id TEXT NOT NULL,
             content TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at_ms INTEGER NOT NULL,
             FOREIGN KEY (conversation_id) REFERENCES conversations (id)
         )
         ''')
+        # Keyset pagination walks (created_at_ms, id) within a conversation
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages (conversation_id, created_at_ms, id)')
+
+        self._create_message_search(cursor)
 
         # Create events table
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS events (
-            event_id TEXT PRIMARY KEY,
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT NOT NULL UNIQUE,
             conversation_id TEXT NOT NULL,
             user_id TEXT NOT NULL,
             query TEXT NOT NULL,
@@ -63,59 +355,960 @@ class ConversationDB:
             citations TEXT,
             key_words TEXT,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ts INTEGER NOT NULL,
             FOREIGN KEY (conversation_id) REFERENCES conversations (id)
         )
         ''')
+        # `ts` is epoch milliseconds; `timestamp` is only kept for display.
+        # `seq` (the rowid) is never reused, even after old events are compacted,
+        # so consumers can resume from the last rowid they have seen.
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_ts_user ON events (ts, user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_conversation_ts ON events (conversation_id, ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_ts_score ON events (ts, score)')
+
+        # Create interned keyword vocabulary
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keywords (
+            keyword_id INTEGER PRIMARY KEY,
+            keyword TEXT NOT NULL UNIQUE
+        )
+        ''')
+
+        # Create keyword index table, one row per keyword occurrence in an event
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_keywords (
+            event_id TEXT NOT NULL,
+            keyword_id INTEGER NOT NULL,
+            conversation_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES events (event_id),
+            FOREIGN KEY (keyword_id) REFERENCES keywords (keyword_id)
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_keywords_keyword ON event_keywords (keyword_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_keywords_conversation ON event_keywords (conversation_id, keyword_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_keywords_ts ON event_keywords (ts, day, keyword_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_keywords_event ON event_keywords (event_id)')
+
+        # Create citation index table, one row per citation in an event
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_citations (
+            event_id TEXT NOT NULL,
+            citation TEXT NOT NULL,
+            conversation_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES events (event_id)
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_citations_citation ON event_citations (citation, ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_citations_ts ON event_citations (ts, citation)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_citations_conversation ON event_citations (conversation_id, citation, ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_citations_event ON event_citations (event_id)')
+
+        # Create hourly and daily event rollups, kept in step with every event insert.
+        # Buckets are the epoch-ms start of the UTC hour/day, and score_sum/score_count
+        # only cover scores > 0, matching the daily score average.
+        for table, bucket in (('hourly_rollups', 'hour'), ('daily_rollups', 'day')):
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {bucket} INTEGER NOT NULL,
+                conversation_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                event_count INTEGER NOT NULL DEFAULT 0,
+                score_sum REAL NOT NULL DEFAULT 0,
+                score_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({bucket}, conversation_id, user_id)
+            )
+            ''')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_conversation ON {table} (conversation_id, {bucket})')
+
+        # Create per-day keyword and citation counts of compacted partitions, which
+        # replace their raw event_keywords/event_citations rows (see `compact_partitions`)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_keyword_rollups (
+            day INTEGER NOT NULL,
+            conversation_id TEXT NOT NULL,
+            keyword_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, conversation_id, keyword_id)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_citation_rollups (
+            day INTEGER NOT NULL,
+            conversation_id TEXT NOT NULL,
+            citation TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, conversation_id, citation)
+        )
+        ''')
+
+        # Create monthly partition registry; `month` is the epoch-ms start of the UTC month
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS partitions (
+            month INTEGER PRIMARY KEY,
+            events_compacted INTEGER NOT NULL DEFAULT 0,
+            messages_compacted INTEGER NOT NULL DEFAULT 0,
+            archived_events INTEGER NOT NULL DEFAULT 0,
+            archived_messages INTEGER NOT NULL DEFAULT 0,
+            compacted_at_ms INTEGER
+        )
+        ''')
+    
+    def _write(self, operation: Callable[[Any], Any]) -> Any:
+        """
+        Run a write operation against the writer cursor and return its result once committed.
+        With group commit enabled the operation shares a transaction with other
+        concurrent writes; otherwise it runs in a transaction of its own.
+        """
+        if self.group_writer:
+            return self.group_writer.submit(operation).result()
+        with self.pool.writer() as cursor:
+            return operation(cursor)
+
+    def invalidate_analytics(self):
+        """Drop cached analytics results; called after every committed event write."""
+        self.analytics_cache.clear()
+
+    def get_analytics_cache_stats(self) -> Dict:
+        """Get hit/miss counters and occupancy of the analytics cache."""
+        return self.analytics_cache.stats()
+
+    def _fetchall(self, query: str, params=()) -> List[tuple]:
+        """Run a read-only query on a pooled reader connection and return all rows."""
+        with self.pool.reader() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def _fetchall_analytics(self, query: str, params=()) -> List[tuple]:
+        """Run an analytics query on an analytics connection and return all rows."""
+        with self.pool.analytics_reader() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def _now_ms() -> int:
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    @staticmethod
+    def _cutoff_ms(days: int) -> int:
+        """Epoch-ms start of a window covering the past N days."""
+        return ConversationDB._now_ms() - days * DAY_MS
+
+    def _window(self, days: int, bucket_ms: int) -> Tuple[int, int, int]:
+        """
+        Split a look-back window at bucket boundaries.
+        Returns:
+            (cutoff_ms, partial_bucket, first_full_bucket): buckets from
+            `first_full_bucket` on are read from the rollups, while events in
+            [cutoff_ms, first_full_bucket) are counted from `events` and
+            reported under `partial_bucket`. When the cutoff falls in a compacted
+            partition the raw events are gone, so the whole partial bucket is
+            read from the rollups instead.
+        """
+        cutoff_ms = self._cutoff_ms(days)
+        partial_bucket = cutoff_ms - cutoff_ms % bucket_ms
+        first_full_bucket = cutoff_ms + (-cutoff_ms) % bucket_ms
+        if self.compacted_until is not None and cutoff_ms < self.compacted_until:
+            first_full_bucket = partial_bucket
+        return cutoff_ms, partial_bucket, first_full_bucket
+
+    def _is_live_window(self, days: Optional[int]) -> bool:
+        """Whether a window of `days` (None for all time) only covers uncompacted partitions."""
+        if self.compacted_until is None:
+            return True
+        return days is not None and self._cutoff_ms(days) >= self.compacted_until
+
+    @staticmethod
+    def _month_start(ms: int) -> int:
+        """Epoch-ms start of the UTC month containing `ms`."""
+        moment = datetime.fromtimestamp(ms / 1000, timezone.utc)
+        return int(datetime(moment.year, moment.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+    @staticmethod
+    def _next_month(month: int) -> int:
+        """Epoch-ms start of the UTC month after the one starting at `month`."""
+        moment = datetime.fromtimestamp(month / 1000, timezone.utc)
+        year, month_number = divmod(moment.month, 12)
+        return int(datetime(moment.year + year, month_number + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+    def _load_compacted_until(self) -> Optional[int]:
+        rows = self._fetchall('SELECT MAX(month) FROM partitions WHERE events_compacted = 1')
+        return self._next_month(rows[0][0]) if rows[0][0] is not None else None
+
+    def _max_event_rowid(self) -> int:
+        """Highest event rowid ever handed out, including rows since compacted away."""
+        rows = self._fetchall("SELECT seq FROM sqlite_sequence WHERE name = 'events'")
+        return rows[0][0] if rows else 0
+
+    def _keyword_source(self, cutoff_ms: Optional[int]) -> Tuple[str, list]:
+        """
+        SQL for (day, keyword_id, conversation_id, count) rows of keyword use since
+        `cutoff_ms` (None for all time), with `day` as 'YYYY-MM-DD'. Live partitions
+        are read from event_keywords and compacted ones from daily_keyword_rollups;
+        the rollups are pruned when the window does not reach a compacted partition.
+        """
+        live = 'SELECT day, keyword_id, conversation_id, 1 as count FROM event_keywords'
+        live_params = []
+        if cutoff_ms is not None:
+            live += ' WHERE ts >= ?'
+            live_params.append(cutoff_ms)
+        if self.compacted_until is None or (cutoff_ms is not None and cutoff_ms >= self.compacted_until):
+            return live, live_params
+        compacted = '''
+            SELECT date(day / 1000, 'unixepoch'), keyword_id, conversation_id, count
+            FROM daily_keyword_rollups
+            WHERE day >= ?
+        '''
+        first_day = -1 if cutoff_ms is None else cutoff_ms - cutoff_ms % DAY_MS
+        return f'{live} UNION ALL {compacted}', live_params + [first_day]
+
+    def _citation_source(self, cutoff_ms: Optional[int]) -> Tuple[str, list]:
+        """
+        SQL for (citation, conversation_id, count) rows of citations since `cutoff_ms`
+        (None for all time), pruned like `_keyword_source`.
+        """
+        live = 'SELECT citation, conversation_id, 1 as count FROM event_citations'
+        live_params = []
+        if cutoff_ms is not None:
+            live += ' WHERE ts >= ?'
+            live_params.append(cutoff_ms)
+        if self.compacted_until is None or (cutoff_ms is not None and cutoff_ms >= self.compacted_until):
+            return live, live_params
+        compacted = '''
+            SELECT citation, conversation_id, count
+            FROM daily_citation_rollups
+            WHERE day >= ?
+        '''
+        first_day = -1 if cutoff_ms is None else cutoff_ms - cutoff_ms % DAY_MS
+        return f'{live} UNION ALL {compacted}', live_params + [first_day]
+
+    @staticmethod
+    def _format_ms(ms: int) -> str:
+        """Format epoch ms like CURRENT_TIMESTAMP (UTC, second precision)."""
+        return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _split_pipe(value: Optional[str]) -> List[str]:
+        """Split a pipe-joined column into its non-empty tokens."""
+        return [token for token in (value or '').split('|') if token]
+
+    def _insert_event(self, cursor, user_id: str, conversation_id: str, query: str, score: float, citations: Optional[List[str]]) -> str:
+        """Insert an event and its keyword and citation index rows using the caller's transaction."""
+        event_id = str(uuid.uuid4())
+        ts = self._now_ms()
+        timestamp = self._format_ms(ts)
         
-        self.cursor.execute(
-            'INSERT INTO conversations (id, user_id) VALUES (?, ?)',
-            (SLACK_CONVERSATION_ID, "admin")
+        # Process citations
+        citations_str = "|".join(citations) if citations else ""
+        
+        # Process key_words from query
+        key_words = "|".join(query.split())
+        
+        cursor.execute(
+            'INSERT INTO events (event_id, conversation_id, user_id, query, score, citations, key_words, timestamp, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (event_id, conversation_id, user_id, query, score, citations_str, key_words, timestamp, ts)
+        )
+        rowid = cursor.lastrowid
+        self._index_event_keywords(cursor, [(event_id, conversation_id, timestamp[:10], ts, key_words)])
+        self._index_event_citations(cursor, [(event_id, conversation_id, ts, citations_str)])
+        self._update_rollups(cursor, ts, conversation_id, user_id, score)
+        if self.sketches:
+            # Applied only once the write commits; commits are serialized, so
+            # sketches still see events in rowid order
+            self.pool.after_commit(functools.partial(
+                self.sketches.add_event, rowid, ts, user_id, self._split_pipe(key_words)
+            ))
+        return event_id
+
+    def _insert_message(self, cursor, conversation_id: str, user_id: str, content: str) -> str:
+        """Insert a message using the caller's transaction."""
+        message_id = str(uuid.uuid4())
+        # Writes are serialized, so handing out strictly increasing times keeps
+        # messages written in the same millisecond (a turn and its reply) in order
+        created_at_ms = max(self._now_ms(), self._last_message_ms + 1)
+        self._last_message_ms = created_at_ms
+        cursor.execute(
+            'INSERT INTO messages (id, conversation_id, user_id, content, created_at, created_at_ms) VALUES (?, ?, ?, ?, ?, ?)',
+            (message_id, conversation_id, user_id, content, self._format_ms(created_at_ms), created_at_ms)
+        )
+        return message_id
+
+    def _intern_keywords(self, cursor, keywords: List[str]) -> Dict[str, int]:
+        """Return keyword ids for the given keywords, adding unseen ones to the vocabulary."""
+        unique = list(dict.fromkeys(keywords))
+        cursor.executemany(
+            'INSERT OR IGNORE INTO keywords (keyword) VALUES (?)',
+            [(keyword,) for keyword in unique]
+        )
+        keyword_ids = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(
+                f'SELECT keyword, keyword_id FROM keywords WHERE keyword IN ({placeholders})',
+                batch
+            )
+            keyword_ids.update(cursor.fetchall())
+        return keyword_ids
+
+    def _index_event_keywords(self, cursor, events: List[Tuple[str, str, str, str, str]]):
+        """
+        Write keyword index rows for events.
+        Args:
+            events: Tuples of (event_id, conversation_id, day, ts, key_words)
+        """
+        tokenized = [(event, self._split_pipe(event[4])) for event in events]
+        keyword_ids = self._intern_keywords(
+            cursor,
+            [keyword for _, keywords in tokenized for keyword in keywords]
+        )
+        cursor.executemany(
+            'INSERT INTO event_keywords (event_id, keyword_id, conversation_id, day, ts) VALUES (?, ?, ?, ?, ?)',
+            [
+                (event_id, keyword_ids[keyword], conversation_id, day, ts)
+                for (event_id, conversation_id, day, ts, _), keywords in tokenized
+                for keyword in keywords
+            ]
         )
+
+    def _index_event_citations(self, cursor, events: List[Tuple[str, str, str, str]]):
+        """
+        Write citation index rows for events.
+        Args:
+            events: Tuples of (event_id, conversation_id, ts, citations)
+        """
+        cursor.executemany(
+            'INSERT INTO event_citations (event_id, citation, conversation_id, ts) VALUES (?, ?, ?, ?)',
+            [
+                (event_id, citation, conversation_id, ts)
+                for event_id, conversation_id, ts, citations in events
+                for citation in self._split_pipe(citations)
+            ]
+        )
+
+    def _update_rollups(self, cursor, ts: int, conversation_id: str, user_id: str, score: Optional[float]):
+        """Add one event to its hourly and daily rollup buckets."""
+        scored = score is not None and score > 0
+        score_sum = score if scored else 0
+        score_count = 1 if scored else 0
+        for table, bucket, key in (
+            ('hourly_rollups', 'hour', ts - ts % HOUR_MS),
+            ('daily_rollups', 'day', ts - ts % DAY_MS),
+        ):
+            cursor.execute(f'''
+                INSERT INTO {table} ({bucket}, conversation_id, user_id, event_count, score_sum, score_count)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT ({bucket}, conversation_id, user_id) DO UPDATE SET
+                    event_count = event_count + 1,
+                    score_sum = score_sum + excluded.score_sum,
+                    score_count = score_count + excluded.score_count
+            ''', (key, conversation_id, user_id, score_sum, score_count))
+
+    def _catch_up_sketches(self, batch_size: int = 1000):
+        """Fold events written after the loaded sketch checkpoint into the sketches."""
+        max_rowid = self._max_event_rowid()
+        if self.sketches.last_rowid > max_rowid:
+            # The checkpoint is ahead of the database, so it belongs to a different one
+            self.sketches.reset()
+        last_rowid = self.sketches.last_rowid
+        while last_rowid < max_rowid:
+            rows = self._fetchall('''
+                SELECT rowid, ts, user_id, key_words
+                FROM events
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+            ''', (last_rowid, batch_size))
+            if not rows:
+                break
+            for rowid, ts, user_id, key_words in rows:
+                self.sketches.add_event(rowid, ts, user_id, self._split_pipe(key_words))
+            last_rowid = rows[-1][0]
+
+    def rebuild_rollups(self) -> Dict:
+        """
+        Regenerate the hourly and daily rollup tables from the raw events.
+        Buckets of compacted partitions are kept, since their raw events are gone.
+        Returns:
+            Dict with the number of events and rollup buckets written
+        """
+        with self.pool.writer() as cursor:
+            result = self._rebuild_rollups(cursor, self.compacted_until or 0)
+        self.invalidate_analytics()
+        return result
+
+    def _rebuild_rollups(self, cursor, horizon: int) -> Dict:
+        """Regenerate the rollup buckets from `horizon` (epoch ms) on; see `rebuild_rollups`."""
+        cursor.execute('DELETE FROM hourly_rollups WHERE hour >= ?', (horizon,))
+        cursor.execute('DELETE FROM daily_rollups WHERE day >= ?', (horizon,))
+        self._add_rollups(cursor, 'ts >= ?', (horizon,))
+        cursor.execute('SELECT COUNT(*) FROM events')
+        events = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM hourly_rollups')
+        hourly_buckets = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM daily_rollups')
+        daily_buckets = cursor.fetchone()[0]
+        return {
+            'events': events,
+            'hourly_buckets': hourly_buckets,
+            'daily_buckets': daily_buckets
+        }
+
+    def _add_rollups(self, cursor, where: str, params):
+        """Add the events matching `where` to their hourly and daily rollup buckets in one pass per table."""
+        for table, bucket, expression in (
+            ('hourly_rollups', 'hour', f'ts - ts % {HOUR_MS}'),
+            ('daily_rollups', 'day', f'ts - ts % {DAY_MS}'),
+        ):
+            cursor.execute(f'''
+                INSERT INTO {table} ({bucket}, conversation_id, user_id, event_count, score_sum, score_count)
+                SELECT 
+                    {expression},
+                    conversation_id,
+                    user_id,
+                    COUNT(*),
+                    COALESCE(SUM(CASE WHEN score > 0 THEN score END), 0),
+                    COUNT(CASE WHEN score > 0 THEN 1 END)
+                FROM events
+                WHERE {where}
+                GROUP BY 1, conversation_id, user_id
+                ON CONFLICT ({bucket}, conversation_id, user_id) DO UPDATE SET
+                    event_count = event_count + excluded.event_count,
+                    score_sum = score_sum + excluded.score_sum,
+                    score_count = score_count + excluded.score_count
+            ''', params)
+
+    def _months_before(self, table: str, column: str, cutoff_ms: int) -> List[Tuple[int, int]]:
+        """(month start, next month start) of every month holding rows of `table` that ends by `cutoff_ms`."""
+        oldest = self._fetchall(f'SELECT MIN({column}) FROM {table}')[0][0]
+        months = []
+        if oldest is None:
+            return months
+        month = self._month_start(oldest)
+        while self._next_month(month) <= cutoff_ms:
+            months.append((month, self._next_month(month)))
+            month = self._next_month(month)
+        return months
+
+    def _archive_rows(self, archive_dir: str, kind: str, month: int, query: str, params) -> Tuple[int, Optional[str]]:
+        """
+        Write the rows selected by `query` to a gzip NDJSON file in `archive_dir`.
+        The file is named after the month and rowid range, and written under a
+        temporary name first, so re-archiving the same rows after a crash replaces it.
+        Returns:
+            (number of rows written, archive path or None if there were no rows)
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            first_row = cursor.fetchone()
+            if first_row is None:
+                return 0, None
+            label = self._format_ms(month)[:7]
+            tmp_path = os.path.join(archive_dir, f".{kind}-{label}.ndjson.gz.tmp")
+            count = 0
+            last_row = first_row
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for row in itertools.chain([first_row], cursor):
+                    f.write(json.dumps(dict(zip(columns, row))) + '\n')
+                    count += 1
+                    last_row = row
+        path = os.path.join(archive_dir, f"{kind}-{label}-{first_row[0]}-{last_row[0]}.ndjson.gz")
+        os.replace(tmp_path, path)
+        return count, path
+
+    def compact_partitions(
+        self,
+        retention_days: int = EVENT_RETENTION_DAYS,
+        message_retention_days: Optional[int] = MESSAGE_RETENTION_DAYS,
+        archive_dir: str = ARCHIVE_DIR,
+    ) -> List[Dict]:
+        """
+        Compact whole UTC months that are older than the retention period.
+        Each month's raw events are archived to a gzip NDJSON file, their keyword and
+        citation index rows are folded into the daily keyword/citation rollups, and
+        the raw rows are deleted; the hourly and daily rollups already cover them.
+        Messages are archived and deleted the same way when `message_retention_days`
+        is set, and kept forever otherwise.
+        Args:
+            retention_days: Keep raw events of months ending within this many days
+            message_retention_days: Keep messages of months ending within this many days (None to keep all)
+            archive_dir: Directory for the archive files
+        Returns:
+            List of dicts with month, archived events and messages, and archive paths
+        """
+        os.makedirs(archive_dir, exist_ok=True)
+        results = {}
+        
+        def result(month):
+            return results.setdefault(month, {
+                'month': self._format_ms(month)[:7],
+                'events': 0,
+                'messages': 0,
+                'archives': []
+            })
+        
+        for month, month_end in self._months_before('events', 'ts', self._cutoff_ms(retention_days)):
+            # Rows are selected up to the month's current last rowid, so events
+            # written into the month while archiving are left for the next run
+            last_rowid = self._fetchall(
+                'SELECT MAX(rowid) FROM events WHERE ts >= ? AND ts < ?', (month, month_end)
+            )[0][0] or 0
+            selection = (month, month_end, last_rowid)
+            count, path = self._archive_rows(archive_dir, 'events', month, '''
+                SELECT rowid, event_id, conversation_id, user_id, query, score, citations, key_words, timestamp, ts
+                FROM events
+                WHERE ts >= ? AND ts < ? AND rowid <= ?
+                ORDER BY rowid
+            ''', selection)
+            
+            with self.pool.writer() as cursor:
+                selected = 'SELECT event_id FROM events WHERE ts >= ? AND ts < ? AND rowid <= ?'
+                cursor.execute(f'''
+                    INSERT INTO daily_keyword_rollups (day, conversation_id, keyword_id, count)
+                    SELECT ts - ts % {DAY_MS}, conversation_id, keyword_id, COUNT(*)
+                    FROM event_keywords
+                    WHERE event_id IN ({selected})
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (day, conversation_id, keyword_id) DO UPDATE SET
+                        count = count + excluded.count
+                ''', selection)
+                cursor.execute(f'''
+                    INSERT INTO daily_citation_rollups (day, conversation_id, citation, count)
+                    SELECT ts - ts % {DAY_MS}, conversation_id, citation, COUNT(*)
+                    FROM event_citations
+                    WHERE event_id IN ({selected})
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (day, conversation_id, citation) DO UPDATE SET
+                        count = count + excluded.count
+                ''', selection)
+                cursor.execute(f'DELETE FROM event_keywords WHERE event_id IN ({selected})', selection)
+                cursor.execute(f'DELETE FROM event_citations WHERE event_id IN ({selected})', selection)
+                cursor.execute('DELETE FROM events WHERE ts >= ? AND ts < ? AND rowid <= ?', selection)
+                cursor.execute('''
+                    INSERT INTO partitions (month, events_compacted, archived_events, compacted_at_ms)
+                    VALUES (?, 1, ?, ?)
+                    ON CONFLICT (month) DO UPDATE SET
+                        events_compacted = 1,
+                        archived_events = archived_events + excluded.archived_events,
+                        compacted_at_ms = excluded.compacted_at_ms
+                ''', (month, count, self._now_ms()))
+            self.compacted_until = max(self.compacted_until or 0, month_end)
+            entry = result(month)
+            entry['events'] = count
+            if path:
+                entry['archives'].append(path)
         
+        if message_retention_days is not None:
+            for month, month_end in self._months_before('messages', 'created_at_ms', self._cutoff_ms(message_retention_days)):
+                last_rowid = self._fetchall(
+                    'SELECT MAX(rowid) FROM messages WHERE created_at_ms >= ? AND created_at_ms < ?', (month, month_end)
+                )[0][0] or 0
+                selection = (month, month_end, last_rowid)
+                count, path = self._archive_rows(archive_dir, 'messages', month, '''
+                    SELECT rowid, id, conversation_id, user_id, content, created_at, created_at_ms
+                    FROM messages
+                    WHERE created_at_ms >= ? AND created_at_ms < ? AND rowid <= ?
+                    ORDER BY rowid
+                ''', selection)
+                
+                with self.pool.writer() as cursor:
+                    # The FTS delete trigger drops the archived messages from the search index
+                    cursor.execute(
+                        'DELETE FROM messages WHERE created_at_ms >= ? AND created_at_ms < ? AND rowid <= ?',
+                        selection
+                    )
+                    cursor.execute('''
+                        INSERT INTO partitions (month, messages_compacted, archived_messages, compacted_at_ms)
+                        VALUES (?, 1, ?, ?)
+                        ON CONFLICT (month) DO UPDATE SET
+                            messages_compacted = 1,
+                            archived_messages = archived_messages + excluded.archived_messages,
+                            compacted_at_ms = excluded.compacted_at_ms
+                    ''', (month, count, self._now_ms()))
+                entry = result(month)
+                entry['messages'] = count
+                if path:
+                    entry['archives'].append(path)
         
-        self.conn.commit()
-    
+        if results:
+            self.invalidate_analytics()
+        return [results[month] for month in sorted(results)]
+
+    def get_partitions(self) -> List[Dict]:
+        """
+        Get the monthly partitions of events and messages.
+        Returns:
+            List of dicts with month, live and archived row counts, and whether the
+            month's events and messages were compacted, newest month first
+        """
+        partitions = {}
+        
+        def partition(month: str) -> Dict:
+            return partitions.setdefault(month, {
+                'month': month,
+                'events': 0,
+                'messages': 0,
+                'archived_events': 0,
+                'archived_messages': 0,
+                'events_compacted': False,
+                'messages_compacted': False
+            })
+        
+        for month, count in self._fetchall_analytics('''
+            SELECT strftime('%Y-%m', ts / 1000, 'unixepoch'), COUNT(*)
+            FROM events
+            GROUP BY 1
+        '''):
+            partition(month)['events'] = count
+        for month, count in self._fetchall_analytics('''
+            SELECT strftime('%Y-%m', created_at_ms / 1000, 'unixepoch'), COUNT(*)
+            FROM messages
+            GROUP BY 1
+        '''):
+            partition(month)['messages'] = count
+        for month, events_compacted, messages_compacted, archived_events, archived_messages in self._fetchall_analytics('''
+            SELECT strftime('%Y-%m', month / 1000, 'unixepoch'), events_compacted, messages_compacted, archived_events, archived_messages
+            FROM partitions
+        '''):
+            entry = partition(month)
+            entry['events_compacted'] = bool(events_compacted)
+            entry['messages_compacted'] = bool(messages_compacted)
+            entry['archived_events'] = archived_events
+            entry['archived_messages'] = archived_messages
+        
+        return [partitions[month] for month in sorted(partitions, reverse=True)]
+
+    def _backfill_index(self, index_table: str, columns: str, source_column: str, index_events, batch_size: int) -> int:
+        """Feed events that have no rows in `index_table` to `index_events`, one batch per transaction."""
+        indexed = 0
+        last_rowid = 0
+        while True:
+            with self.pool.writer() as cursor:
+                cursor.execute(f'''
+                    SELECT rowid, {columns}
+                    FROM events e
+                    WHERE rowid > ?
+                    AND {source_column} IS NOT NULL
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {index_table} i WHERE i.event_id = e.event_id
+                    )
+                    ORDER BY rowid
+                    LIMIT ?
+                ''', (last_rowid, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                index_events(cursor, [row[1:] for row in rows])
+            last_rowid = rows[-1][0]
+            indexed += len(rows)
+        if indexed:
+            self.invalidate_analytics()
+        return indexed
+
+    def backfill_keyword_index(self, batch_size: int = 1000) -> int:
+        """
+        Build keyword index rows for events written before the index existed.
+        Args:
+            batch_size: Number of events indexed per transaction
+        Returns:
+            Number of events scanned
+        """
+        return self._backfill_index(
+            'event_keywords',
+            "event_id, conversation_id, date(ts / 1000, 'unixepoch'), ts, key_words",
+            'key_words',
+            self._index_event_keywords,
+            batch_size
+        )
+
+    def backfill_citation_index(self, batch_size: int = 1000) -> int:
+        """
+        Build citation index rows for events written before the index existed.
+        Args:
+            batch_size: Number of events indexed per transaction
+        Returns:
+            Number of events scanned
+        """
+        return self._backfill_index(
+            'event_citations',
+            'event_id, conversation_id, ts, citations',
+            'citations',
+            self._index_event_citations,
+            batch_size
+        )
+
+    def export_records(
+        self,
+        types: Tuple[str, ...] = tuple(BULK_RECORDS),
+        conversation_id: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Dict]:
+        """
+        Stream conversations, messages and events as bulk records.
+        Each table is read through one cursor, `batch_size` rows at a time, inside a
+        single read transaction, so memory stays constant and the export is a
+        consistent snapshot.
+        Args:
+            types: Record types from BULK_RECORDS to export (always written in that order)
+            conversation_id: Optional conversation to restrict the export to
+            batch_size: Number of rows fetched per step
+        Returns:
+            Iterator of dicts with the record `type` and the row's columns
+        """
+        unknown = set(types) - set(BULK_RECORDS)
+        if unknown:
+            raise ValueError(f"Unknown record types: {', '.join(sorted(unknown))}")
+        with self.pool.reader() as cursor:
+            cursor.execute('BEGIN')
+            try:
+                for record_type, (table, columns) in BULK_RECORDS.items():
+                    if record_type not in types:
+                        continue
+                    key = 'id' if table == 'conversations' else 'conversation_id'
+                    where_clause = f'WHERE {key} = ?' if conversation_id else ''
+                    cursor.execute(
+                        f"SELECT {', '.join(columns)} FROM {table} {where_clause} ORDER BY rowid",
+                        [conversation_id] if conversation_id else []
+                    )
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            record = {'type': record_type}
+                            record.update(zip(columns, row))
+                            yield record
+            finally:
+                cursor.execute('COMMIT')
+
+    @staticmethod
+    def _parse_ms(timestamp: str) -> int:
+        """Epoch ms of a stored timestamp text; times without a zone are UTC, like CURRENT_TIMESTAMP."""
+        parsed = datetime.fromisoformat(timestamp)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp() * 1000)
+
+    def _bulk_row(self, record_type: str, record: Dict) -> tuple:
+        """Column values of a bulk record, filling in IDs, times and derived columns it leaves out."""
+        if record_type == 'conversation':
+            created_at = record.get('created_at') or self._format_ms(self._now_ms())
+            return (record['id'], record['user_id'], created_at, record.get('updated_at') or created_at)
+        
+        if record_type == 'message':
+            created_at_ms, created_at = record.get('created_at_ms'), record.get('created_at')
+            if created_at_ms is None:
+                created_at_ms = self._parse_ms(created_at) if created_at else self._now_ms()
+            return (
+                record.get('id') or str(uuid.uuid4()),
+                record['conversation_id'],
+                record['user_id'],
+                record['content'],
+                created_at or self._format_ms(created_at_ms),
+                created_at_ms
+            )
+        
+        ts, timestamp = record.get('ts'), record.get('timestamp')
+        if ts is None:
+            ts = self._parse_ms(timestamp) if timestamp else self._now_ms()
+        citations = record.get('citations') or ''
+        if isinstance(citations, list):
+            citations = '|'.join(citations)
+        key_words = record.get('key_words')
+        if key_words is None:
+            key_words = '|'.join(record['query'].split())
+        return (
+            record.get('event_id') or str(uuid.uuid4()),
+            record['conversation_id'],
+            record['user_id'],
+            record['query'],
+            record.get('score'),
+            citations,
+            key_words,
+            timestamp or self._format_ms(ts),
+            ts
+        )
+
+    def import_records(self, records: Iterable[Dict], batch_size: int = 50000, defer_indexes: bool = False) -> Dict[str, int]:
+        """
+        Bulk-load conversation, message and event records, e.g. from `export_records`.
+        Records are inserted with executemany, `batch_size` records at a time. Rows
+        whose ID already exists are skipped, so an interrupted import can be re-run.
+        The keyword and citation index rows, rollups and sketches of imported events
+        are built once per batch from the inserted rows rather than event by event.
+        Args:
+            records: Dicts with a `type` from BULK_RECORDS and that table's columns;
+                IDs, times and key words are filled in when missing
+            batch_size: Number of records per executemany batch
+            defer_indexes: Load everything in one transaction with the secondary
+                indexes and message search triggers dropped, and rebuild them at the
+                end. Much faster for large loads, but other writes wait until the
+                import commits.
+        Returns:
+            Dict with the number of conversations, messages and events inserted and records skipped
+        """
+        counts = Counter({'conversations': 0, 'messages': 0, 'events': 0, 'skipped': 0})
+        with self._bulk_loader(defer_indexes) as load:
+            for batch in batched(records, batch_size):
+                counts.update(load(batch))
+        return dict(counts)
+
+    @contextmanager
+    def _bulk_loader(self, defer_indexes: bool = False) -> Iterator[Callable[[List[Dict]], Dict[str, int]]]:
+        """
+        Yield a function that imports one batch of bulk records and returns its counts.
+        With `defer_indexes` every batch goes into one write transaction, which
+        commits when the block exits (see `import_records`).
+        """
+        loaded_events = False
+
+        def load(cursor, batch: List[Dict]) -> Dict[str, int]:
+            nonlocal loaded_events
+            counts = self._import_batch(cursor, batch)
+            loaded_events = loaded_events or counts['events'] > 0
+            return counts
+
+        try:
+            if defer_indexes:
+                with self.pool.writer() as cursor:
+                    cursor.execute('SELECT COALESCE(MAX(rowid), 0) FROM messages')
+                    last_message = cursor.fetchone()[0]
+                    indexes = self._drop_bulk_indexes(cursor)
+                    yield functools.partial(load, cursor)
+                    self._restore_bulk_indexes(cursor, indexes, last_message)
+            else:
+                def load_in_transaction(batch: List[Dict]) -> Dict[str, int]:
+                    with self.pool.writer() as cursor:
+                        return load(cursor, batch)
+                yield load_in_transaction
+        finally:
+            if loaded_events:
+                self.invalidate_analytics()
+
+    def _drop_bulk_indexes(self, cursor) -> List[str]:
+        """Drop the secondary indexes and FTS insert trigger of the bulk-loaded tables; returns their SQL."""
+        cursor.execute(f'''
+            SELECT name, sql
+            FROM sqlite_master
+            WHERE ((type = 'index' AND sql IS NOT NULL) OR name = 'messages_fts_insert')
+              AND tbl_name IN ({', '.join('?' * len(BULK_INDEXED_TABLES))})
+        ''', BULK_INDEXED_TABLES)
+        dropped = cursor.fetchall()
+        for name, sql in dropped:
+            kind = 'TRIGGER' if name == 'messages_fts_insert' else 'INDEX'
+            cursor.execute(f'DROP {kind} {name}')
+        return [sql for _, sql in dropped]
+
+    def _restore_bulk_indexes(self, cursor, indexes: List[str], last_message: int):
+        """Recreate what `_drop_bulk_indexes` dropped and add the messages after `last_message` to the search index."""
+        for sql in indexes:
+            cursor.execute(sql)
+        cursor.execute('''
+            INSERT INTO messages_fts (rowid, content)
+            SELECT rowid, content FROM messages WHERE rowid > ?
+        ''', (last_message,))
+
+    def _import_batch(self, cursor, records: List[Dict]) -> Dict[str, int]:
+        """Insert one batch of bulk records and index, roll up and sketch its new events."""
+        counts = {'conversations': 0, 'messages': 0, 'events': 0, 'skipped': 0}
+        rows = {record_type: [] for record_type in BULK_RECORDS}
+        for record in records:
+            record_type = record.get('type')
+            if record_type not in rows:
+                raise ValueError(f"Unknown record type: {record_type}")
+            try:
+                rows[record_type].append(self._bulk_row(record_type, record))
+            except KeyError as e:
+                raise ValueError(f"{record_type} record is missing {e}")
+        
+        cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM events')
+        last_seq = cursor.fetchone()[0]
+        for record_type, (table, columns) in BULK_RECORDS.items():
+            if not rows[record_type]:
+                continue
+            cursor.executemany(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows[record_type]
+            )
+            counts[table] += cursor.rowcount
+            counts['skipped'] += len(rows[record_type]) - cursor.rowcount
+        if not rows['event']:
+            return counts
+        
+        # Writes are serialized, so the new events are exactly those past the old maximum
+        cursor.execute('''
+            SELECT seq, event_id, conversation_id, user_id, ts, key_words, citations
+            FROM events
+            WHERE seq > ?
+            ORDER BY seq
+        ''', (last_seq,))
+        events = cursor.fetchall()
+        days = {}
+        for _, _, _, _, ts, _, _ in events:
+            day = ts - ts % DAY_MS
+            if day not in days:
+                days[day] = self._format_ms(day)[:10]
+        self._index_event_keywords(cursor, [
+            (event_id, conversation_id, days[ts - ts % DAY_MS], ts, key_words)
+            for _, event_id, conversation_id, _, ts, key_words, _ in events
+            if key_words
+        ])
+        self._index_event_citations(cursor, [
+            (event_id, conversation_id, ts, citations)
+            for _, event_id, conversation_id, _, ts, _, citations in events
+            if citations
+        ])
+        self._add_rollups(cursor, 'seq > ?', (last_seq,))
+        if self.sketches:
+            self.pool.after_commit(functools.partial(self.sketches.add_events, [
+                (seq, ts, user_id, self._split_pipe(key_words))
+                for seq, _, _, user_id, ts, key_words, _ in events
+            ]))
+        return counts
+
     def _hash_password(self, password: str, salt: str) -> str:
         """Hash a password with a salt using SHA-256."""
         password_bytes = password.encode('utf-8')
         salt_bytes = salt.encode('utf-8')
         return hashlib.sha256(password_bytes + salt_bytes).hexdigest()
     
-    def register_user(self, user_id: str, password: str) -> str:
-        """Register a new user with a password and create a single conversation."""
+    def register_user(self, user_id: str, password: str, conversation_id: Optional[str] = None) -> str:
+        """Register a new user with a password and create a single conversation (with a new ID unless given)."""
         try:
-            # Check if user already exists
-            self.cursor.execute(
-                'SELECT user_id FROM users WHERE user_id = ?',
-                (user_id,)
-            )
-            if self.cursor.fetchone():
-                return False
-            
             # Generate salt and hash password
             salt = secrets.token_hex(16)
             password_hash = self._hash_password(password, salt)
+            new_conversation_id = conversation_id or str(uuid.uuid4())
             
-            # Start transaction for creating user and conversation together
-            self.conn.execute('BEGIN TRANSACTION')
+            # Single transaction for creating user and conversation together
+            def write(cursor):
+                # Check if user already exists
+                cursor.execute(
+                    'SELECT user_id FROM users WHERE user_id = ?',
+                    (user_id,)
+                )
+                if cursor.fetchone():
+                    return False
+                
+                # Insert user
+                cursor.execute(
+                    'INSERT INTO users (user_id, password_hash, salt) VALUES (?, ?, ?)',
+                    (user_id, password_hash, salt)
+                )
+                
+                # Create a single conversation for this user
+                cursor.execute(
+                    'INSERT INTO conversations (id, user_id) VALUES (?, ?)',
+                    (new_conversation_id, user_id)
+                )
+                return new_conversation_id
             
-            # Insert user
-            self.cursor.execute(
-                'INSERT INTO users (user_id, password_hash, salt) VALUES (?, ?, ?)',
-                (user_id, password_hash, salt)
-            )
-            
-            # Create a single conversation for this user
-            conversation_id = str(uuid.uuid4())
-            self.cursor.execute(
-                'INSERT INTO conversations (id, user_id) VALUES (?, ?)',
-                (conversation_id, user_id)
-            )
-            
-            self.conn.commit()
-            return conversation_id
+            return self._write(write)
         except Exception as e:
-            self.conn.rollback()
             print(f"Error registering user: {e}")
             return
     
@@ -123,11 +1316,12 @@ class ConversationDB:
         """Authenticate a user with password."""
         try:
             # Get user's salt and password hash
-            self.cursor.execute(
-                'SELECT password_hash, salt FROM users WHERE user_id = ?',
-                (user_id,)
-            )
-            result = self.cursor.fetchone()
+            with self.pool.reader() as cursor:
+                cursor.execute(
+                    'SELECT password_hash, salt FROM users WHERE user_id = ?',
+                    (user_id,)
+                )
+                result = cursor.fetchone()
             if not result:
                 return False
             
@@ -144,28 +1338,29 @@ class ConversationDB:
         
     def get_user_conversation_id(self, user_id: str) -> Optional[str]:
         """Get the conversation ID for a user (each user has exactly one conversation)."""
-        self.cursor.execute(
-            'SELECT id FROM conversations WHERE user_id = ?',
-            (user_id,)
-        )
-        result = self.cursor.fetchone()
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                'SELECT id FROM conversations WHERE user_id = ?',
+                (user_id,)
+            )
+            result = cursor.fetchone()
         return result[0] if result else None
     
-    def create_conversation(self, user_id: str) -> str:
-        conversation_id = str(uuid.uuid4())
-        self.cursor.execute(
+    def create_conversation(self, user_id: str, conversation_id: Optional[str] = None) -> str:
+        conversation_id = conversation_id or str(uuid.uuid4())
+        self._write(lambda cursor: cursor.execute(
             'INSERT INTO conversations (id, user_id) VALUES (?, ?)',
             (conversation_id, user_id)
-        )
-        self.conn.commit()
+        ))
         return conversation_id
     
     def get_conversation(self, conversation_id: str) -> Optional[Dict]:
-        self.cursor.execute(
-            'SELECT * FROM conversations WHERE id = ?',
-            (conversation_id,)
-        )
-        result = self.cursor.fetchone()
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                'SELECT * FROM conversations WHERE id = ?',
+                (conversation_id,)
+            )
+            result = cursor.fetchone()
         if not result:
             return None
         return {
@@ -176,82 +1371,185 @@ class ConversationDB:
         }
     
     def add_message(self, conversation_id: str, user_id: str, content: str):
-        message_id = str(uuid.uuid4())
+        def write(cursor):
+            self._insert_message(cursor, conversation_id, user_id, content)
+            cursor.execute(
+                'UPDATE conversations SET updated_at = ? WHERE id = ?',
+                (datetime.now(), conversation_id)
+            )
         
-        self.cursor.execute(
-            'INSERT INTO messages (id, conversation_id, user_id, content) VALUES (?, ?, ?, ?)',
-            (message_id, conversation_id, user_id, content)
-        )
-        self.cursor.execute(
-            'UPDATE conversations SET updated_at = ? WHERE id = ?',
-            (datetime.now(), conversation_id)
-        )
-        self.conn.commit()
+        self._write(write)
     
-    def get_messages(self, conversation_id: str, keywords: Optional[List[str]] = None) -> List[Dict]:
+    @staticmethod
+    def _fts_query(keywords: List[str]) -> Optional[str]:
+        """
+        Build a trigram FTS5 query matching messages that contain any of the keywords,
+        as `content LIKE '%keyword%'` does. Returns None when the index can't answer
+        it: a keyword shorter than a trigram, or one holding the LIKE wildcards % or _.
         """
-        Get messages for a conversation with optional keyword filtering.
+        if any(len(keyword) < 3 or '%' in keyword or '_' in keyword for keyword in keywords):
+            return None
+        return ' OR '.join('"' + keyword.replace('"', '""') + '"' for keyword in keywords)
+
+    @staticmethod
+    def encode_cursor(message: Dict) -> str:
+        """Encode a message's (created_at_ms, id) position as an opaque pagination cursor."""
+        raw = json.dumps([message['created_at_ms'], message['id']])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, str]:
+        """Decode a pagination cursor back into (created_at_ms, id)."""
+        try:
+            created_at_ms, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            created_at_ms = int(created_at_ms)
+            # Both are bound as SQLite parameters: a 64-bit integer and a text ID
+            if not isinstance(message_id, str) or not -2**63 <= created_at_ms < 2**63:
+                raise ValueError
+        except (ValueError, TypeError, OverflowError, UnicodeError):
+            raise ValueError(f"Invalid message cursor: {cursor}")
+        return created_at_ms, message_id
+
+    def get_messages(
+        self,
+        conversation_id: str,
+        keywords: Optional[List[str]] = None,
+        rank: bool = False,
+        highlight: bool = False,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Get messages for a conversation with optional keyword filtering and keyset pagination.
         Args:
             conversation_id: ID of the conversation
-            keywords: Optional list of keywords to filter messages
+            keywords: Optional list of keywords; messages containing any of them as a
+                case-insensitive substring match. Blank keywords are ignored. The first
+                `search_scan_rows` messages of the page are scanned with LIKE, and the
+                full-text index is only used when they don't settle the page, or to rank
+                or highlight. A keyword the index can't answer (shorter than three
+                characters) is always scanned for, and is neither ranked nor highlighted.
+            rank: Order keyword matches by relevance (bm25) instead of creation time
+            highlight: Include a `snippet` with the matched text wrapped in <mark> tags
+            limit: Optional maximum number of messages to return
+            before: Optional cursor; only return messages older than it (the newest `limit` of them)
+            after: Optional cursor; only return messages newer than it (the oldest `limit` of them)
         Returns:
-            List of messages ordered by creation timestamp
+            List of messages ordered by creation timestamp (or relevance if ranked)
         """
-        if keywords:
-            placeholders = ','.join('?' * len(keywords))
-            keyword_conditions = ' OR '.join(['content LIKE ?' for _ in keywords])
-            keyword_params = [f'%{keyword}%' for keyword in keywords]
-            
-            self.cursor.execute(f'''
-                SELECT 
-                    id,
-                    user_id,
-                    content,
-                    created_at
-                FROM messages 
-                WHERE conversation_id = ?
-                AND ({keyword_conditions})
-                ORDER BY created_at ASC
-            ''', [conversation_id] + keyword_params)
-        else:
-            self.cursor.execute('''
-                SELECT 
-                    id,
-                    user_id,
-                    content,
-                    created_at
-                FROM messages 
-                WHERE conversation_id = ?
-                ORDER BY created_at ASC
-            ''', (conversation_id,))
+        keywords = [keyword for keyword in keywords or [] if keyword.strip()]
+        match = self._fts_query(keywords) if keywords else None
+        if rank and keywords and (before or after):
+            raise ValueError("Pagination cursors cannot be combined with relevance ranking")
         
-        return [
-            {
+        conditions = ['m.conversation_id = ?']
+        params = [conversation_id]
+        if after:
+            conditions.append('(m.created_at_ms, m.id) > (?, ?)')
+            params.extend(self.decode_cursor(after))
+        if before:
+            conditions.append('(m.created_at_ms, m.id) < (?, ?)')
+            params.extend(self.decode_cursor(before))
+        
+        # Paging backwards reads newest-first from the index, then flips the page
+        backwards = bool(before) and not after
+        order_by = 'm.created_at_ms DESC, m.id DESC' if backwards else 'm.created_at_ms, m.id'
+        limit_clause = '' if limit is None else 'LIMIT ?'
+        limit_params = [] if limit is None else [limit]
+        columns = 'm.id, m.user_id, m.content, m.created_at, m.created_at_ms'
+        
+        rows = None
+        snippet_column = ''
+        if keywords and not (match and (rank or highlight)):
+            # Scan in page order with LIKE, which stops at the first `limit` matches. When
+            # the index can take over, only the first `search_scan_rows` messages are
+            # scanned: a full page among them, or all of the conversation, is the answer.
+            scan_conditions = conditions + ['(' + ' OR '.join('m.content LIKE ?' for _ in keywords) + ')']
+            scan_params = params + [f'%{keyword}%' for keyword in keywords]
+            stop = []
+            if match:
+                # First message past the scanned ones, if the conversation goes on that far
+                stop = self._fetchall(
+                    f"SELECT m.created_at_ms, m.id FROM messages m WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT 1 OFFSET ?",
+                    params + [self.search_scan_rows]
+                )
+            if stop:
+                scan_conditions.append(f"(m.created_at_ms, m.id) {'>' if backwards else '<'} (?, ?)")
+                scan_params.extend(stop[0])
+            rows = self._fetchall(f'''
+                SELECT {columns}
+                FROM messages m
+                WHERE {' AND '.join(scan_conditions)}
+                ORDER BY {order_by}
+                {limit_clause}
+            ''', scan_params + limit_params)
+            if stop and (limit is None or len(rows) < limit):
+                rows = None
+        
+        if rows is None:
+            from_clause = 'messages m'
+            if match:
+                snippet_column = ", snippet(messages_fts, 0, '<mark>', '</mark>', '...', 16)" if highlight else ''
+                # The index drives the join; left to the planner, it walks the conversation
+                # and runs the full-text query once per message
+                from_clause = 'messages_fts CROSS JOIN messages m ON m.rowid = messages_fts.rowid'
+                conditions.insert(0, 'messages_fts MATCH ?')
+                params.insert(0, match)
+                if rank:
+                    order_by = 'messages_fts.rank, m.created_at_ms, m.id'
+            rows = self._fetchall(f'''
+                SELECT {columns}{snippet_column}
+                FROM {from_clause}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {order_by}
+                {limit_clause}
+            ''', params + limit_params)
+        if backwards:
+            rows.reverse()
+        
+        messages = []
+        for row in rows:
+            message = {
                 'id': row[0],
                 'user_id': row[1],
                 'content': row[2],
-                'created_at': row[3]
+                'created_at': row[3],
+                'created_at_ms': row[4]
             }
-            for row in self.cursor.fetchall()
-        ]
+            if snippet_column:
+                message['snippet'] = row[5]
+            messages.append(message)
+        return messages
+
+    def iter_messages(self, conversation_id: str, keywords: Optional[List[str]] = None, batch_size: int = 500) -> Iterator[Dict]:
+        """
+        Yield every message of a conversation in creation order.
+        Messages are read one keyset page at a time, so memory stays bounded by
+        `batch_size` and no reader connection is held between pages.
+        """
+        after = None
+        while True:
+            page = self.get_messages(conversation_id, keywords, limit=batch_size, after=after)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = self.encode_cursor(page[-1])
+
+    def rebuild_message_search_index(self):
+        """Rebuild the full-text message index from the messages table."""
+        with self.pool.writer() as cursor:
+            cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
     
     def create_event(self, user_id: str, conversation_id: str, query: str, score: float, citations: List[str] = None) -> str:
         """Create a new event entry with citations and key_words."""
-        event_id = str(uuid.uuid4())
-        
-        # Process citations
-        citations_str = "|".join(citations) if citations else ""
-        
-        # Process key_words from query
-        key_words = "|".join(query.split())
-        
-        self.cursor.execute(
-            'INSERT INTO events (event_id, conversation_id, user_id, query, score, citations, key_words) VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (event_id, conversation_id, user_id, query, score, citations_str, key_words)
+        event_id = self._write(
+            lambda cursor: self._insert_event(cursor, user_id, conversation_id, query, score, citations)
         )
-        self.conn.commit()
+        self.invalidate_analytics()
         return event_id
     
+    @cached_analytics
     def get_hot_keywords(self, limit: int = 10, conversation_id: Optional[str] = None) -> List[Tuple[str, int]]:
         """
         Get the most frequently used keywords across all queries.
@@ -261,44 +1559,35 @@ class ConversationDB:
         Returns:
             List of tuples (keyword, frequency) ordered by frequency desc
         """
+        source, params = self._keyword_source(None)
         base_query = '''
-            WITH RECURSIVE
-            split(keyword, rest, key_words) AS (
+            SELECT 
+                k.keyword,
+                ek.frequency
+            FROM (
                 SELECT 
-                    '',
-                    key_words || '|',
-                    key_words
-                FROM events
+                    keyword_id,
+                    SUM(count) as frequency
+                FROM ({source})
                 {where_clause}
-                UNION ALL
-                SELECT
-                    substr(rest, 0, instr(rest, '|')),
-                    substr(rest, instr(rest, '|') + 1),
-                    key_words
-                FROM split
-                WHERE rest <> ''
-            )
-            SELECT 
-                keyword,
-                COUNT(*) as frequency
-            FROM split
-            WHERE keyword <> ''
-            GROUP BY keyword
-            ORDER BY frequency DESC, keyword
+                GROUP BY keyword_id
+            ) ek
+            JOIN keywords k ON k.keyword_id = ek.keyword_id
+            ORDER BY ek.frequency DESC, k.keyword
             LIMIT ?
         '''
         
         if conversation_id:
-            where_clause = "WHERE key_words IS NOT NULL AND conversation_id = ?"
-            query = base_query.format(where_clause=where_clause)
-            self.cursor.execute(query, (conversation_id, limit))
+            where_clause = "WHERE conversation_id = ?"
+            query = base_query.format(source=source, where_clause=where_clause)
+            rows = self._fetchall_analytics(query, params + [conversation_id, limit])
         else:
-            where_clause = "WHERE key_words IS NOT NULL"
-            query = base_query.format(where_clause=where_clause)
-            self.cursor.execute(query, (limit,))
+            query = base_query.format(source=source, where_clause="")
+            rows = self._fetchall_analytics(query, params + [limit])
         
-        return [(row[0], row[1]) for row in self.cursor.fetchall()]
+        return [(row[0], row[1]) for row in rows]
     
+    @cached_analytics
     def get_hourly_query_count(self, days: int = 7) -> List[Dict]:
         """
         Get hourly query counts for the past N days.
@@ -307,20 +1596,29 @@ class ConversationDB:
         Returns:
             List of dicts with hour and count
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_ms, partial_hour, first_full_hour = self._window(days, HOUR_MS)
         
-        self.cursor.execute('''
+        rows = self._fetchall_analytics('''
             SELECT 
-                strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
-                COUNT(*) as count
-            FROM events
-            WHERE timestamp >= ?
-            GROUP BY hour
-            ORDER BY hour
-        ''', (cutoff_date.isoformat(),))
+                strftime('%Y-%m-%d %H:00:00', hour / 1000, 'unixepoch') as hour,
+                SUM(count) as count
+            FROM (
+                SELECT hour, event_count as count
+                FROM hourly_rollups
+                WHERE hour >= ?
+                UNION ALL
+                SELECT ?, COUNT(*)
+                FROM events
+                WHERE ts >= ? AND ts < ?
+            )
+            GROUP BY 1
+            HAVING SUM(count) > 0
+            ORDER BY 1
+        ''', (first_full_hour, partial_hour, cutoff_ms, first_full_hour))
         
-        return [{'hour': row[0], 'count': row[1]} for row in self.cursor.fetchall()]
+        return [{'hour': row[0], 'count': row[1]} for row in rows]
     
+    @cached_analytics
     def get_top_users(self, days: Optional[int] = None, limit: int = 10, conversation_id: Optional[str] = None) -> List[Dict]:
         """
         Get top users ranked by number of queries.
@@ -331,42 +1629,93 @@ class ConversationDB:
         Returns:
             List of dicts with user_id and count
         """
-        conditions = []
-        params = []
+        conversation_filter = "AND conversation_id = ?" if conversation_id else ""
+        conversation_params = [conversation_id] if conversation_id else []
         
-        if days is not None:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            conditions.append("timestamp >= ?")
-            params.append(cutoff_date.isoformat())
-        
-        if conversation_id:
-            conditions.append("conversation_id = ?")
-            params.append(conversation_id)
-        
-        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if days is None:
+            # All-time rankings read the coarser daily buckets
+            source = f'''
+                SELECT user_id, event_count as count
+                FROM daily_rollups
+                WHERE 1 = 1 {conversation_filter}
+            '''
+            params = conversation_params
+        else:
+            cutoff_ms, _, first_full_hour = self._window(days, HOUR_MS)
+            source = f'''
+                SELECT user_id, event_count as count
+                FROM hourly_rollups
+                WHERE hour >= ? {conversation_filter}
+                UNION ALL
+                SELECT user_id, 1
+                FROM events
+                WHERE ts >= ? AND ts < ? {conversation_filter}
+            '''
+            params = [first_full_hour] + conversation_params + [cutoff_ms, first_full_hour] + conversation_params
         
         query = f'''
             SELECT 
                 user_id,
-                COUNT(*) as count
-            FROM events
-            {where_clause}
+                SUM(count) as count
+            FROM ({source})
             GROUP BY user_id
-            ORDER BY count DESC
+            ORDER BY count DESC, user_id
             LIMIT ?
         '''
         
         params.append(limit)
-        self.cursor.execute(query, params)
+        rows = self._fetchall_analytics(query, params)
         
         return [
             {
                 'user_id': row[0],
                 'count': row[1]
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
     
+    def get_approximate_hot_keywords(self, limit: int = 10, days: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Get hot keywords from the streaming sketches instead of the event history.
+        Each frequency is an upper bound that overestimates the true count by at most `error`.
+        Args:
+            limit: Maximum number of hot keywords to return
+            days: Optional number of days to look back (None for all time), rounded out to whole UTC days
+        Returns:
+            List of dicts with keyword, frequency and error, or None if sketches are disabled
+            or the window is longer than the sketch retention
+        """
+        if not self.sketches or (days is not None and days > self.sketches.retention_days):
+            return None
+        return [
+            {'keyword': keyword, 'frequency': count, 'error': error}
+            for keyword, count, error in self.sketches.top_keywords(limit, days, self._now_ms())
+        ]
+
+    def get_approximate_top_users(self, days: Optional[int] = None, limit: int = 10) -> Optional[Dict]:
+        """
+        Get top users and the number of distinct users from the streaming sketches.
+        Counts are upper bounds that overestimate by at most `error`; the distinct
+        user count has a relative standard error of about 1.6%.
+        Args:
+            days: Optional number of days to look back (None for all time), rounded out to whole UTC days
+            limit: Maximum number of users to return
+        Returns:
+            Dict with users (user_id, count, error) and distinct_users, or None if sketches
+            are disabled or the window is longer than the sketch retention
+        """
+        if not self.sketches or (days is not None and days > self.sketches.retention_days):
+            return None
+        users, distinct_users = self.sketches.top_users(limit, days, self._now_ms())
+        return {
+            'users': [
+                {'user_id': user_id, 'count': count, 'error': error}
+                for user_id, count, error in users
+            ],
+            'distinct_users': distinct_users,
+        }
+
+    @cached_analytics
     def get_daily_average_scores(self, days: int = 7) -> List[Dict]:
         """
         Get average query scores grouped by day for the past N days.
@@ -376,68 +1725,98 @@ class ConversationDB:
         Returns:
             List of dicts with date and average score
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_ms, partial_day, first_full_day = self._window(days, DAY_MS)
         
-        self.cursor.execute('''
+        rows = self._fetchall_analytics('''
             SELECT 
-                date(timestamp) as day,
-                ROUND(AVG(score), 2) as avg_score
-            FROM events
-            WHERE timestamp >= ?
-            AND score IS NOT NULL 
-            AND score > 0
-            GROUP BY day
-            ORDER BY day DESC
-        ''', (cutoff_date.isoformat(),))
+                date(day / 1000, 'unixepoch') as day,
+                ROUND(SUM(score_sum) / SUM(score_count), 2) as avg_score
+            FROM (
+                SELECT day, score_sum, score_count
+                FROM daily_rollups
+                WHERE day >= ?
+                UNION ALL
+                SELECT ?, score, 1
+                FROM events
+                WHERE ts >= ? AND ts < ?
+                AND score IS NOT NULL 
+                AND score > 0
+            )
+            GROUP BY 1
+            HAVING SUM(score_count) > 0
+            ORDER BY 1 DESC
+        ''', (first_full_day, partial_day, cutoff_ms, first_full_day))
         
         return [
             {
                 'date': row[0],
                 'avg_score': float(row[1]) if row[1] is not None else None
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
     
-    def get_citation_counts(self) -> List[Dict]:
+    def _daily_score_totals(self, days: int = 7) -> List[Tuple[str, float, int]]:
+        """
+        Sum and count of positive scores per day for the past N days; the mergeable
+        form of `get_daily_average_scores`, used to combine shards.
+        """
+        cutoff_ms, partial_day, first_full_day = self._window(days, DAY_MS)
+        return self._fetchall_analytics('''
+            SELECT 
+                date(day / 1000, 'unixepoch') as day,
+                SUM(score_sum),
+                SUM(score_count)
+            FROM (
+                SELECT day, score_sum, score_count
+                FROM daily_rollups
+                WHERE day >= ?
+                UNION ALL
+                SELECT ?, score, 1
+                FROM events
+                WHERE ts >= ? AND ts < ?
+                AND score IS NOT NULL 
+                AND score > 0
+            )
+            GROUP BY 1
+            HAVING SUM(score_count) > 0
+        ''', (first_full_day, partial_day, cutoff_ms, first_full_day))
+    
+    @cached_analytics
+    def get_citation_counts(self, days: Optional[int] = None, conversation_id: Optional[str] = None) -> List[Dict]:
         """
         Get total query counts grouped by citation.
+        Args:
+            days: Optional number of days to look back (None for all time)
+            conversation_id: Optional conversation ID to filter results
         Returns:
             List of dicts with citation and count
         """
-        self.cursor.execute('''
-            WITH RECURSIVE
-            split(citation, rest, citations) AS (
-                SELECT 
-                    '',
-                    citations || '|',
-                    citations
-                FROM events
-                WHERE citations IS NOT NULL
-                UNION ALL
-                SELECT
-                    substr(rest, 0, instr(rest, '|')),
-                    substr(rest, instr(rest, '|') + 1),
-                    citations
-                FROM split
-                WHERE rest <> ''
-            )
+        source, params = self._citation_source(None if days is None else self._cutoff_ms(days))
+        where_clause = ""
+        
+        if conversation_id:
+            where_clause = "WHERE conversation_id = ?"
+            params.append(conversation_id)
+        
+        rows = self._fetchall_analytics(f'''
             SELECT 
                 citation,
-                COUNT(*) as count
-            FROM split
-            WHERE citation <> ''
+                SUM(count) as count
+            FROM ({source})
+            {where_clause}
             GROUP BY citation
             ORDER BY count DESC, citation
-        ''')
+        ''', params)
         
         return [
             {
                 'citation': row[0],
                 'count': row[1]
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
     
+    @cached_analytics
     def get_daily_top_keywords(self, days: int = 7, limit: int = 10) -> List[Dict]:
         """
         Get top keywords for each day in the past N days.
@@ -447,37 +1826,25 @@ class ConversationDB:
         Returns:
             List of dicts with date and top keywords
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        self.cursor.execute('''
-            WITH RECURSIVE
-            split(keyword, rest, key_words, day) AS (
+        source, params = self._keyword_source(self._cutoff_ms(days))
+        rows = self._fetchall_analytics(f'''
+            WITH
+            daily_counts AS (
                 SELECT 
-                    '',
-                    key_words || '|',
-                    key_words,
-                    date(timestamp)
-                FROM events
-                WHERE key_words IS NOT NULL
-                AND timestamp >= ?
-                UNION ALL
-                SELECT
-                    substr(rest, 0, instr(rest, '|')),
-                    substr(rest, instr(rest, '|') + 1),
-                    key_words,
-                    day
-                FROM split
-                WHERE rest <> ''
+                    day,
+                    keyword_id,
+                    SUM(count) as count
+                FROM ({source})
+                GROUP BY day, keyword_id
             ),
             daily_keywords AS (
                 SELECT 
-                    day,
-                    keyword,
-                    COUNT(*) as count,
-                    ROW_NUMBER() OVER (PARTITION BY day ORDER BY COUNT(*) DESC, keyword) as rank
-                FROM split
-                WHERE keyword <> ''
-                GROUP BY day, keyword
+                    dc.day,
+                    k.keyword,
+                    dc.count,
+                    ROW_NUMBER() OVER (PARTITION BY dc.day ORDER BY dc.count DESC, k.keyword) as rank
+                FROM daily_counts dc
+                JOIN keywords k ON k.keyword_id = dc.keyword_id
             )
             SELECT 
                 day,
@@ -486,13 +1853,13 @@ class ConversationDB:
             FROM daily_keywords
             WHERE rank <= ?
             ORDER BY day DESC, count DESC, keyword
-        ''', (cutoff_date.isoformat(), limit))
+        ''', params + [limit])
         
         results = []
         current_day = None
         day_keywords = []
         
-        for row in self.cursor.fetchall():
+        for row in rows:
             day, keyword, count = row
             
             if current_day != day and current_day is not None:
@@ -516,6 +1883,7 @@ class ConversationDB:
         
         return results
     
+    @cached_analytics
     def get_daily_user_engagement(self, days: int = 7) -> List[Dict]:
         """
         Get daily user engagement stats for the past N days.
@@ -524,24 +1892,31 @@ class ConversationDB:
         Returns:
             List of dicts with date, user_id, and event count
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_ms, partial_day, first_full_day = self._window(days, DAY_MS)
         
-        self.cursor.execute('''
+        rows = self._fetchall_analytics('''
             SELECT 
-                date(timestamp) as day,
+                date(day / 1000, 'unixepoch') as day,
                 user_id,
-                COUNT(*) as event_count
-            FROM events
-            WHERE timestamp >= ?
-            GROUP BY day, user_id
-            ORDER BY day DESC, event_count DESC
-        ''', (cutoff_date.isoformat(),))
+                SUM(count) as event_count
+            FROM (
+                SELECT day, user_id, event_count as count
+                FROM daily_rollups
+                WHERE day >= ?
+                UNION ALL
+                SELECT ?, user_id, 1
+                FROM events
+                WHERE ts >= ? AND ts < ?
+            )
+            GROUP BY 1, user_id
+            ORDER BY 1 DESC, event_count DESC, user_id
+        ''', (first_full_day, partial_day, cutoff_ms, first_full_day))
         
         results = []
         current_day = None
         day_users = []
         
-        for row in self.cursor.fetchall():
+        for row in rows:
             day, user_id, count = row
             
             if current_day != day and current_day is not None:
@@ -565,48 +1940,232 @@ class ConversationDB:
         
         return results
     
+    @cached_analytics
+    def get_dashboard(self, days: int = 7, limit: int = 10, panels: Tuple[str, ...] = DASHBOARD_PANELS) -> Dict[str, list]:
+        """
+        Compute several insight panels in one read transaction.
+        Panels that aggregate the same data share one scan: top users, daily scores
+        and engagement are derived from a single (day, user) aggregate over the
+        rollups, and both keyword panels from a single (day, keyword) aggregate over
+        the keyword index. Every panel covers the same window, including hot
+        keywords and top users, and each has the shape returned by its
+        single-panel method.
+        Args:
+            days: Number of days to look back
+            limit: Maximum number of hot keywords, top users and keywords per day
+            panels: Names from DASHBOARD_PANELS to compute
+        Returns:
+            Dict mapping each requested panel name to its data
+        """
+        unknown = set(panels) - set(DASHBOARD_PANELS)
+        if unknown:
+            raise ValueError(f"Unknown dashboard panels: {', '.join(sorted(unknown))}")
+        wanted = set(panels)
+        cutoff_ms, partial_hour, first_full_hour = self._window(days, HOUR_MS)
+        _, partial_day, first_full_day = self._window(days, DAY_MS)
+        
+        # (panel, day, key, value) rows from the shared scans
+        rows = []
+        with self.pool.analytics_reader() as cursor:
+            # One snapshot for all statements
+            if 'hourly_query_count' in wanted:
+                cursor.execute('''
+                    SELECT 'hourly_query_count', NULL, hour, SUM(count)
+                    FROM (
+                        SELECT hour, event_count as count
+                        FROM hourly_rollups
+                        WHERE hour >= ?
+                        UNION ALL
+                        SELECT ?, COUNT(*)
+                        FROM events
+                        WHERE ts >= ? AND ts < ?
+                    )
+                    GROUP BY hour
+                    HAVING SUM(count) > 0
+                ''', (first_full_hour, partial_hour, cutoff_ms, first_full_hour))
+                rows += cursor.fetchall()
+            
+            user_parts = {
+                'top_users': ('''
+                    SELECT 'top_users', NULL, user_id, count FROM (
+                        SELECT user_id, SUM(count) as count
+                        FROM daily_users
+                        GROUP BY user_id
+                        ORDER BY count DESC, user_id
+                        LIMIT ?
+                    )
+                ''', [limit]),
+                'daily_scores': ('''
+                    SELECT 'daily_scores', day, NULL, ROUND(SUM(score_sum) / SUM(score_count), 2)
+                    FROM daily_users
+                    GROUP BY day
+                    HAVING SUM(score_count) > 0
+                ''', []),
+                'daily_user_engagement': ('''
+                    SELECT 'daily_user_engagement', day, user_id, count
+                    FROM daily_users
+                ''', []),
+            }
+            selected = [part for panel, part in user_parts.items() if panel in wanted]
+            if selected:
+                cursor.execute('''
+                    WITH daily_users AS MATERIALIZED (
+                        SELECT
+                            day,
+                            user_id,
+                            SUM(count) as count,
+                            SUM(score_sum) as score_sum,
+                            SUM(score_count) as score_count
+                        FROM (
+                            SELECT day, user_id, event_count as count, score_sum, score_count
+                            FROM daily_rollups
+                            WHERE day >= ?
+                            UNION ALL
+                            SELECT ?, user_id, 1, CASE WHEN score > 0 THEN score ELSE 0 END, score > 0
+                            FROM events
+                            WHERE ts >= ? AND ts < ?
+                        )
+                        GROUP BY day, user_id
+                    )
+                ''' + ' UNION ALL '.join(sql for sql, _ in selected),
+                    [first_full_day, partial_day, cutoff_ms, first_full_day]
+                    + [param for _, params in selected for param in params])
+                rows += cursor.fetchall()
+            
+            keyword_parts = {
+                'hot_keywords': ('''
+                    SELECT 'hot_keywords', NULL, keyword, count FROM (
+                        SELECT k.keyword, SUM(dc.count) as count
+                        FROM daily_counts dc
+                        JOIN keywords k ON k.keyword_id = dc.keyword_id
+                        GROUP BY dc.keyword_id
+                        ORDER BY count DESC, k.keyword
+                        LIMIT ?
+                    )
+                ''', [limit]),
+                'daily_top_keywords': ('''
+                    SELECT 'daily_top_keywords', day, keyword, count FROM (
+                        SELECT
+                            dc.day,
+                            k.keyword,
+                            dc.count,
+                            ROW_NUMBER() OVER (PARTITION BY dc.day ORDER BY dc.count DESC, k.keyword) as rank
+                        FROM daily_counts dc
+                        JOIN keywords k ON k.keyword_id = dc.keyword_id
+                    )
+                    WHERE rank <= ?
+                ''', [limit]),
+            }
+            selected = [part for panel, part in keyword_parts.items() if panel in wanted]
+            if selected:
+                source, source_params = self._keyword_source(cutoff_ms)
+                cursor.execute(f'''
+                    WITH daily_counts AS MATERIALIZED (
+                        SELECT day, keyword_id, SUM(count) as count
+                        FROM ({source})
+                        GROUP BY day, keyword_id
+                    )
+                ''' + ' UNION ALL '.join(sql for sql, _ in selected),
+                    source_params + [param for _, params in selected for param in params])
+                rows += cursor.fetchall()
+            
+            if 'citation_counts' in wanted:
+                source, source_params = self._citation_source(cutoff_ms)
+                cursor.execute(f'''
+                    SELECT 'citation_counts', NULL, citation, SUM(count)
+                    FROM ({source})
+                    GROUP BY citation
+                ''', source_params)
+                rows += cursor.fetchall()
+        
+        grouped = defaultdict(list)
+        for panel, day, key, value in rows:
+            grouped[panel].append((day, key, value))
+        
+        dates = {}
+        def date(day) -> str:
+            # Keyword rows carry the date string, rollup rows the epoch-ms day start
+            if isinstance(day, str):
+                return day
+            if day not in dates:
+                dates[day] = self._format_ms(day)[:10]
+            return dates[day]
+        
+        def ranked(panel: str) -> List[Tuple[Any, int]]:
+            return sorted(((key, value) for _, key, value in grouped[panel]), key=lambda item: (-item[1], item[0]))
+        
+        def by_day(panel: str) -> List[Tuple[str, List[Tuple[str, int]]]]:
+            days_rows = defaultdict(list)
+            for day, key, value in grouped[panel]:
+                days_rows[date(day)].append((key, value))
+            return [
+                (day, sorted(days_rows[day], key=lambda item: (-item[1], item[0])))
+                for day in sorted(days_rows, reverse=True)
+            ]
+        
+        compute = {
+            'hot_keywords': lambda: ranked('hot_keywords'),
+            'hourly_query_count': lambda: [
+                {'hour': self._format_ms(hour), 'count': count}
+                for _, hour, count in sorted(grouped['hourly_query_count'])
+            ],
+            'top_users': lambda: [
+                {'user_id': user_id, 'count': count}
+                for user_id, count in ranked('top_users')
+            ],
+            'citation_counts': lambda: [
+                {'citation': citation, 'count': count}
+                for citation, count in ranked('citation_counts')
+            ],
+            'daily_scores': lambda: [
+                {'date': date(day), 'avg_score': float(avg_score)}
+                for day, _, avg_score in sorted(grouped['daily_scores'], reverse=True)
+            ],
+            'daily_top_keywords': lambda: [
+                {'date': day, 'keywords': [{'keyword': k, 'count': c} for k, c in day_counts]}
+                for day, day_counts in by_day('daily_top_keywords')
+            ],
+            'daily_user_engagement': lambda: [
+                {'date': day, 'users': [{'user_id': u, 'count': c} for u, c in day_counts]}
+                for day, day_counts in by_day('daily_user_engagement')
+            ],
+        }
+        return {panel: compute[panel]() for panel in panels}
+
     def close(self):
-        self.conn.close()
+        # Flush any buffered writes before the connections go away
+        if self.group_writer:
+            self.group_writer.close()
+        if self.sketches:
+            self.sketches.close()
+        if self.columnar:
+            self.columnar.close()
+        self.pool.close()
 
     def add_message_with_response_and_event(self, conversation_id: str, user_message: str, user_id: str, bot_message: str, query: str, score: float, citations: List[str] = None):
         """Add user message, bot response, and create event in a single transaction."""
-        try:
-            self.conn.execute('BEGIN TRANSACTION')
-            
+        def write(cursor):
             # Add user message
-            user_message_id = str(uuid.uuid4())
-            self.cursor.execute(
-                'INSERT INTO messages (id, conversation_id, user_id, content) VALUES (?, ?, ?, ?)',
-                (user_message_id, conversation_id, user_id, user_message)
-            )
+            self._insert_message(cursor, conversation_id, user_id, user_message)
             
             # Add bot message
-            bot_message_id = str(uuid.uuid4())
-            self.cursor.execute(
-                'INSERT INTO messages (id, conversation_id, user_id, content) VALUES (?, ?, ?, ?)',
-                (bot_message_id, conversation_id, BOT_ID, bot_message)
-            )
+            self._insert_message(cursor, conversation_id, BOT_ID, bot_message)
             
             # Update conversation timestamp
-            self.cursor.execute(
+            cursor.execute(
                 'UPDATE conversations SET updated_at = ? WHERE id = ?',
                 (datetime.now(), conversation_id)
             )
             
             # Create event
-            event_id = str(uuid.uuid4())
-            citations_str = "|".join(citations) if citations else ""
-            key_words = "|".join(query.split())
-            
-            self.cursor.execute(
-                'INSERT INTO events (event_id, conversation_id, user_id, query, score, citations, key_words) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                (event_id, conversation_id, user_id, query, score, citations_str, key_words)
-            )
-            
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            self._insert_event(cursor, user_id, conversation_id, query, score, citations)
+        
+        self._write(write)
+        self.invalidate_analytics()
 
-# Initialize conversation database
-CONVERSATION_DB = ConversationDB()
+# Initialize conversation database, split across DB_SHARDS files when configured
+if DB_SHARDS > 1:
+    from app.clients.sharded_db import ShardedConversationDB
+    CONVERSATION_DB = ShardedConversationDB()
+else:
+    CONVERSATION_DB = ConversationDB()
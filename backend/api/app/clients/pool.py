@@ -0,0 +1,206 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+
+class ReaderSet:
+    """
+    Bounded set of read-only connections, opened on demand and reused.
+    At most `max_readers` connections are borrowed at once; further callers
+    wait for one to be returned.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_readers: int):
+        self.max_readers = max_readers
+        self._connect = connect
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_readers)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+class ConnectionPool:
+    """
+    SQLite connection pool with a single serialized writer and two bounded
+    sets of reader connections.
+
+    All connections run in WAL mode, so readers keep reading from their own
+    snapshot while the writer commits, and only writers contend on the lock.
+    Request reads (messages, logins) and analytics use separate readers, so
+    long aggregate queries never hold the connections request handlers need.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_readers: Optional[int] = None,
+        busy_timeout_ms: int = 5000,
+        analytics_readers: int = 2,
+        analytics_cache_kb: int = 32768,
+        analytics_mmap_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_readers = max_readers or os.cpu_count() or 4
+        self.analytics_cache_kb = analytics_cache_kb
+        self.analytics_mmap_bytes = analytics_mmap_bytes
+        # Resolved now, since analytics connections are opened lazily
+        self._analytics_uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        # Callbacks registered by the open write transaction, run once it commits
+        self._after_commit: List[Callable[[], None]] = []
+
+        self._readers = ReaderSet(lambda: self._connect(read_only=True), self.max_readers)
+        self._analytics_readers = ReaderSet(self._connect_analytics, analytics_readers)
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        # isolation_level=None puts the driver in autocommit mode so that
+        # transactions are only ever opened explicitly by `writer()`.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    def _connect_analytics(self) -> sqlite3.Connection:
+        # Opened read-only at the file level; the writer has already put the
+        # database in WAL mode, which a read-only connection cannot change.
+        conn = sqlite3.connect(
+            self._analytics_uri,
+            uri=True,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA query_only=ON')
+        # Large page cache and memory-mapped reads for scans over the event tables
+        conn.execute(f'PRAGMA cache_size=-{int(self.analytics_cache_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.analytics_mmap_bytes)}')
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Cursor]:
+        """Borrow a read-only connection and yield a cursor on it."""
+        conn = self._readers.acquire()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._readers.release(conn)
+
+    @contextmanager
+    def analytics_reader(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Borrow an analytics connection and yield a cursor inside a read
+        transaction, so every statement in the block sees the same WAL snapshot.
+        Waits while `analytics_readers` connections are already in use.
+        """
+        conn = self._analytics_readers.acquire()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            try:
+                yield cursor
+            finally:
+                cursor.execute('COMMIT')
+        finally:
+            cursor.close()
+            self._analytics_readers.release(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Run the enclosed statements in a single write transaction.
+        Commits on success and rolls back if the block raises. Callbacks
+        registered with `after_commit` run, in order and still under the write
+        lock, only once the commit succeeded; a rollback discards them.
+        """
+        with self._write_lock:
+            self._after_commit = []
+            cursor = self._writer.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                self._writer.rollback()
+                self._after_commit = []
+                raise
+            else:
+                self._writer.commit()
+            finally:
+                cursor.close()
+            callbacks, self._after_commit = self._after_commit, []
+            for callback in callbacks:
+                callback()
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        Run `callback` once the open write transaction commits. Must be called
+        inside `writer()`; use it for in-memory state derived from the rows
+        being written, which must not change if the transaction rolls back.
+        """
+        self._after_commit.append(callback)
+
+    @contextmanager
+    def savepoint(self, cursor: sqlite3.Cursor, name: str) -> Iterator[sqlite3.Cursor]:
+        """
+        Run the enclosed statements in a savepoint of the open write transaction.
+        If the block raises, its statements and the `after_commit` callbacks it
+        registered are rolled back, and the transaction carries on.
+        """
+        registered = len(self._after_commit)
+        cursor.execute(f'SAVEPOINT {name}')
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute(f'ROLLBACK TO {name}')
+            del self._after_commit[registered:]
+            raise
+        finally:
+            cursor.execute(f'RELEASE {name}')
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        self._readers.close()
+        self._analytics_readers.close()
@@ -0,0 +1,398 @@
+import hashlib
+import os
+import sys
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.clients.db import BULK_RECORDS, ConversationDB, DASHBOARD_PANELS, batched
+from app.sketches import HyperLogLog, SpaceSaving
+from app.constant import (
+    DB_PATH, DB_SHARDS, ANALYTICS_SKETCH_PATH, EVENT_RETENTION_DAYS, MESSAGE_RETENTION_DAYS, ARCHIVE_DIR
+)
+
+# Limit passed to shards so that rankings can be merged exactly before truncating
+UNLIMITED = sys.maxsize
+
+def shard_path(path: str, index: int) -> str:
+    """Path of shard `index` of a file, e.g. conversations.db -> conversations-0.db."""
+    root, ext = os.path.splitext(path)
+    return f"{root}-{index}{ext}"
+
+def _ranked(counts: Dict[Any, int], limit: Optional[int] = None) -> List[Tuple[Any, int]]:
+    """Order like ORDER BY count DESC, key; str order matches SQLite's BINARY collation."""
+    items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return items if limit is None else items[:limit]
+
+def _summed(results: Iterable[Iterable[Dict]], key: str) -> Counter:
+    counts = Counter()
+    for result in results:
+        for row in result:
+            counts[row[key]] += row['count']
+    return counts
+
+def _merged_by_day(results: Iterable[List[Dict]], items_key: str, name_key: str, limit: Optional[int] = None) -> List[Dict]:
+    """Merge per-day rankings ({'date', items_key: [{name_key, 'count'}]}), newest day first."""
+    days = defaultdict(Counter)
+    for result in results:
+        for entry in result:
+            counts = days[entry['date']]
+            for item in entry[items_key]:
+                counts[item[name_key]] += item['count']
+    return [
+        {
+            'date': day,
+            items_key: [{name_key: name, 'count': count} for name, count in _ranked(days[day], limit)]
+        }
+        for day in sorted(days, reverse=True)
+    ]
+
+class ShardedConversationDB:
+    """
+    ConversationDB split across several SQLite files by conversation.
+
+    Each shard is a complete ConversationDB with its own connection pool, so
+    every shard has its own writer and writes to different shards commit in
+    parallel. A conversation, with all of its messages and events, lives on the
+    shard picked by a stable hash of its ID. Users are hashed by user ID and get
+    a conversation ID that hashes to the same shard, so registration and login
+    stay on one shard. Analytics fan out to every shard and the partial results
+    are merged; rankings are merged from untruncated shard results, so they
+    match a single database exactly.
+
+    A single conversation, such as the shared slack conversation, is never
+    split, so its writes are still serialized on one shard's writer.
+    """
+
+    # Pure helpers that never touch the database
+    encode_cursor = staticmethod(ConversationDB.encode_cursor)
+    decode_cursor = staticmethod(ConversationDB.decode_cursor)
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        shards: int = DB_SHARDS,
+        sketch_path: Optional[str] = ANALYTICS_SKETCH_PATH,
+        **kwargs,
+    ):
+        """
+        Args:
+            db_path: Base path; shard i is stored at `shard_path(db_path, i)`
+            shards: Number of shards
+            sketch_path: Base path of the sketch checkpoints, one per shard (None to disable)
+            **kwargs: Passed on to every shard's ConversationDB
+        """
+        if shards < 1:
+            raise ValueError(f"Shard count must be at least 1: {shards}")
+        self.shards = [
+            ConversationDB(
+                shard_path(db_path, index),
+                sketch_path=shard_path(sketch_path, index) if sketch_path else None,
+                **kwargs
+            )
+            for index in range(shards)
+        ]
+        # Fan-out queries run on one thread per shard; SQLite releases the GIL while it works
+        self.executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="conversation-db-shard")
+
+    def _shard_index(self, key: str) -> int:
+        # Python's hash() is salted per process, which would move rows between restarts
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % len(self.shards)
+
+    def shard_for(self, conversation_id: str) -> ConversationDB:
+        """The shard holding a conversation and its messages and events."""
+        return self.shards[self._shard_index(conversation_id)]
+
+    def _user_shard(self, user_id: str) -> ConversationDB:
+        return self.shards[self._shard_index(user_id)]
+
+    def _new_conversation_id(self, user_id: str) -> str:
+        """A new conversation ID that hashes to the user's shard (about `len(shards)` tries)."""
+        index = self._shard_index(user_id)
+        while True:
+            conversation_id = str(uuid.uuid4())
+            if self._shard_index(conversation_id) == index:
+                return conversation_id
+
+    def _fan_out(self, call: Callable[[ConversationDB], Any]) -> List[Any]:
+        """Run `call` on every shard in parallel and return the results in shard order."""
+        return list(self.executor.map(call, self.shards))
+
+    # Users and conversations
+
+    def register_user(self, user_id: str, password: str) -> str:
+        return self._user_shard(user_id).register_user(
+            user_id, password, conversation_id=self._new_conversation_id(user_id)
+        )
+
+    def authenticate_user(self, user_id: str, password: str) -> bool:
+        return self._user_shard(user_id).authenticate_user(user_id, password)
+
+    def get_user_conversation_id(self, user_id: str) -> Optional[str]:
+        return self._user_shard(user_id).get_user_conversation_id(user_id)
+
+    def create_conversation(self, user_id: str) -> str:
+        return self._user_shard(user_id).create_conversation(
+            user_id, conversation_id=self._new_conversation_id(user_id)
+        )
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        return self.shard_for(conversation_id).get_conversation(conversation_id)
+
+    # Messages and events, routed to the conversation's shard
+
+    def add_message(self, conversation_id: str, user_id: str, content: str):
+        self.shard_for(conversation_id).add_message(conversation_id, user_id, content)
+
+    def get_messages(self, conversation_id: str, *args, **kwargs) -> List[Dict]:
+        return self.shard_for(conversation_id).get_messages(conversation_id, *args, **kwargs)
+
+    def iter_messages(self, conversation_id: str, keywords: Optional[List[str]] = None, batch_size: int = 500) -> Iterator[Dict]:
+        return self.shard_for(conversation_id).iter_messages(conversation_id, keywords, batch_size)
+
+    def rebuild_message_search_index(self):
+        self._fan_out(lambda shard: shard.rebuild_message_search_index())
+
+    def create_event(self, user_id: str, conversation_id: str, query: str, score: float, citations: List[str] = None) -> str:
+        return self.shard_for(conversation_id).create_event(user_id, conversation_id, query, score, citations)
+
+    def add_message_with_response_and_event(self, conversation_id: str, user_message: str, user_id: str, bot_message: str, query: str, score: float, citations: List[str] = None):
+        self.shard_for(conversation_id).add_message_with_response_and_event(
+            conversation_id, user_message, user_id, bot_message, query, score, citations
+        )
+
+    # Maintenance
+
+    def invalidate_analytics(self):
+        for shard in self.shards:
+            shard.invalidate_analytics()
+
+    def get_analytics_cache_stats(self) -> Dict:
+        """Analytics cache counters summed over the shards' caches."""
+        stats = [shard.get_analytics_cache_stats() for shard in self.shards]
+        combined = {
+            key: sum(shard_stats[key] for shard_stats in stats)
+            for key in ('size', 'maxsize', 'hits', 'misses', 'evictions')
+        }
+        lookups = combined['hits'] + combined['misses']
+        combined['ttl'] = stats[0]['ttl']
+        combined['hit_rate'] = round(combined['hits'] / lookups, 4) if lookups else 0.0
+        return combined
+
+    def rebuild_rollups(self) -> Dict:
+        return dict(sum((Counter(result) for result in self._fan_out(lambda shard: shard.rebuild_rollups())), Counter()))
+
+    def backfill_keyword_index(self, batch_size: int = 1000) -> int:
+        return sum(self._fan_out(lambda shard: shard.backfill_keyword_index(batch_size)))
+
+    def backfill_citation_index(self, batch_size: int = 1000) -> int:
+        return sum(self._fan_out(lambda shard: shard.backfill_citation_index(batch_size)))
+
+    def compact_partitions(
+        self,
+        retention_days: int = EVENT_RETENTION_DAYS,
+        message_retention_days: Optional[int] = MESSAGE_RETENTION_DAYS,
+        archive_dir: str = ARCHIVE_DIR,
+    ) -> List[Dict]:
+        """See `ConversationDB.compact_partitions`; each shard archives into its own subdirectory."""
+        months = {}
+        for index, shard in enumerate(self.shards):
+            for result in shard.compact_partitions(
+                retention_days, message_retention_days, os.path.join(archive_dir, f"shard-{index}")
+            ):
+                entry = months.setdefault(result['month'], {'month': result['month'], 'events': 0, 'messages': 0, 'archives': []})
+                entry['events'] += result['events']
+                entry['messages'] += result['messages']
+                entry['archives'] += result['archives']
+        return [months[month] for month in sorted(months)]
+
+    def get_partitions(self) -> List[Dict]:
+        months = {}
+        for partitions in self._fan_out(lambda shard: shard.get_partitions()):
+            for partition in partitions:
+                entry = months.get(partition['month'])
+                if entry is None:
+                    months[partition['month']] = dict(partition)
+                    continue
+                for key in ('events', 'messages', 'archived_events', 'archived_messages'):
+                    entry[key] += partition[key]
+                for key in ('events_compacted', 'messages_compacted'):
+                    entry[key] = entry[key] or partition[key]
+        return [months[month] for month in sorted(months, reverse=True)]
+
+    # Bulk import and export
+
+    def export_records(
+        self,
+        types: Tuple[str, ...] = tuple(BULK_RECORDS),
+        conversation_id: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Dict]:
+        """See `ConversationDB.export_records`; shards are exported one after another, each as its own snapshot."""
+        if conversation_id:
+            return self.shard_for(conversation_id).export_records(types, conversation_id, batch_size)
+        return self._export_shards(types, batch_size)
+
+    def _export_shards(self, types: Tuple[str, ...], batch_size: int) -> Iterator[Dict]:
+        for index, shard in enumerate(self.shards):
+            for record in shard.export_records(types, None, batch_size):
+                # Every shard has its own copy of the shared slack conversation
+                if record['type'] == 'conversation' and self._shard_index(record['id']) != index:
+                    continue
+                yield record
+
+    def import_records(self, records: Iterable[Dict], batch_size: int = 50000, defer_indexes: bool = False) -> Dict[str, int]:
+        """See `ConversationDB.import_records`; each batch is split by shard and the shards load in parallel."""
+        counts = Counter({'conversations': 0, 'messages': 0, 'events': 0, 'skipped': 0})
+        with ExitStack() as stack:
+            loaders = [stack.enter_context(shard._bulk_loader(defer_indexes)) for shard in self.shards]
+            for batch in batched(records, batch_size):
+                parts = [[] for _ in self.shards]
+                for record in batch:
+                    key = 'id' if record.get('type') == 'conversation' else 'conversation_id'
+                    if key not in record:
+                        raise ValueError(f"{record.get('type')} record is missing '{key}'")
+                    parts[self._shard_index(record[key])].append(record)
+                for result in self.executor.map(lambda load, part: load(part) if part else {}, loaders, parts):
+                    counts.update(result)
+        return dict(counts)
+
+    # Analytics, fanned out and merged
+
+    def get_hot_keywords(self, limit: int = 10, conversation_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        if conversation_id:
+            return self.shard_for(conversation_id).get_hot_keywords(limit, conversation_id)
+        counts = Counter()
+        for keywords in self._fan_out(lambda shard: shard.get_hot_keywords(UNLIMITED)):
+            for keyword, frequency in keywords:
+                counts[keyword] += frequency
+        return _ranked(counts, limit)
+
+    def get_hourly_query_count(self, days: int = 7) -> List[Dict]:
+        counts = _summed(self._fan_out(lambda shard: shard.get_hourly_query_count(days)), 'hour')
+        return [{'hour': hour, 'count': counts[hour]} for hour in sorted(counts)]
+
+    def get_top_users(self, days: Optional[int] = None, limit: int = 10, conversation_id: Optional[str] = None) -> List[Dict]:
+        if conversation_id:
+            return self.shard_for(conversation_id).get_top_users(days, limit, conversation_id)
+        counts = _summed(self._fan_out(lambda shard: shard.get_top_users(days, UNLIMITED)), 'user_id')
+        return [{'user_id': user_id, 'count': count} for user_id, count in _ranked(counts, limit)]
+
+    def get_citation_counts(self, days: Optional[int] = None, conversation_id: Optional[str] = None) -> List[Dict]:
+        if conversation_id:
+            return self.shard_for(conversation_id).get_citation_counts(days, conversation_id)
+        counts = _summed(self._fan_out(lambda shard: shard.get_citation_counts(days)), 'citation')
+        return [{'citation': citation, 'count': count} for citation, count in _ranked(counts)]
+
+    def get_daily_average_scores(self, days: int = 7) -> List[Dict]:
+        """See `ConversationDB.get_daily_average_scores`; averages are computed from the shards' sums and counts."""
+        totals = defaultdict(lambda: [0.0, 0])
+        for rows in self._fan_out(lambda shard: shard._daily_score_totals(days)):
+            for day, score_sum, score_count in rows:
+                totals[day][0] += score_sum
+                totals[day][1] += score_count
+        results = []
+        # Round in SQLite, whose ROUND() differs from Python's round() on ties
+        with self.shards[0].pool.reader() as cursor:
+            for day in sorted(totals, reverse=True):
+                score_sum, score_count = totals[day]
+                cursor.execute('SELECT ROUND(? / ?, 2)', (score_sum, score_count))
+                results.append({'date': day, 'avg_score': float(cursor.fetchone()[0])})
+        return results
+
+    def get_daily_top_keywords(self, days: int = 7, limit: int = 10) -> List[Dict]:
+        return _merged_by_day(
+            self._fan_out(lambda shard: shard.get_daily_top_keywords(days, UNLIMITED)), 'keywords', 'keyword', limit
+        )
+
+    def get_daily_user_engagement(self, days: int = 7) -> List[Dict]:
+        return _merged_by_day(self._fan_out(lambda shard: shard.get_daily_user_engagement(days)), 'users', 'user_id')
+
+    def get_dashboard(self, days: int = 7, limit: int = 10, panels: Tuple[str, ...] = DASHBOARD_PANELS) -> Dict[str, list]:
+        """
+        See `ConversationDB.get_dashboard`. Every shard computes its panels in one
+        read transaction; daily scores are merged from sums and counts instead.
+        """
+        unknown = set(panels) - set(DASHBOARD_PANELS)
+        if unknown:
+            raise ValueError(f"Unknown dashboard panels: {', '.join(sorted(unknown))}")
+        shard_panels = tuple(panel for panel in panels if panel != 'daily_scores')
+        results = self._fan_out(
+            lambda shard: shard.get_dashboard(days=days, limit=UNLIMITED, panels=shard_panels)
+        ) if shard_panels else []
+
+        def hot_keywords():
+            counts = Counter()
+            for result in results:
+                for keyword, frequency in result['hot_keywords']:
+                    counts[keyword] += frequency
+            return _ranked(counts, limit)
+
+        def hourly_query_count():
+            counts = _summed((result['hourly_query_count'] for result in results), 'hour')
+            return [{'hour': hour, 'count': counts[hour]} for hour in sorted(counts)]
+
+        merge = {
+            'hot_keywords': hot_keywords,
+            'hourly_query_count': hourly_query_count,
+            'top_users': lambda: [
+                {'user_id': user_id, 'count': count}
+                for user_id, count in _ranked(_summed((result['top_users'] for result in results), 'user_id'), limit)
+            ],
+            'citation_counts': lambda: [
+                {'citation': citation, 'count': count}
+                for citation, count in _ranked(_summed((result['citation_counts'] for result in results), 'citation'))
+            ],
+            'daily_scores': lambda: self.get_daily_average_scores(days),
+            'daily_top_keywords': lambda: _merged_by_day(
+                (result['daily_top_keywords'] for result in results), 'keywords', 'keyword', limit
+            ),
+            'daily_user_engagement': lambda: _merged_by_day(
+                (result['daily_user_engagement'] for result in results), 'users', 'user_id'
+            ),
+        }
+        return {panel: merge[panel]() for panel in panels}
+
+    def _sketch_shards(self, days: Optional[int]) -> bool:
+        return all(shard.sketches for shard in self.shards) and (
+            days is None or days <= self.shards[0].sketches.retention_days
+        )
+
+    def get_approximate_hot_keywords(self, limit: int = 10, days: Optional[int] = None) -> Optional[List[Dict]]:
+        """See `ConversationDB.get_approximate_hot_keywords`; the shards' summaries are merged."""
+        if not self._sketch_shards(days):
+            return None
+        now_ms = ConversationDB._now_ms()
+        merged = SpaceSaving.merge(
+            [shard.sketches.keyword_summary(days, now_ms) for shard in self.shards],
+            self.shards[0].sketches.capacity
+        )
+        return [
+            {'keyword': keyword, 'frequency': count, 'error': error}
+            for keyword, count, error in merged.top(limit)
+        ]
+
+    def get_approximate_top_users(self, days: Optional[int] = None, limit: int = 10) -> Optional[Dict]:
+        """See `ConversationDB.get_approximate_top_users`; users active on several shards are counted once."""
+        if not self._sketch_shards(days):
+            return None
+        now_ms = ConversationDB._now_ms()
+        summaries = [shard.sketches.user_summary(days, now_ms) for shard in self.shards]
+        merged = SpaceSaving.merge([users for users, _ in summaries], self.shards[0].sketches.capacity)
+        distinct = HyperLogLog(self.shards[0].sketches.precision)
+        for _, shard_distinct in summaries:
+            distinct.update(shard_distinct)
+        return {
+            'users': [
+                {'user_id': user_id, 'count': count, 'error': error}
+                for user_id, count, error in merged.top(limit)
+            ],
+            'distinct_users': distinct.count(),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
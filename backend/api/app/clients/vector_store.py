@@ -1,12 +1,165 @@
 import bs4
-from app.constant import OPENAI_API_KEY
+import json
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.constant import (
+    OPENAI_API_KEY, VECTOR_STORE_DIR,
+    VECTOR_INDEX, VECTOR_IVF_NLIST, VECTOR_IVF_NPROBE, VECTOR_IVF_MIN_ROWS,
+    EMBEDDING_MODEL, EMBEDDING_CACHE, EMBEDDING_CACHE_PATH,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY, EMBEDDING_MAX_RETRIES, EMBEDDING_BACKOFF_SECONDS
+)
+from app.embedding_cache import EmbeddingCache
+from app.embedding_store import EmbeddingStore
+from app.ingestion import EmbeddingPipeline, EmbeddingProgress
+from app.vector_index import VECTOR_INDEXES
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+class MmapVectorStore(VectorStore):
+    """
+    LangChain vector store persisted in an EmbeddingStore directory.
+
+    Chunks are written to disk as they are added, and opening the store maps
+    the embedding matrix instead of loading it, so restarts take the same time
+    at any size and never re-embed anything. Searches go through `index`
+    (see app.vector_index); search kwargs such as `nprobe` are passed to it.
+    With a `cache`, added texts are only embedded if the cache misses them;
+    with a `pipeline`, the misses are embedded in concurrent, retried batches.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        directory: str = VECTOR_STORE_DIR,
+        index: str = 'exact',
+        cache: Optional[EmbeddingCache] = None,
+        pipeline: Optional[EmbeddingPipeline] = None,
+        **index_params: Any
+    ):
+        if index not in VECTOR_INDEXES:
+            raise ValueError(f"Unknown vector index: {index}")
+        self.embedding = embedding
+        self.cache = cache
+        self.pipeline = pipeline
+        self.store = EmbeddingStore(directory)
+        self.index = VECTOR_INDEXES[index](self.store, **index_params)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors, _ = self.embed_texts(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def embed_texts(
+        self,
+        texts: List[str],
+        progress: Optional[EmbeddingProgress] = None
+    ) -> Tuple[List[List[float]], Dict[str, int]]:
+        """
+        Embed texts through the cache and the pipeline, if any.
+        Args:
+            texts: Texts to embed
+            progress: Updated as pipeline batches complete
+        Returns:
+            One embedding per text, and counts of chunks, cache hits and misses, and texts embedded
+        """
+        if self.pipeline is not None:
+            embed_documents = lambda misses: self.pipeline.embed(misses, progress)
+        else:
+            embed_documents = self.embedding.embed_documents
+        if self.cache is not None:
+            return self.cache.embed(texts, embed_documents)
+        stats = {'chunks': len(texts), 'hits': 0, 'misses': len(texts), 'embedded': len(texts)}
+        return embed_documents(texts), stats
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Add texts whose embeddings are already computed."""
+        ids = [doc_id or str(uuid.uuid4()) for doc_id in (ids or [None] * len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        self.store.append(vectors, [
+            {'id': doc_id, 'text': text, 'metadata': metadata}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ])
+        self.index.update()
+        return ids
+
+    def has_source(self, source: str) -> bool:
+        """Whether chunks with `source` metadata (the file_id of an upload) are in the store."""
+        # Records are encoded by json.dumps, so a chunk of `source` contains this
+        needle = f'"source": {json.dumps(source)}'.encode('utf-8')
+        return any(
+            record['metadata'].get('source') == source
+            for record in self.store.scan_records(needle)
+        )
+
+    def _document(self, row: int) -> Document:
+        record = self.store.record(row)
+        return Document(id=record['id'], page_content=record['text'], metadata=record['metadata'])
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self._document(row), score) for row, score in self.index.search(embedding, k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        directory: str = VECTOR_STORE_DIR,
+        index: str = 'exact',
+        cache: Optional[EmbeddingCache] = None,
+        pipeline: Optional[EmbeddingPipeline] = None,
+        **kwargs: Any,
+    ) -> "MmapVectorStore":
+        vector_store = cls(embedding, directory, index, cache, pipeline)
+        vector_store.add_texts(texts, metadatas, **kwargs)
+        return vector_store
 
 def get_vector_store():
-    # Initialize embeddings and vector store
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    vector_store = InMemoryVectorStore(embeddings)
-    return vector_store
+    # Initialize embeddings and the persistent vector store
+    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL) if EMBEDDING_CACHE else None
+    pipeline = EmbeddingPipeline(
+        embeddings.embed_documents,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        concurrency=EMBEDDING_CONCURRENCY,
+        max_retries=EMBEDDING_MAX_RETRIES,
+        backoff=EMBEDDING_BACKOFF_SECONDS
+    )
+    if VECTOR_INDEX == 'ivf':
+        index_params = {'nlist': VECTOR_IVF_NLIST, 'nprobe': VECTOR_IVF_NPROBE, 'min_rows': VECTOR_IVF_MIN_ROWS}
+    else:
+        index_params = {}
+    return MmapVectorStore(embeddings, VECTOR_STORE_DIR, VECTOR_INDEX, cache, pipeline, **index_params)
 
 VECTOR_STORE = get_vector_store()
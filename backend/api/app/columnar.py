@@ -0,0 +1,369 @@
+import math
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.arrays import GrowableArray
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+class _Dictionary:
+    """Dictionary encoding of strings (or None) to dense int32 codes."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.codes: Dict[Optional[str], int] = {}
+        self._rank: Optional[np.ndarray] = None
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._rank = None
+        return code
+
+    def rank(self) -> np.ndarray:
+        """Position of each code in SQLite's BINARY collation order (NULL first)."""
+        if self._rank is None or len(self._rank) != len(self.values):
+            # Code point order of str matches byte order of their UTF-8 encoding
+            order = sorted(range(len(self.values)), key=lambda c: (self.values[c] is not None, self.values[c] or ''))
+            rank = np.empty(len(self.values), dtype=np.int64)
+            rank[order] = np.arange(len(self.values))
+            self._rank = rank
+        return self._rank
+
+class ColumnarEvents:
+    """
+    In-memory columnar copy of the `events` table for vectorized analytics.
+
+    Columns are int64 epoch-ms timestamps, dictionary-encoded user and
+    conversation ids, float64 scores (NaN for NULL), and CSR-style keyword and
+    citation lists: `*_indptr[i]:*_indptr[i + 1]` spans event i's entries in
+    `*_codes`, and `*_rows` holds the owning event of every entry.
+
+    `refresh()` appends events committed since the last call, and every query
+    method refreshes first. Query methods mirror the `ConversationDB` analytics
+    methods and return identical results.
+    """
+
+    def __init__(self, db, batch_size: int = 50000):
+        self.db = db
+        self.batch_size = batch_size
+        self.last_rowid = 0
+        self.users = _Dictionary()
+        self.conversations = _Dictionary()
+        self.keywords = _Dictionary()
+        self.citations = _Dictionary()
+        self._reset_columns()
+        self._lock = threading.Lock()
+        # Only used for ROUND(): SQLite rounds halves away from zero, and its
+        # algorithm differs from Python's round(), so reuse it for identical output
+        self._round_conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+    def _reset_columns(self):
+        self.ts = GrowableArray(np.int64)
+        self.user = GrowableArray(np.int32)
+        self.conversation = GrowableArray(np.int32)
+        self.score = GrowableArray(np.float64)
+        self.kw_indptr = GrowableArray(np.int64)
+        self.kw_indptr.extend([0])
+        self.kw_codes = GrowableArray(np.int32)
+        self.kw_rows = GrowableArray(np.int64)
+        self.cit_indptr = GrowableArray(np.int64)
+        self.cit_indptr.extend([0])
+        self.cit_codes = GrowableArray(np.int32)
+        self.cit_rows = GrowableArray(np.int64)
+        # Whether ts is non-decreasing, which lets windows be found by binary search
+        self._ts_sorted = True
+
+    def __len__(self) -> int:
+        return self.ts.size
+
+    def append(self, rows: List[Tuple]):
+        """
+        Append events to the columns.
+        Args:
+            rows: Tuples of (ts, user_id, conversation_id, score, key_words, citations)
+                with pipe-joined key_words and citations, in rowid order
+        """
+        if not rows:
+            return
+        first = self.ts.size
+        ts = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        users = [self.users.encode(row[1]) for row in rows]
+        conversations = [self.conversations.encode(row[2]) for row in rows]
+        scores = [math.nan if row[3] is None else row[3] for row in rows]
+
+        for column, indptr, codes, owners, dictionary in (
+            (4, self.kw_indptr, self.kw_codes, self.kw_rows, self.keywords),
+            (5, self.cit_indptr, self.cit_codes, self.cit_rows, self.citations),
+        ):
+            entries = [self.db._split_pipe(row[column]) for row in rows]
+            lengths = np.fromiter((len(e) for e in entries), dtype=np.int64, count=len(rows))
+            codes.extend([dictionary.encode(value) for values in entries for value in values])
+            owners.extend(np.repeat(np.arange(first, first + len(rows), dtype=np.int64), lengths))
+            indptr.extend(indptr.data[indptr.size - 1] + np.cumsum(lengths))
+
+        if self._ts_sorted and len(ts):
+            previous = self.ts.data[first - 1] if first else ts[0]
+            self._ts_sorted = bool(previous <= ts[0] and np.all(ts[1:] >= ts[:-1]))
+        self.ts.extend(ts)
+        self.user.extend(users)
+        self.conversation.extend(conversations)
+        self.score.extend(scores)
+
+    def refresh(self) -> int:
+        """
+        Load events committed since the previous refresh.
+        Returns:
+            Number of events appended
+        """
+        with self._lock:
+            max_rowid = self.db._max_event_rowid()
+            if self.last_rowid > max_rowid:
+                # The events table was recreated underneath us; start over
+                self.last_rowid = 0
+                self.users, self.conversations = _Dictionary(), _Dictionary()
+                self.keywords, self.citations = _Dictionary(), _Dictionary()
+                self._reset_columns()
+            appended = 0
+            while self.last_rowid < max_rowid:
+                rows = self.db._fetchall_analytics('''
+                    SELECT rowid, ts, user_id, conversation_id, score, key_words, citations
+                    FROM events
+                    WHERE rowid > ? AND rowid <= ?
+                    ORDER BY rowid
+                    LIMIT ?
+                ''', (self.last_rowid, max_rowid, self.batch_size))
+                if not rows:
+                    break
+                self.append([row[1:] for row in rows])
+                self.last_rowid = rows[-1][0]
+                appended += len(rows)
+            return appended
+
+    def _snapshot(self) -> Dict[str, np.ndarray]:
+        """Refresh, then take views of the columns that later appends will not disturb."""
+        self.refresh()
+        with self._lock:
+            return {
+                'ts': self.ts.view(),
+                'user': self.user.view(),
+                'conversation': self.conversation.view(),
+                'score': self.score.view(),
+                'kw_indptr': self.kw_indptr.view(),
+                'kw_codes': self.kw_codes.view(),
+                'kw_rows': self.kw_rows.view(),
+                'cit_indptr': self.cit_indptr.view(),
+                'cit_codes': self.cit_codes.view(),
+                'cit_rows': self.cit_rows.view(),
+                'ts_sorted': self._ts_sorted,
+                # Dictionaries are replaced, never cleared, if the table is reloaded
+                'users': self.users,
+                'conversations': self.conversations,
+                'keywords': self.keywords,
+                'citations': self.citations,
+            }
+
+    @staticmethod
+    def _since(cols: Dict[str, np.ndarray], cutoff_ms: Optional[int], prefix: Optional[str] = None):
+        """
+        Select events (or, with `prefix`, their keyword/citation entries) with ts >= cutoff_ms.
+        Returns a slice when timestamps are sorted and a boolean mask otherwise.
+        """
+        if cutoff_ms is None:
+            return slice(None)
+        ts = cols['ts']
+        if cols['ts_sorted']:
+            start = int(np.searchsorted(ts, cutoff_ms, side='left'))
+            return slice(int(cols[f'{prefix}_indptr'][start]), None) if prefix else slice(start, None)
+        mask = ts >= cutoff_ms
+        return mask[cols[f'{prefix}_rows']] if prefix else mask
+
+    @staticmethod
+    def _ranked(counts: np.ndarray, dictionary: _Dictionary, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Order codes with non-zero counts like ORDER BY count DESC, value."""
+        present = np.flatnonzero(counts)
+        order = np.lexsort((dictionary.rank()[present], -counts[present]))
+        if limit is not None:
+            order = order[:limit]
+        return [(dictionary.values[present[i]], int(counts[present[i]])) for i in order]
+
+    def _sql_round(self, values: List[float], digits: int) -> List[float]:
+        return [
+            self._round_conn.execute('SELECT ROUND(?, ?)', (value, digits)).fetchone()[0]
+            for value in values
+        ]
+
+    @staticmethod
+    def _grouped_by_day(days: np.ndarray, codes: np.ndarray, dictionary: _Dictionary, limit: Optional[int] = None) -> List[Tuple[int, List[Tuple[str, int]]]]:
+        """
+        Count (day, code) pairs and return, newest day first, each day's values
+        ordered by count desc, then value, keeping at most `limit` per day.
+        """
+        if not len(days):
+            return []
+        width = len(dictionary.values)
+        keys, counts = np.unique(days * width + codes, return_counts=True)
+        key_days, key_codes = keys // width, keys % width
+        order = np.lexsort((dictionary.rank()[key_codes], -counts, -key_days))
+        key_days, key_codes, counts = key_days[order], key_codes[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, key_days[1:] != key_days[:-1]])
+        results = []
+        for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+            if limit is not None:
+                end = min(end, start + limit)
+            results.append((
+                int(key_days[start]),
+                [(dictionary.values[key_codes[i]], int(counts[i])) for i in range(start, end)]
+            ))
+        return results
+
+    def _date(self, day: int) -> str:
+        return self.db._format_ms(day * DAY_MS)[:10]
+
+    def _cutoff(self, days: Optional[int]) -> Optional[int]:
+        return None if days is None else self.db._cutoff_ms(days)
+
+    @staticmethod
+    def _in_conversation(cols, conversations: np.ndarray, conversation_id: str) -> np.ndarray:
+        """Mask of the conversation codes equal to `conversation_id`."""
+        conversation = cols['conversations'].codes.get(conversation_id)
+        if conversation is None:
+            return np.zeros(len(conversations), dtype=bool)
+        return conversations == conversation
+
+    def _hot_keywords(self, cols, cutoff_ms: Optional[int], limit: int, conversation_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        window = self._since(cols, cutoff_ms, 'kw')
+        codes = cols['kw_codes'][window]
+        if conversation_id:
+            codes = codes[self._in_conversation(cols, cols['conversation'][cols['kw_rows'][window]], conversation_id)]
+        counts = np.bincount(codes, minlength=len(cols['keywords'].values))
+        return self._ranked(counts, cols['keywords'], limit)
+
+    def _hourly_query_count(self, cols, cutoff_ms: int) -> List[Dict]:
+        hours = cols['ts'][self._since(cols, cutoff_ms)] // HOUR_MS
+        if not len(hours):
+            return []
+        first = int(hours.min())
+        counts = np.bincount(hours - first)
+        return [
+            {'hour': self.db._format_ms((first + int(h)) * HOUR_MS), 'count': int(counts[h])}
+            for h in np.flatnonzero(counts)
+        ]
+
+    def _top_users(self, cols, cutoff_ms: Optional[int], limit: int, conversation_id: Optional[str] = None) -> List[Dict]:
+        window = self._since(cols, cutoff_ms)
+        users = cols['user'][window]
+        if conversation_id:
+            users = users[self._in_conversation(cols, cols['conversation'][window], conversation_id)]
+        counts = np.bincount(users, minlength=len(cols['users'].values))
+        return [
+            {'user_id': user_id, 'count': count}
+            for user_id, count in self._ranked(counts, cols['users'], limit)
+        ]
+
+    def _daily_average_scores(self, cols, cutoff_ms: int) -> List[Dict]:
+        window = self._since(cols, cutoff_ms)
+        scores = cols['score'][window]
+        scored = scores > 0
+        day_index = cols['ts'][window][scored] // DAY_MS
+        if not len(day_index):
+            return []
+        first = int(day_index.min())
+        sums = np.bincount(day_index - first, weights=scores[scored])
+        counts = np.bincount(day_index - first)
+        present = np.flatnonzero(counts)[::-1]
+        averages = self._sql_round([float(sums[d] / counts[d]) for d in present], 2)
+        return [
+            {'date': self._date(first + int(d)), 'avg_score': float(avg)}
+            for d, avg in zip(present, averages)
+        ]
+
+    def _citation_counts(self, cols, cutoff_ms: Optional[int], conversation_id: Optional[str] = None) -> List[Dict]:
+        window = self._since(cols, cutoff_ms, 'cit')
+        codes = cols['cit_codes'][window]
+        if conversation_id:
+            codes = codes[self._in_conversation(cols, cols['conversation'][cols['cit_rows'][window]], conversation_id)]
+        counts = np.bincount(codes, minlength=len(cols['citations'].values))
+        return [
+            {'citation': citation, 'count': count}
+            for citation, count in self._ranked(counts, cols['citations'])
+        ]
+
+    def _daily_top_keywords(self, cols, cutoff_ms: int, limit: int) -> List[Dict]:
+        window = self._since(cols, cutoff_ms, 'kw')
+        day_index = cols['ts'][cols['kw_rows'][window]] // DAY_MS
+        return [
+            {
+                'date': self._date(day),
+                'keywords': [{'keyword': keyword, 'count': count} for keyword, count in keywords]
+            }
+            for day, keywords in self._grouped_by_day(day_index, cols['kw_codes'][window], cols['keywords'], limit)
+        ]
+
+    def _daily_user_engagement(self, cols, cutoff_ms: int) -> List[Dict]:
+        window = self._since(cols, cutoff_ms)
+        day_index = cols['ts'][window] // DAY_MS
+        return [
+            {
+                'date': self._date(day),
+                'users': [{'user_id': user_id, 'count': count} for user_id, count in users]
+            }
+            for day, users in self._grouped_by_day(day_index, cols['user'][window], cols['users'])
+        ]
+
+    def get_hot_keywords(self, limit: int = 10, conversation_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        """See `ConversationDB.get_hot_keywords`."""
+        return self._hot_keywords(self._snapshot(), None, limit, conversation_id)
+
+    def get_hourly_query_count(self, days: int = 7) -> List[Dict]:
+        """See `ConversationDB.get_hourly_query_count`."""
+        return self._hourly_query_count(self._snapshot(), self._cutoff(days))
+
+    def get_top_users(self, days: Optional[int] = None, limit: int = 10, conversation_id: Optional[str] = None) -> List[Dict]:
+        """See `ConversationDB.get_top_users`."""
+        return self._top_users(self._snapshot(), self._cutoff(days), limit, conversation_id)
+
+    def get_daily_average_scores(self, days: int = 7) -> List[Dict]:
+        """See `ConversationDB.get_daily_average_scores`."""
+        return self._daily_average_scores(self._snapshot(), self._cutoff(days))
+
+    def get_citation_counts(self, days: Optional[int] = None, conversation_id: Optional[str] = None) -> List[Dict]:
+        """See `ConversationDB.get_citation_counts`."""
+        return self._citation_counts(self._snapshot(), self._cutoff(days), conversation_id)
+
+    def get_daily_top_keywords(self, days: int = 7, limit: int = 10) -> List[Dict]:
+        """See `ConversationDB.get_daily_top_keywords`."""
+        return self._daily_top_keywords(self._snapshot(), self._cutoff(days), limit)
+
+    def get_daily_user_engagement(self, days: int = 7) -> List[Dict]:
+        """See `ConversationDB.get_daily_user_engagement`."""
+        return self._daily_user_engagement(self._snapshot(), self._cutoff(days))
+
+    def get_dashboard(self, days: int = 7, limit: int = 10, panels: Optional[Tuple[str, ...]] = None) -> Dict[str, list]:
+        """See `ConversationDB.get_dashboard`; all panels share one snapshot and cutoff, and None computes every panel."""
+        cols = self._snapshot()
+        cutoff_ms = self._cutoff(days)
+        compute = {
+            'hot_keywords': lambda: self._hot_keywords(cols, cutoff_ms, limit),
+            'hourly_query_count': lambda: self._hourly_query_count(cols, cutoff_ms),
+            'top_users': lambda: self._top_users(cols, cutoff_ms, limit),
+            'citation_counts': lambda: self._citation_counts(cols, cutoff_ms),
+            'daily_scores': lambda: self._daily_average_scores(cols, cutoff_ms),
+            'daily_top_keywords': lambda: self._daily_top_keywords(cols, cutoff_ms, limit),
+            'daily_user_engagement': lambda: self._daily_user_engagement(cols, cutoff_ms),
+        }
+        if panels is None:
+            panels = tuple(compute)
+        unknown = set(panels) - set(compute)
+        if unknown:
+            raise ValueError(f"Unknown dashboard panels: {', '.join(sorted(unknown))}")
+        return {panel: compute[panel]() for panel in panels}
+
+    def close(self):
+        self._round_conn.close()
@@ -4,9 +4,82 @@ import os
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Persistent material vector store: memory-mapped embeddings plus an append-only chunk log
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(DATA_DIR, "vector_store"))
+# Vector index: "ivf" scans the VECTOR_IVF_NPROBE lists nearest the query (more lists, better
+# recall, slower), "exact" scans every chunk. IVF trains once the store has VECTOR_IVF_MIN_ROWS
+# chunks; VECTOR_IVF_NLIST=0 picks about sqrt(chunks) lists.
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "ivf")
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
+VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "20000"))
+# Embeddings of chunk texts, keyed by hash of model and text and shared by all materials,
+# so re-uploaded or overlapping documents only embed their new chunks
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.db"))
+# Embedding requests during ingestion: chunks per request, requests in flight across all
+# uploads, and retries per batch (exponential backoff with jitter from EMBEDDING_BACKOFF_SECONDS)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_SECONDS", "1"))
+# Uploads wait in INGESTION_DIR until indexed, at most INGESTION_MAX_JOBS at a time; files
+# left there by a restart are ingested again on startup
+INGESTION_DIR = os.getenv("INGESTION_DIR", os.path.join(DATA_DIR, "incoming"))
+os.makedirs(INGESTION_DIR, exist_ok=True)
+INGESTION_MAX_JOBS = int(os.getenv("INGESTION_MAX_JOBS", "2"))
+# Uploads are streamed to disk in UPLOAD_CHUNK_BYTES writes and rejected past UPLOAD_MAX_BYTES
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Retrieve tool caches: query embeddings by normalized query text, and serialized results by
+# normalized query and knowledge-base version (bumped whenever the materials change)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+
 # OpenAI API Key
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 
 # USER_CONVERSATION
 SLACK_CONVERSATION_ID='slack'
 BOT_ID = "AI"
+
+# SQLite
+DB_PATH = os.getenv("DB_PATH", "conversations.db")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MAX_READERS = int(os.getenv("DB_MAX_READERS", str(os.cpu_count() or 4)))
+# Keyword searches scan up to this many messages of a conversation with LIKE, and only go
+# through the full-text index when those don't fill the page (or to rank or highlight)
+MESSAGE_SEARCH_SCAN_ROWS = int(os.getenv("MESSAGE_SEARCH_SCAN_ROWS", "20000"))
+# Sharding: >1 hashes conversations across this many database files, each with its own writer
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+# Threads running ConversationDB calls for the async routers (readers + one writer per shard)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_MAX_READERS + DB_SHARDS)))
+# Group commit (off by default): batch writes from concurrent requests into one transaction of up
+# to DB_GROUP_COMMIT_BATCH_SIZE writes, waiting at most DB_GROUP_COMMIT_INTERVAL_MS for a batch to fill
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+DB_GROUP_COMMIT_INTERVAL_MS = int(os.getenv("DB_GROUP_COMMIT_INTERVAL_MS", "5"))
+DB_GROUP_COMMIT_BATCH_SIZE = int(os.getenv("DB_GROUP_COMMIT_BATCH_SIZE", "256"))
+# Analytics queries run on their own read-only connections, at most this many at once,
+# with a larger page cache (KiB, per connection) and memory-mapped reads (bytes)
+ANALYTICS_MAX_READERS = int(os.getenv("ANALYTICS_MAX_READERS", "2"))
+ANALYTICS_DB_CACHE_KB = int(os.getenv("ANALYTICS_DB_CACHE_KB", "32768"))
+ANALYTICS_DB_MMAP_BYTES = int(os.getenv("ANALYTICS_DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+# Analytics response cache, invalidated whenever a new event is written
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "30"))
+# Approximate analytics: heavy-hitter and distinct-count sketches updated on every event write (off by default)
+ANALYTICS_SKETCHES = os.getenv("ANALYTICS_SKETCHES", "false").lower() in ("1", "true", "yes")
+ANALYTICS_SKETCH_CAPACITY = int(os.getenv("ANALYTICS_SKETCH_CAPACITY", "1000"))
+ANALYTICS_SKETCH_RETENTION_DAYS = int(os.getenv("ANALYTICS_SKETCH_RETENTION_DAYS", "30"))
+ANALYTICS_SKETCH_PATH = os.getenv("ANALYTICS_SKETCH_PATH", os.path.join(DATA_DIR, "analytics_sketches.json"))
+ANALYTICS_SKETCH_CHECKPOINT_SECONDS = float(os.getenv("ANALYTICS_SKETCH_CHECKPOINT_SECONDS", "60"))
+# Analytics engine: "sql" runs each panel as a SQLite aggregate, "columnar" keeps events in numpy arrays
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sql")
+# Retention: whole months of raw rows older than this are archived to ARCHIVE_DIR and
+# deleted, keeping only their rollups. Messages are kept forever unless a retention is set.
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "365"))
+MESSAGE_RETENTION_DAYS = int(os.environ["MESSAGE_RETENTION_DAYS"]) if os.getenv("MESSAGE_RETENTION_DAYS") else None
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
@@ -0,0 +1,94 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Persistent cache of embeddings keyed by SHA-256 of the embedding model and the text.
+
+    Entries live in a SQLite file shared by every material, so a chunk that was
+    embedded once (a re-uploaded document, shared boilerplate) is never sent to
+    the model again. Keys include the model, so switching models re-embeds.
+    Vectors are stored as raw float32 bytes, the precision of the vector store.
+    """
+
+    def __init__(self, path: str, model: str, batch_size: int = 500):
+        self.path = path
+        self.model = model
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors of the keys that have one."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start:start + self.batch_size]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+                )
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        embed_documents: Callable[[List[str]], List[List[float]]]
+    ) -> Tuple[np.ndarray, Dict[str, int]]:
+        """
+        Embed texts, calling `embed_documents` only for texts not in the cache.
+        Args:
+            texts: Texts to embed
+            embed_documents: Embedding function for the cache misses
+        Returns:
+            float32 matrix with one row per text, and counts of chunks, cache
+            hits, misses, and texts actually embedded (misses without repeats)
+        """
+        keys = [self.key(text) for text in texts]
+        cached = self.get_many(list(set(keys)))
+        hits = sum(key in cached for key in keys)
+        # Repeated chunks of one upload are embedded once
+        missing = dict((key, text) for key, text in zip(keys, texts) if key not in cached)
+        if missing:
+            vectors = np.asarray(embed_documents(list(missing.values())), dtype=np.float32)
+            self.put_many(list(missing), vectors)
+            cached.update(zip(missing, vectors))
+        matrix = np.stack([cached[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+        return matrix, {
+            'chunks': len(texts),
+            'hits': hits,
+            'misses': len(texts) - hits,
+            'embedded': len(missing),
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunks.idx"
+META_FILE = "meta.json"
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, highest first."""
+    k = min(k, len(scores))
+    if k < 1:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+class EmbeddingStore:
+    """
+    Append-only on-disk store of embedding vectors and the chunks they embed.
+
+    Files in `directory`:
+      vectors.f32   row-major float32 matrix, one L2-normalized row per chunk
+      chunks.jsonl  one JSON record per chunk, in row order
+      chunks.idx    int64 end offset of each record in chunks.jsonl
+      meta.json     embedding dimension
+
+    A row counts once its offset is written, which happens after its vector
+    and record, so a crash mid-append leaves a tail that is truncated on the
+    next open. The matrix and offsets are memory-mapped read-only, so opening
+    costs the same for any number of chunks and nothing is copied onto the
+    Python heap; records are read on demand.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.dim: Optional[int] = None
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+        self._lock = threading.Lock()
+        self._chunks_fd = os.open(self._path(CHUNKS_FILE), os.O_RDONLY | os.O_CREAT, 0o644)
+        self._recover()
+        self._map()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _recover(self):
+        """Truncate the files to the rows whose vector, record and offset were all written."""
+        sizes = {
+            name: os.path.getsize(self._path(name)) if os.path.exists(self._path(name)) else 0
+            for name in (VECTORS_FILE, CHUNKS_FILE, OFFSETS_FILE)
+        }
+        rows = sizes[OFFSETS_FILE] // 8
+        if self.dim:
+            rows = min(rows, sizes[VECTORS_FILE] // (4 * self.dim))
+        else:
+            rows = 0
+        offsets = np.fromfile(self._path(OFFSETS_FILE), dtype=np.int64, count=rows) if rows else np.empty(0, np.int64)
+        while rows and offsets[rows - 1] > sizes[CHUNKS_FILE]:
+            rows -= 1
+        expected = {
+            VECTORS_FILE: rows * 4 * (self.dim or 0),
+            CHUNKS_FILE: int(offsets[rows - 1]) if rows else 0,
+            OFFSETS_FILE: rows * 8,
+        }
+        for name, size in expected.items():
+            if sizes[name] != size:
+                with open(self._path(name), 'ab') as f:
+                    f.truncate(size)
+
+    def _map(self):
+        """Memory-map the committed rows; replaces the arrays, so readers holding the old ones are unaffected."""
+        rows = os.path.getsize(self._path(OFFSETS_FILE)) // 8 if os.path.exists(self._path(OFFSETS_FILE)) else 0
+        if rows:
+            self.matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(rows, self.dim))
+            self.offsets = np.memmap(self._path(OFFSETS_FILE), dtype=np.int64, mode='r', shape=(rows,))
+        else:
+            self.matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+            self.offsets = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @staticmethod
+    def normalize(vectors) -> np.ndarray:
+        """Scale rows to unit length, so a dot product is the cosine similarity (zero rows stay zero)."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def append(self, vectors: Sequence[Sequence[float]], records: List[Dict[str, Any]]) -> range:
+        """
+        Append chunks and their embeddings durably.
+        Args:
+            vectors: One embedding per record
+            records: JSON-serializable chunk records
+        Returns:
+            Row numbers of the appended chunks
+        """
+        if len(vectors) != len(records):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(records)} records")
+        if not records:
+            return range(len(self), len(self))
+        vectors = self.normalize(vectors)
+        with self._lock:
+            if self.dim is None:
+                self._write_meta(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+            lines = [(json.dumps(record, default=str) + '\n').encode('utf-8') for record in records]
+            with open(self._path(CHUNKS_FILE), 'ab') as f:
+                start = f.tell()
+                f.write(b''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._path(VECTORS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            # Written last: this is what commits the rows
+            offsets = start + np.cumsum([len(line) for line in lines], dtype=np.int64)
+            with open(self._path(OFFSETS_FILE), 'ab') as f:
+                f.write(offsets.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            first = len(self)
+            self._map()
+            return range(first, len(self))
+
+    def _write_meta(self, dim: int):
+        tmp_path = self._path(META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': dim}, f)
+        os.replace(tmp_path, self._path(META_FILE))
+        self.dim = dim
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Read the record of a row from the chunk log."""
+        offsets = self.offsets
+        start = int(offsets[row - 1]) if row else 0
+        return json.loads(os.pread(self._chunks_fd, int(offsets[row]) - start, start))
+
+    def scan_records(self, needle: bytes) -> Iterator[Dict[str, Any]]:
+        """
+        Read the committed records whose JSON line contains `needle`.
+        Only matching lines are parsed, so a scan costs about one read of the chunk log.
+        Args:
+            needle: Bytes to look for in the encoded records
+        Returns:
+            The matching records, in row order
+        """
+        # Bytes past the last offset belong to an append still in progress
+        remaining = int(self.offsets[-1]) if len(self.offsets) else 0
+        with open(self._path(CHUNKS_FILE), 'rb') as f:
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                if needle in line:
+                    yield json.loads(line)
+
+    def search(self, vector: Sequence[float], k: int = 4) -> List[Tuple[int, float]]:
+        """
+        Exact cosine search over every row.
+        Args:
+            vector: Query embedding
+            k: Number of rows to return
+        Returns:
+            (row, cosine similarity) pairs, most similar first
+        """
+        matrix = self.matrix
+        if not len(matrix):
+            return []
+        scores = matrix @ self.normalize(vector)[0]
+        return [(int(row), float(scores[row])) for row in top_k(scores, k)]
+
+    def close(self):
+        os.close(self._chunks_fd)
@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+class EmbeddingProgress:
+    """Thread-safe counters of one embedding run, readable while it is in flight."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_chunks = 0
+        self.embedded_chunks = 0
+        self.total_batches = 0
+        self.completed_batches = 0
+        self.retries = 0
+
+    def start(self, chunks: int, batches: int):
+        with self._lock:
+            self.total_chunks += chunks
+            self.total_batches += batches
+
+    def batch_done(self, chunks: int):
+        with self._lock:
+            self.embedded_chunks += chunks
+            self.completed_batches += 1
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'total_chunks': self.total_chunks,
+                'embedded_chunks': self.embedded_chunks,
+                'total_batches': self.total_batches,
+                'completed_batches': self.completed_batches,
+                'retries': self.retries,
+            }
+
+class EmbeddingPipeline:
+    """
+    Embeds texts in batches of `batch_size`, with at most `concurrency`
+    requests in flight across all callers.
+
+    Every batch is retried up to `max_retries` times with exponential backoff
+    and full jitter (`backoff` seconds doubling per attempt, capped at
+    `max_backoff`), so a rate limit or a transient error costs one batch a
+    delay instead of failing the whole upload. The pool is shared, so
+    concurrent uploads queue behind the same limit instead of multiplying it.
+    """
+
+    def __init__(
+        self,
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 128,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0
+    ):
+        self.embed_documents = embed_documents
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embedding")
+
+    def _embed_batch(self, texts: List[str], progress: Optional[EmbeddingProgress]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embed_documents(texts)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                if progress is not None:
+                    progress.retried()
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+        if progress is not None:
+            progress.batch_done(len(texts))
+        return vectors
+
+    def embed(self, texts: Sequence[str], progress: Optional[EmbeddingProgress] = None) -> List[List[float]]:
+        """
+        Embed texts batch by batch on the shared pool.
+        Args:
+            texts: Texts to embed
+            progress: Updated as batches complete
+        Returns:
+            One embedding per text, in order
+        """
+        batches = [list(texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        if progress is not None:
+            progress.start(len(texts), len(batches))
+        futures = [self.executor.submit(self._embed_batch, batch, progress) for batch in batches]
+        try:
+            return [vector for future in futures for vector in future.result()]
+        finally:
+            # A failed batch fails the upload; don't spend requests on the rest
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class IngestionJob:
+    """
+    Stage, counts and timing of one uploaded file's ingestion.
+
+    Stages run queued, parsing, chunking, embedding, then indexed once the
+    chunks are searchable and the material is listed, or failed.
+    """
+
+    def __init__(self, file_id: str, file_name: str, file_path: str):
+        self.file_id = file_id
+        self.file_name = file_name
+        self.file_path = file_path
+        # Upload size in bytes and SHA-256, when known
+        self.size: Optional[int] = None
+        self.sha256: Optional[str] = None
+        # Found in INGESTION_DIR at startup, so a previous run may have indexed it already
+        self.resumed = False
+        self.stage = 'queued'
+        self.error: Optional[str] = None
+        self.chunks: Optional[int] = None
+        self.embedding: Optional[Dict[str, int]] = None
+        self.progress = EmbeddingProgress()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Seconds spent in each finished stage
+        self.stage_seconds: Dict[str, float] = {}
+        self._stage_started = time.perf_counter()
+
+    def set_stage(self, stage: str):
+        now = time.perf_counter()
+        self.stage_seconds[self.stage] = round(now - self._stage_started, 3)
+        self._stage_started = now
+        if self.started_at is None:
+            self.started_at = time.time()
+        if stage in ('indexed', 'failed'):
+            self.finished_at = time.time()
+        self.stage = stage
+
+    def fail(self, error: str):
+        self.error = error
+        self.set_stage('failed')
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'file_id': self.file_id,
+            'file_name': self.file_name,
+            'size': self.size,
+            'sha256': self.sha256,
+            'stage': self.stage,
+            'error': self.error,
+            'chunks': self.chunks,
+            'embedding': self.embedding,
+            'progress': self.progress.snapshot(),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stage_seconds': dict(self.stage_seconds),
+        }
+
+class IngestionQueue:
+    """
+    Runs ingestion jobs on a pool of `max_jobs` worker threads.
+
+    Jobs beyond the cap wait in the pool's queue in the `queued` stage.
+    Finished jobs stay queryable until `max_finished` newer ones have finished.
+    """
+
+    def __init__(self, run: Callable[[IngestionJob], None], max_jobs: int = 2, max_finished: int = 1000):
+        self.run = run
+        self.max_finished = max_finished
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingestion")
+
+    def submit(self, job: IngestionJob) -> IngestionJob:
+        with self._lock:
+            self.jobs[job.file_id] = job
+            finished = [file_id for file_id, queued in self.jobs.items() if queued.finished_at is not None]
+            for file_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self.jobs[file_id]
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: IngestionJob):
+        try:
+            self.run(job)
+        except Exception as e:
+            job.fail(str(e))
+
+    def get(self, file_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self.jobs.get(file_id)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -1,31 +1,56 @@
 import os
-from typing import Optional, List, Tuple
+import re
+from typing import Dict, Optional, List, Tuple
 from langchain_community.document_loaders import (
     TextLoader,
     PyPDFLoader,
     CSVLoader
 )
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.cache import TTLCache
 from app.clients import VECTOR_STORE
+from app.ingestion import IngestionJob, IngestionQueue
+from app.uploads import remove_partial_uploads
+from app.constant import (
+    DATA_DIR, INGESTION_DIR, INGESTION_MAX_JOBS, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS
+)
 
 class MaterialStore:
     
     def __init__(self):
         self.materials: List[Tuple[str, str]] = []
+        # Knowledge-base version: bumped whenever the set of materials changes
+        self.version = 0
     
     def add_material(self, file_id: str, file_name: str):
         self.materials.append((file_id, file_name))
+        self.version += 1
     
     def get_materials(self) -> List[Tuple[str, str]]:
         return self.materials
+    
+    def load(self, directory: str):
+        """Restore materials from the uploaded files kept in `directory` as `<file_id>_<file_name>`."""
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+        for path in sorted(paths, key=os.path.getmtime):
+            match = re.fullmatch(r'(\d{5})_(.+)', os.path.basename(path))
+            if match and os.path.isfile(path):
+                self.add_material(match.group(1), match.group(2))
 
 # Initialize material store
 MATERIAL_STORE = MaterialStore()
+MATERIAL_STORE.load(DATA_DIR)
 
-def save_vector(file_id: str, file_path: str) -> Optional[str]:
+def save_vector(
+    file_id: str,
+    file_path: str,
+    job: Optional[IngestionJob] = None
+) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
     """
     Load file, chunk it, and save to vector store.
-    Returns error message if failed, None if successful.
+    Returns error message if failed, None if successful, and the embedding
+    cache statistics of the chunks (chunks, hits, misses, embedded).
+    `job`, if given, is moved through the stages and counts the chunks.
     """
     def get_file_loader(file_path: str):
         """Get appropriate loader based on file extension."""
@@ -43,6 +68,8 @@ def save_vector(file_id: str, file_path: str) -> Optional[str]:
         loader = get_file_loader(file_path)
         
         # Load documents
+        if job:
+            job.set_stage('parsing')
         documents = loader.load()
 
         # Overwrite the `source` metadata
@@ -50,20 +77,71 @@ def save_vector(file_id: str, file_path: str) -> Optional[str]:
             doc.metadata["source"] = file_id
         
         # Split into chunks
+        if job:
+            job.set_stage('chunking')
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
         chunks = text_splitter.split_documents(documents)
         
-        # Add to vector store
-        VECTOR_STORE.add_documents(chunks)
+        # Embed only the chunks missing from the embedding cache
+        if job:
+            job.chunks = len(chunks)
+            job.set_stage('embedding')
+        texts = [chunk.page_content for chunk in chunks]
+        vectors, stats = VECTOR_STORE.embed_texts(texts, job.progress if job else None)
+        if job:
+            job.embedding = stats
+
+        # Add to vector store, which writes them to disk
+        VECTOR_STORE.add_embeddings(texts, vectors, [chunk.metadata for chunk in chunks])
         
-        return None
+        return None, stats
     except Exception as e:
-        return str(e)
+        return str(e), None
+
+def ingest(job: IngestionJob):
+    """
+    Index an upload waiting in INGESTION_DIR, then move it into DATA_DIR and list it as a material.
+    A resumed upload whose chunks are already in the vector store (the process
+    stopped after adding them but before the move) is only moved, so its
+    chunks are never added twice.
+    """
+    if not (job.resumed and VECTOR_STORE.has_source(job.file_id)):
+        error, _ = save_vector(job.file_id, job.file_path, job)
+        if error:
+            os.remove(job.file_path)
+            job.fail(error)
+            return
+    file_path = os.path.join(DATA_DIR, f"{job.file_id}_{job.file_name}")
+    os.replace(job.file_path, file_path)
+    job.file_path = file_path
+    MATERIAL_STORE.add_material(job.file_id, job.file_name)
+    job.set_stage('indexed')
+
+# Initialize the ingestion workers and resume uploads interrupted by a restart;
+# uploads still being received at the restart are incomplete and dropped
+INGESTION_QUEUE = IngestionQueue(ingest, max_jobs=INGESTION_MAX_JOBS)
+remove_partial_uploads(INGESTION_DIR)
+for name in sorted(os.listdir(INGESTION_DIR), key=lambda name: os.path.getmtime(os.path.join(INGESTION_DIR, name))):
+    match = re.fullmatch(r'(\d{5})_(.+)', name)
+    if match:
+        job = IngestionJob(match.group(1), match.group(2), os.path.join(INGESTION_DIR, name))
+        job.resumed = True
+        INGESTION_QUEUE.submit(job)
+
+# Query embeddings keyed by normalized query text (the embedding is of the first phrasing seen);
+# they never go stale, the TTL only bounds memory
+QUERY_EMBEDDING_CACHE = TTLCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case, so trivially different phrasings share cache entries."""
+    return ' '.join(query.split()).casefold()
 
 def fetch_docs(query: str):
     """Fetch relevant documents from vector store."""
-    return VECTOR_STORE.similarity_search(query, k=2)
+    # Normalized text is only the cache key; the query is embedded as written
+    embedding = QUERY_EMBEDDING_CACHE.get_or_set(normalize_query(query), lambda: VECTOR_STORE.embeddings.embed_query(query))
+    return VECTOR_STORE.similarity_search_by_vector(embedding, k=2)
 
@@ -1,15 +1,17 @@
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException, status, Query
-from app.clients import CONVERSATION_DB
+from app.clients import ASYNC_CONVERSATION_DB
 from typing import List, Optional
 from enum import Enum
 
 class HotKeyword(BaseModel):
     keyword: str
     frequency: int
+    error: Optional[int] = None
 
 class HotKeywordsResponse(BaseModel):
     keywords: List[HotKeyword]
+    approximate: bool = False
 
 class TimeInterval(str, Enum):
     hour = "hour"
@@ -38,10 +40,13 @@ class HourlyKeywordCountResponse(BaseModel):
 class UserCount(BaseModel):
     user_id: str
     count: int
+    error: Optional[int] = None
 
 class TopUsersResponse(BaseModel):
     days: Optional[int]
     users: List[UserCount]
+    approximate: bool = False
+    distinct_users: Optional[int] = None
 
 class UserQuery(BaseModel):
     hour: str
@@ -103,27 +108,100 @@ class DailyUserEngagementResponse(BaseModel):
     days: int
     daily_engagement: List[DailyEngagement]
 
+class DashboardPanel(str, Enum):
+    hot_keywords = "hot_keywords"
+    hourly_query_count = "hourly_query_count"
+    top_users = "top_users"
+    citation_counts = "citation_counts"
+    daily_scores = "daily_scores"
+    daily_top_keywords = "daily_top_keywords"
+    daily_user_engagement = "daily_user_engagement"
+
+class DashboardResponse(BaseModel):
+    days: int
+    hot_keywords: Optional[HotKeywordsResponse] = None
+    hourly_query_count: Optional[HourlyQueryCountResponse] = None
+    top_users: Optional[TopUsersResponse] = None
+    citation_counts: Optional[CitationCountsResponse] = None
+    daily_scores: Optional[DailyScoresResponse] = None
+    daily_top_keywords: Optional[DailyTopKeywordsResponse] = None
+    daily_user_engagement: Optional[DailyUserEngagementResponse] = None
+
+class AnalyticsCacheStatsResponse(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+class Partition(BaseModel):
+    month: str
+    events: int
+    messages: int
+    archived_events: int
+    archived_messages: int
+    events_compacted: bool
+    messages_compacted: bool
+
+class PartitionsResponse(BaseModel):
+    partitions: List[Partition]
+
+def to_daily_scores_response(days: int, daily_scores: List[dict]) -> DailyScoresResponse:
+    # Overall average is the mean of the daily averages
+    if daily_scores:
+        overall_avg = round(
+            sum(day['avg_score'] for day in daily_scores) / len(daily_scores),
+            2
+        )
+    else:
+        overall_avg = 0.0
+    
+    return DailyScoresResponse(
+        days=days,
+        scores=[
+            DailyScore(
+                date=day['date'],
+                avg_score=day['avg_score']
+            ) for day in daily_scores
+        ],
+        overall_avg=overall_avg
+    )
+
 router = APIRouter(
     prefix="/v1/analytics",
     tags=["analytics"],
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/hot-keywords", response_model=HotKeywordsResponse)
+@router.get("/hot-keywords", response_model=HotKeywordsResponse, response_model_exclude_unset=True)
 async def get_hot_keywords(
     limit: int = Query(10, description="Maximum number of hot keywords to return", ge=1, le=100),
-    conversation_id: Optional[str] = Query(None, description="Optional conversation ID to filter results")
+    conversation_id: Optional[str] = Query(None, description="Optional conversation ID to filter results"),
+    approximate: bool = Query(False, description="Answer from streaming sketches; ignored when filtering by conversation")
 ):
     """
     Get the most frequently used keywords across all queries.
     Args:
         limit: Maximum number of hot keywords to return (default: 10)
         conversation_id: Optional conversation ID to filter results
+        approximate: Answer from the streaming sketches. Frequencies are then upper
+            bounds that overestimate the true count by at most `error`. Falls back to
+            the exact query when filtering by conversation or sketches are disabled.
     Returns:
-        List of hot keywords with their frequencies
+        List of hot keywords with their frequencies; `error` and `approximate`
+        are only included in answers from the sketches
     """
     try:
-        hot_keywords = CONVERSATION_DB.get_hot_keywords(limit=limit, conversation_id=conversation_id)
+        if approximate and not conversation_id:
+            sketched = await ASYNC_CONVERSATION_DB.get_approximate_hot_keywords(limit=limit)
+            if sketched is not None:
+                return HotKeywordsResponse(
+                    keywords=[HotKeyword(**kw) for kw in sketched],
+                    approximate=True
+                )
+        hot_keywords = await ASYNC_CONVERSATION_DB.get_hot_keywords(limit=limit, conversation_id=conversation_id)
         return HotKeywordsResponse(
             keywords=[
                 HotKeyword(keyword=kw, frequency=freq)
@@ -148,7 +226,7 @@ async def get_hourly_query_count(
         Hourly query counts
     """
     try:
-        counts = CONVERSATION_DB.get_hourly_query_count(days)
+        counts = await ASYNC_CONVERSATION_DB.get_hourly_query_count(days)
         return HourlyQueryCountResponse(
             days=days,
             trend=[HourlyCount(hour=c['hour'], count=c['count']) for c in counts]
@@ -159,11 +237,12 @@ async def get_hourly_query_count(
             detail=f"Failed to get hourly query counts: {str(e)}"
         )
 
-@router.get("/top-users", response_model=TopUsersResponse)
+@router.get("/top-users", response_model=TopUsersResponse, response_model_exclude_unset=True)
 async def get_top_users(
     days: Optional[int] = Query(None, description="Number of days to look back (None for all time)", ge=1, le=365),
     limit: int = Query(10, description="Maximum number of users to return", ge=1, le=100),
-    conversation_id: Optional[str] = Query(None, description="Optional conversation ID to filter results")
+    conversation_id: Optional[str] = Query(None, description="Optional conversation ID to filter results"),
+    approximate: bool = Query(False, description="Answer from streaming sketches; ignored when filtering by conversation")
 ):
     """
     Get top users ranked by number of queries.
@@ -171,11 +250,27 @@ async def get_top_users(
         days: Optional number of days to look back (None for all time)
         limit: Maximum number of users to return (1-100)
         conversation_id: Optional conversation ID to filter results
+        approximate: Answer from the streaming sketches. Counts are then upper bounds
+            that overestimate by at most `error`, the window is rounded out to whole
+            UTC days, and an estimated distinct user count is included. Falls back to
+            the exact query when filtering by conversation, when `days` exceeds the
+            sketch retention, or when sketches are disabled.
     Returns:
-        List of users with their query counts, ordered by count descending
+        List of users with their query counts, ordered by count descending;
+        `error`, `approximate` and `distinct_users` are only included in answers
+        from the sketches
     """
     try:
-        users = CONVERSATION_DB.get_top_users(days=days, limit=limit, conversation_id=conversation_id)
+        if approximate and not conversation_id:
+            sketched = await ASYNC_CONVERSATION_DB.get_approximate_top_users(days=days, limit=limit)
+            if sketched is not None:
+                return TopUsersResponse(
+                    days=days,
+                    users=[UserCount(**u) for u in sketched['users']],
+                    approximate=True,
+                    distinct_users=sketched['distinct_users']
+                )
+        users = await ASYNC_CONVERSATION_DB.get_top_users(days=days, limit=limit, conversation_id=conversation_id)
         return TopUsersResponse(
             days=days,
             users=[
@@ -192,14 +287,20 @@ async def get_top_users(
         )
 
 @router.get("/citation-counts", response_model=CitationCountsResponse)
-async def get_citation_counts():
+async def get_citation_counts(
+    days: Optional[int] = Query(None, description="Number of days to look back (None for all time)", ge=1, le=365),
+    conversation_id: Optional[str] = Query(None, description="Optional conversation ID to filter results")
+):
     """
     Get total query counts grouped by citation.
+    Args:
+        days: Optional number of days to look back (None for all time)
+        conversation_id: Optional conversation ID to filter results
     Returns:
         List of citations with their query counts
     """
     try:
-        counts = CONVERSATION_DB.get_citation_counts()
+        counts = await ASYNC_CONVERSATION_DB.get_citation_counts(days=days, conversation_id=conversation_id)
         return CitationCountsResponse(
             citations=[
                 CitationCount(
@@ -222,27 +323,8 @@ async def get_daily_scores():
         Daily average scores and overall average
     """
     try:
-        daily_scores = CONVERSATION_DB.get_daily_average_scores()
-        
-        # Calculate overall average
-        if daily_scores:
-            overall_avg = round(
-                sum(day['avg_score'] for day in daily_scores) / len(daily_scores),
-                2
-            )
-        else:
-            overall_avg = 0.0
-        
-        return DailyScoresResponse(
-            days=7,
-            scores=[
-                DailyScore(
-                    date=day['date'],
-                    avg_score=day['avg_score']
-                ) for day in daily_scores
-            ],
-            overall_avg=overall_avg
-        )
+        daily_scores = await ASYNC_CONVERSATION_DB.get_daily_average_scores()
+        return to_daily_scores_response(7, daily_scores)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -257,7 +339,7 @@ async def get_daily_top_keywords():
         Daily top keywords with their counts
     """
     try:
-        daily_keywords = CONVERSATION_DB.get_daily_top_keywords(days=7, limit=10)
+        daily_keywords = await ASYNC_CONVERSATION_DB.get_daily_top_keywords(days=7, limit=10)
         return DailyTopKeywordsResponse(
             days=7,
             daily_keywords=[
@@ -286,7 +368,7 @@ async def get_daily_user_engagement():
         Daily user event counts grouped by user and date
     """
     try:
-        engagement_data = CONVERSATION_DB.get_daily_user_engagement(days=7)
+        engagement_data = await ASYNC_CONVERSATION_DB.get_daily_user_engagement(days=7)
         return DailyUserEngagementResponse(
             days=7,
             daily_engagement=[
@@ -306,3 +388,82 @@ async def get_daily_user_engagement():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get daily user engagement: {str(e)}"
         )
+
+
+@router.get("/dashboard", response_model=DashboardResponse, response_model_exclude_none=True)
+async def get_dashboard(
+    days: int = Query(7, description="Number of days to look back", ge=1, le=30),
+    limit: int = Query(10, description="Maximum number of hot keywords, top users and keywords per day", ge=1, le=100),
+    panels: Optional[List[DashboardPanel]] = Query(None, description="Panels to include (all when omitted)")
+):
+    """
+    Get several insight panels in one response, computed from a single scan of the window.
+    Unlike the single-panel endpoints, hot keywords and top users also cover only the window.
+    Args:
+        days: Number of days to look back (1-30)
+        limit: Maximum number of hot keywords, top users and keywords per day (1-100)
+        panels: Panels to include; all panels when omitted
+    Returns:
+        The requested panels, each in the shape of its single-panel endpoint
+    """
+    try:
+        selected = tuple(dict.fromkeys(p.value for p in panels)) if panels else tuple(p.value for p in DashboardPanel)
+        data = await ASYNC_CONVERSATION_DB.get_dashboard(days=days, limit=limit, panels=selected)
+        
+        response = DashboardResponse(days=days)
+        if 'hot_keywords' in data:
+            response.hot_keywords = HotKeywordsResponse(
+                keywords=[HotKeyword(keyword=kw, frequency=freq) for kw, freq in data['hot_keywords']]
+            )
+        if 'hourly_query_count' in data:
+            response.hourly_query_count = HourlyQueryCountResponse(days=days, trend=data['hourly_query_count'])
+        if 'top_users' in data:
+            response.top_users = TopUsersResponse(days=days, users=data['top_users'])
+        if 'citation_counts' in data:
+            response.citation_counts = CitationCountsResponse(citations=data['citation_counts'])
+        if 'daily_scores' in data:
+            response.daily_scores = to_daily_scores_response(days, data['daily_scores'])
+        if 'daily_top_keywords' in data:
+            response.daily_top_keywords = DailyTopKeywordsResponse(days=days, daily_keywords=data['daily_top_keywords'])
+        if 'daily_user_engagement' in data:
+            response.daily_user_engagement = DailyUserEngagementResponse(days=days, daily_engagement=data['daily_user_engagement'])
+        return response
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get dashboard: {str(e)}"
+        )
+
+@router.get("/cache-stats", response_model=AnalyticsCacheStatsResponse)
+async def get_cache_stats():
+    """
+    Get hit/miss statistics for the analytics response cache.
+    Returns:
+        Cache occupancy, hit and miss counters and hit rate
+    """
+    try:
+        stats = await ASYNC_CONVERSATION_DB.get_analytics_cache_stats()
+        return AnalyticsCacheStatsResponse(**stats)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get analytics cache stats: {str(e)}"
+        )
+
+
+@router.get("/partitions", response_model=PartitionsResponse)
+async def get_partitions():
+    """
+    Get the monthly partitions of events and messages.
+    Returns:
+        Live and archived row counts per month, newest first
+    """
+    try:
+        partitions = await ASYNC_CONVERSATION_DB.get_partitions()
+        return PartitionsResponse(partitions=[Partition(**p) for p in partitions])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get partitions: {str(e)}"
+        )
+
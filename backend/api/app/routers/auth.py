@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException, status, Depends
-from app.clients import CONVERSATION_DB
+from app.clients import ASYNC_CONVERSATION_DB
 from typing import List, Optional
 
 class UserRegistration(BaseModel):
@@ -33,7 +33,7 @@ async def register_user(registration: UserRegistration):
     Returns:
         User ID and a new conversation ID
     """
-    if conversation_id := CONVERSATION_DB.register_user(registration.user_id, registration.password):
+    if conversation_id := await ASYNC_CONVERSATION_DB.register_user(registration.user_id, registration.password):
         return AuthResponse(
             user_id=registration.user_id,
             conversation_id=conversation_id
@@ -56,7 +56,7 @@ async def login_user(login: UserLogin):
     Returns:
         User ID and conversation ID if authentication is successful
     """
-    if not CONVERSATION_DB.authenticate_user(login.user_id, login.password):
+    if not await ASYNC_CONVERSATION_DB.authenticate_user(login.user_id, login.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -64,7 +64,7 @@ async def login_user(login: UserLogin):
     
     try:
         # Get the user's conversation ID
-        conversation_id = CONVERSATION_DB.get_user_conversation_id(login.user_id)
+        conversation_id = await ASYNC_CONVERSATION_DB.get_user_conversation_id(login.user_id)
         
         if not conversation_id:
             raise HTTPException(
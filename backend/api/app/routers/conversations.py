@@ -1,7 +1,9 @@
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.graph import GRAPH
-from app.clients import CONVERSATION_DB
+from app.clients import ASYNC_CONVERSATION_DB
 from app.evaluate import evaluate_answer, summarize_messages
 from typing import List, Optional
 from datetime import datetime
@@ -19,11 +21,14 @@ class MessageResponse(BaseModel):
     user_id: str
     content: str
     created_at: datetime
+    snippet: Optional[str] = None
 
 class MessagesResponse(BaseModel):
     conversation_id: str
     messages: List[MessageResponse]
     total_messages: int
+    prev_cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
 
 class ConversationSummaryResponse(BaseModel):
     conversation_id: str
@@ -36,20 +41,53 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def run_graph(conversation_id: str, content: str):
+    """Run the agent graph on a user message and return its last message; blocks on the model and retrieval calls."""
+    last_ai_message = None
+    for step in GRAPH.stream(
+        {"messages": [{"role": "user", "content": content}]},
+        stream_mode="values",
+        config = {"configurable": {"thread_id": conversation_id}},
+    ):
+        step["messages"][-1].pretty_print()
+        last_ai_message = step["messages"][-1]
+    return last_ai_message
+
+def to_message_response(msg: dict) -> MessageResponse:
+    return MessageResponse(
+        id=msg['id'],
+        user_id=msg['user_id'],
+        content=msg['content'],
+        created_at=datetime.fromisoformat(msg['created_at']),
+        snippet=msg.get('snippet')
+    )
+
 @router.get("/conversations/{conversation_id}/messages", response_model=MessagesResponse)
 async def get_messages(
     conversation_id: str,
-    keywords: Optional[List[str]] = Query(None, description="Filter messages by keywords")
+    keywords: Optional[List[str]] = Query(None, description="Filter messages by keywords"),
+    rank: bool = Query(False, description="Order keyword matches by relevance instead of time"),
+    highlight: bool = Query(False, description="Include a highlighted snippet for keyword matches"),
+    limit: Optional[int] = Query(None, description="Maximum number of messages to return", ge=1, le=1000),
+    before: Optional[str] = Query(None, description="Cursor; return the messages right before it"),
+    after: Optional[str] = Query(None, description="Cursor; return the messages right after it")
 ):
     """
-    Get all messages for a conversation with optional keyword filtering.
+    Get messages for a conversation with optional keyword filtering and keyset pagination.
+    Pass `next_cursor` as `after` to page forward and `prev_cursor` as `before` to page back.
     Args:
         conversation_id: ID of the conversation
         keywords: Optional list of keywords to filter messages
+        rank: Order keyword matches by relevance instead of time
+        highlight: Include a highlighted snippet for keyword matches
+        limit: Optional maximum number of messages to return (1-1000)
+        before: Optional cursor to page backwards from
+        after: Optional cursor to page forwards from
     Returns:
-        List of messages ordered by timestamp
+        List of messages ordered by timestamp, with cursors to the neighbouring pages
+        (None past the first or last page)
     """
-    conversation = CONVERSATION_DB.get_conversation(conversation_id)
+    conversation = await ASYNC_CONVERSATION_DB.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -57,18 +95,42 @@ async def get_messages(
         )
     
     try:
-        messages = CONVERSATION_DB.get_messages(conversation_id, keywords)
+        for cursor in (before, after):
+            if cursor:
+                ASYNC_CONVERSATION_DB.decode_cursor(cursor)
+        if rank and keywords and (before or after):
+            raise ValueError("Pagination cursors cannot be combined with relevance ranking")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    try:
+        # One message past the page tells whether there is another page that way
+        messages = await ASYNC_CONVERSATION_DB.get_messages(
+            conversation_id,
+            keywords,
+            rank=rank,
+            highlight=highlight,
+            limit=None if limit is None else limit + 1,
+            before=before,
+            after=after
+        )
+        backwards = bool(before) and not after
+        more = limit is not None and len(messages) > limit
+        if more:
+            messages = messages[1:] if backwards else messages[:-1]
+        # Relevance-ranked pages have no cursors, since those cannot be combined with ranking
+        paginated = limit is not None and messages and not (rank and keywords)
+        has_prev = more if backwards else bool(after)
+        has_next = bool(before) if backwards else more
         return MessagesResponse(
             conversation_id=conversation_id,
-            messages=[
-                MessageResponse(
-                    id=msg['id'],
-                    user_id=msg['user_id'],
-                    content=msg['content'],
-                    created_at=datetime.fromisoformat(msg['created_at'])
-                ) for msg in messages
-            ],
+            messages=[to_message_response(msg) for msg in messages],
             total_messages=len(messages),
+            prev_cursor=ASYNC_CONVERSATION_DB.encode_cursor(messages[0]) if paginated and has_prev else None,
+            next_cursor=ASYNC_CONVERSATION_DB.encode_cursor(messages[-1]) if paginated and has_next else None,
         )
     except Exception as e:
         raise HTTPException(
@@ -76,12 +138,40 @@ async def get_messages(
             detail=f"Failed to get messages: {str(e)}"
         )
 
+@router.get("/conversations/{conversation_id}/messages/stream")
+async def stream_messages(
+    conversation_id: str,
+    keywords: Optional[List[str]] = Query(None, description="Filter messages by keywords")
+):
+    """
+    Stream every message of a conversation as NDJSON, one message per line.
+    Rows are read page by page from the database, so memory stays constant
+    regardless of the conversation length.
+    Args:
+        conversation_id: ID of the conversation
+        keywords: Optional list of keywords to filter messages
+    Returns:
+        application/x-ndjson stream of messages ordered by timestamp
+    """
+    conversation = await ASYNC_CONVERSATION_DB.get_conversation(conversation_id)
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    async def generate():
+        async for msg in ASYNC_CONVERSATION_DB.iter_messages(conversation_id, keywords):
+            yield to_message_response(msg).model_dump_json() + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.post("/conversations")
 async def post_conversation(
     req: Conversation,
 ):
     try:
-        conversation_id = CONVERSATION_DB.create_conversation(req.user_id)
+        conversation_id = await ASYNC_CONVERSATION_DB.create_conversation(req.user_id)
         return {"conversation_id": conversation_id}
     except Exception as e:
         print(e)
@@ -95,26 +185,19 @@ async def post_messages(
     conversation_id: str,
     payload: Message,
 ):
-    conversation = CONVERSATION_DB.get_conversation(conversation_id)
+    conversation = await ASYNC_CONVERSATION_DB.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
 
-    # Process with graph
-    last_ai_message = None
-    for step in GRAPH.stream(
-        {"messages": [{"role": "user", "content": payload.content}]},
-        stream_mode="values",
-        config = {"configurable": {"thread_id": conversation_id}},
-    ):
-        step["messages"][-1].pretty_print()
-        last_ai_message = step["messages"][-1]
+    # Process with graph, off the event loop: the model, embedding and search calls block
+    last_ai_message = await run_in_threadpool(run_graph, conversation_id, payload.content)
 
     citations = last_ai_message.additional_kwargs.get("citations", [])
     context = last_ai_message.additional_kwargs.get("context", None)
-    score = evaluate_answer(payload.content, last_ai_message.content, context)
+    score = await run_in_threadpool(evaluate_answer, payload.content, last_ai_message.content, context)
 
     if not last_ai_message:
         raise HTTPException(
@@ -125,7 +208,7 @@ async def post_messages(
     content =  f"{last_ai_message.content}\n\nsource: {''.join([f"[{c}]" for c in citations])}" if citations else last_ai_message.content
     
     try:
-        CONVERSATION_DB.add_message_with_response_and_event(
+        await ASYNC_CONVERSATION_DB.add_message_with_response_and_event(
             conversation_id=conversation_id,
             user_message=payload.content,
             user_id=payload.user_id,
@@ -150,7 +233,7 @@ async def get_conversation_summary(conversation_id: str):
     Returns:
         A summary of the conversation and total message count
     """
-    conversation = CONVERSATION_DB.get_conversation(conversation_id)
+    conversation = await ASYNC_CONVERSATION_DB.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -158,8 +241,8 @@ async def get_conversation_summary(conversation_id: str):
         )
     
     try:
-        messages = CONVERSATION_DB.get_messages(conversation_id)
-        summary = summarize_messages(messages)
+        messages = await ASYNC_CONVERSATION_DB.get_messages(conversation_id)
+        summary = await run_in_threadpool(summarize_messages, messages)
         return ConversationSummaryResponse(
             conversation_id=conversation_id,
             summary=summary,
@@ -1,15 +1,48 @@
 import os
 import random
 from pydantic import BaseModel
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from app.repository import save_vector, MATERIAL_STORE
-from typing import Optional, List
-from app.constant import DATA_DIR
+from fastapi import APIRouter, Request, HTTPException, status
+from app.ingestion import IngestionJob
+from app.repository import INGESTION_QUEUE, MATERIAL_STORE
+from app.uploads import UploadTooLarge, stream_upload
+from typing import Dict, Optional, List
+from app.constant import DATA_DIR, INGESTION_DIR, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES
 
 class FileResponse(BaseModel):
     file_id: str
     status: str
     error: Optional[str] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+class EmbeddingStats(BaseModel):
+    chunks: int
+    hits: int
+    misses: int
+    embedded: int
+
+class EmbeddingProgressInfo(BaseModel):
+    total_chunks: int
+    embedded_chunks: int
+    total_batches: int
+    completed_batches: int
+    retries: int
+
+class FileStatusResponse(BaseModel):
+    file_id: str
+    file_name: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    stage: str
+    error: Optional[str] = None
+    chunks: Optional[int] = None
+    embedding: Optional[EmbeddingStats] = None
+    progress: Optional[EmbeddingProgressInfo] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage_seconds: Dict[str, float] = {}
 
 class MaterialInfo(BaseModel):
     file_id: str
@@ -35,53 +68,97 @@ async def list_materials():
         ]
     )
 
-@router.post("/files", response_model=FileResponse)
-async def upload_file(file: UploadFile = File(...)):
-    """Upload and process a file (PDF, CSV, or text)."""
+@router.post(
+    "/files",
+    response_model=FileResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_file(request: Request):
+    """
+    Upload a file (PDF, CSV, or text) as form field `file` and queue it for ingestion.
+    The body is streamed to disk as it arrives, so memory stays flat for any file size.
+    Returns:
+        The file_id to poll at /v1/files/{file_id}/status, with the file's size and SHA-256
+    """
     # Generate file_id with 5 random digits + original filename
     file_id = ''.join(str(random.randint(0, 9)) for _ in range(5))
-    file_name = f"{file_id}_{file.filename}"
-    file_path = os.path.join(DATA_DIR, file_name)
-    
-    # Check if file already exists
-    if os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File with ID '{file_name}' already exists"
-        )
-    
+
+    def destination(filename: str) -> str:
+        file_name = f"{file_id}_{filename}"
+        # Check if file already exists
+        if os.path.exists(os.path.join(DATA_DIR, file_name)) or INGESTION_QUEUE.get(file_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File with ID '{file_name}' already exists"
+            )
+        return os.path.join(INGESTION_DIR, file_name)
+
     try:
         # Save file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process file and save to vector store
-        error = save_vector(file_id, file_path)
-        
-        if error:
-            # If processing failed, delete the file
-            os.remove(file_path)
-            return FileResponse(
-                file_id=file_id,
-                status="failed",
-                error=error
-            )
-        
-        # Add to material store
-        MATERIAL_STORE.add_material(file_id, file.filename)
-        
-        return FileResponse(
-            file_id=file_id,
-            status="success"
+        upload = await stream_upload(request, "file", destination, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except (ValueError, FileExistsError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        # If any error occurs, ensure file is deleted
-        if os.path.exists(file_path):
-            os.remove(file_path)
         return FileResponse(
             file_id=file_id,
             status="failed",
             error=str(e)
         )
+
+    # Parse, chunk and embed the file on disk in the background; the job lists the material once indexed
+    job = IngestionJob(file_id, upload.file_name, upload.file_path)
+    job.size, job.sha256 = upload.size, upload.sha256
+    INGESTION_QUEUE.submit(job)
+
+    return FileResponse(
+        file_id=file_id,
+        status="queued",
+        filename=upload.file_name,
+        size=upload.size,
+        sha256=upload.sha256
+    )
+
+@router.get("/files/{file_id}/status", response_model=FileStatusResponse)
+async def get_file_status(file_id: str):
+    """
+    Get the ingestion status of an uploaded file.
+    Args:
+        file_id: ID returned by the upload
+    Returns:
+        Stage (queued, parsing, chunking, embedding, indexed or failed), chunk and
+        embedding counts, and seconds spent per stage
+    """
+    job = INGESTION_QUEUE.get(file_id)
+    if job:
+        return FileStatusResponse(**job.status())
+    # Indexed before the last restart
+    for material_id, file_name in MATERIAL_STORE.get_materials():
+        if material_id == file_id:
+            return FileStatusResponse(file_id=file_id, file_name=file_name, stage="indexed")
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"File '{file_id}' not found"
+    )
@@ -0,0 +1,367 @@
+import base64
+import hashlib
+import heapq
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary (Metwally et al.) over at most `capacity` counters.
+
+    Every tracked count is an upper bound on the item's true frequency and
+    `count - error` is a lower bound. With N items added, each error is at most
+    N / capacity, and any item seen more than N / capacity times is guaranteed
+    to be tracked.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, error]
+        self.counters: Dict[str, List[int]] = {}
+        # Lazy min-heap of (count, item); stale entries are skipped on eviction
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str, count: int = 1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[item] = [count, 0]
+        else:
+            # Replace the smallest counter; the newcomer inherits its count as error
+            floor = self._pop_min()
+            counter = self.counters[item] = [floor + count, floor]
+        heapq.heappush(self._heap, (counter[0], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, i) for i, (c, _) in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> int:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                del self.counters[item]
+                return count
+
+    def min_count(self) -> int:
+        """Upper bound on the frequency of any item that is not tracked."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """Return up to k (item, count, error) tuples ordered by count desc."""
+        return [
+            (item, count, error)
+            for item, (count, error) in heapq.nsmallest(
+                k, self.counters.items(), key=lambda kv: (-kv[1][0], kv[0])
+            )
+        ]
+
+    @classmethod
+    def merge(cls, sketches: Iterable["SpaceSaving"], capacity: int) -> "SpaceSaving":
+        """
+        Combine summaries of disjoint streams. An item missing from a full summary
+        may still have occurred there up to `min_count()` times, so that amount is
+        added to both its count and its error.
+        """
+        sketches = list(sketches)
+        floors = [sketch.min_count() for sketch in sketches]
+        items = set().union(*(sketch.counters for sketch in sketches))
+        merged = cls(capacity)
+        for item in items:
+            count = error = 0
+            for sketch, floor in zip(sketches, floors):
+                counter = sketch.counters.get(item)
+                if counter is None:
+                    count += floor
+                    error += floor
+                else:
+                    count += counter[0]
+                    error += counter[1]
+            merged.counters[item] = [count, error]
+        if len(merged.counters) > capacity:
+            kept = heapq.nlargest(capacity, merged.counters.items(), key=lambda kv: kv[1][0])
+            merged.counters = {item: counter for item, counter in kept}
+        merged.total = sum(sketch.total for sketch in sketches)
+        merged._heap = [(c, i) for i, (c, _) in merged.counters.items()]
+        heapq.heapify(merged._heap)
+        return merged
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'counters': [[item, count, error] for item, (count, error) in self.counters.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(data['capacity'])
+        sketch.total = data['total']
+        sketch.counters = {item: [count, error] for item, count, error in data['counters']}
+        sketch._heap = [(c, i) for i, (c, _) in sketch.counters.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with 2**precision registers.
+    The relative standard error of `count()` is about 1.04 / sqrt(2**precision),
+    i.e. ~1.6% at the default precision of 12 (4 KB of registers).
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @staticmethod
+    def _hash(item: str) -> int:
+        # Python's hash() is salted per process, which would break checkpoints
+        return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def add(self, item: str):
+        h = self._hash(item)
+        suffix_bits = 64 - self.precision
+        index = h >> suffix_bits
+        rank = suffix_bits - (h & ((1 << suffix_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def update(self, other: "HyperLogLog"):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(bytes(self.registers)).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        hll = cls(data['precision'])
+        hll.registers = bytearray(base64.b64decode(data['registers']))
+        return hll
+
+class AnalyticsSketches:
+    """
+    Approximate keyword and user rankings maintained as events are written.
+
+    Keeps an all-time window plus one window per UTC day for the last
+    `retention_days` days. Each window holds Space-Saving summaries of keywords
+    and users and a HyperLogLog of distinct users, so rankings are answered
+    without scanning the event history. `last_rowid` records the newest event
+    included, so a loaded checkpoint only needs the events written after it.
+    """
+
+    def __init__(self, capacity: int = 1000, retention_days: int = 30, precision: int = 12):
+        self.capacity = capacity
+        self.retention_days = retention_days
+        self.precision = precision
+        self.last_rowid = 0
+        self.all_time = self._new_window()
+        self.days: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._checkpoint_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _new_window(self) -> Dict[str, Any]:
+        return {
+            'keywords': SpaceSaving(self.capacity),
+            'users': SpaceSaving(self.capacity),
+            'distinct_users': HyperLogLog(self.precision),
+        }
+
+    def _day_window(self, day: int) -> Optional[Dict[str, Any]]:
+        """Window of a UTC day, created if needed; None once the day is past retention."""
+        # One extra day is kept because a window of N days ending now
+        # overlaps N + 1 UTC days
+        horizon = max(self.days, default=day) - (self.retention_days + 1) * DAY_MS
+        if day <= horizon:
+            return None
+        if day not in self.days:
+            self.days[day] = self._new_window()
+            horizon = max(horizon, day - (self.retention_days + 1) * DAY_MS)
+            for old in [d for d in self.days if d <= horizon]:
+                del self.days[old]
+        return self.days[day]
+
+    def add_event(self, rowid: int, ts: int, user_id: str, keywords: List[str]):
+        """Fold one event into the all-time window and its day window."""
+        with self._lock:
+            windows = [self.all_time]
+            window = self._day_window(ts - ts % DAY_MS)
+            if window is not None:
+                windows.append(window)
+            for window in windows:
+                for keyword in keywords:
+                    window['keywords'].add(keyword)
+                window['users'].add(user_id)
+                window['distinct_users'].add(user_id)
+            self.last_rowid = max(self.last_rowid, rowid)
+
+    def add_events(self, events: Iterable[Tuple[int, int, str, List[str]]]):
+        """
+        Fold a batch of (rowid, ts, user_id, keywords) events in, e.g. from a bulk load.
+        Occurrences are counted per window first, so each distinct keyword and
+        user is added to a window once, with its count.
+        """
+        by_day: Dict[int, Tuple[Counter, Counter]] = {}
+        last_rowid = 0
+        for rowid, ts, user_id, keywords in events:
+            day = ts - ts % DAY_MS
+            if day not in by_day:
+                by_day[day] = (Counter(), Counter())
+            keyword_counts, user_counts = by_day[day]
+            keyword_counts.update(keywords)
+            user_counts[user_id] += 1
+            last_rowid = max(last_rowid, rowid)
+        if not by_day:
+            return
+        
+        totals = (Counter(), Counter())
+        for keyword_counts, user_counts in by_day.values():
+            totals[0].update(keyword_counts)
+            totals[1].update(user_counts)
+        with self._lock:
+            windows = [(self.all_time, totals)]
+            for day in sorted(by_day):
+                window = self._day_window(day)
+                if window is not None:
+                    windows.append((window, by_day[day]))
+            for window, (keyword_counts, user_counts) in windows:
+                for keyword, count in keyword_counts.items():
+                    window['keywords'].add(keyword, count)
+                for user_id, count in user_counts.items():
+                    window['users'].add(user_id, count)
+                    window['distinct_users'].add(user_id)
+            self.last_rowid = max(self.last_rowid, last_rowid)
+
+    def _windows(self, days: Optional[int], now_ms: int) -> List[Dict[str, Any]]:
+        if days is None:
+            return [self.all_time]
+        # Day windows overlapping [now - days, now]; rounded out to whole UTC days
+        first_day = (now_ms - days * DAY_MS) - (now_ms - days * DAY_MS) % DAY_MS
+        return [window for day, window in self.days.items() if day >= first_day]
+
+    def keyword_summary(self, days: Optional[int], now_ms: int) -> SpaceSaving:
+        """Keyword summary of the window, mergeable with summaries of other event streams."""
+        with self._lock:
+            windows = self._windows(days, now_ms)
+            return SpaceSaving.merge([w['keywords'] for w in windows], self.capacity)
+
+    def user_summary(self, days: Optional[int], now_ms: int) -> Tuple[SpaceSaving, HyperLogLog]:
+        """User summary and distinct-user counter of the window."""
+        with self._lock:
+            windows = self._windows(days, now_ms)
+            merged = SpaceSaving.merge([w['users'] for w in windows], self.capacity)
+            distinct = HyperLogLog(self.precision)
+            for window in windows:
+                distinct.update(window['distinct_users'])
+        return merged, distinct
+
+    def top_keywords(self, limit: int, days: Optional[int], now_ms: int) -> List[Tuple[str, int, int]]:
+        return self.keyword_summary(days, now_ms).top(limit)
+
+    def top_users(self, limit: int, days: Optional[int], now_ms: int) -> Tuple[List[Tuple[str, int, int]], int]:
+        """Return the top users as (user_id, count, error) and the estimated number of distinct users."""
+        merged, distinct = self.user_summary(days, now_ms)
+        return merged.top(limit), distinct.count()
+
+    def reset(self):
+        with self._lock:
+            self.last_rowid = 0
+            self.all_time = self._new_window()
+            self.days = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        def window_dict(window):
+            return {name: sketch.to_dict() for name, sketch in window.items()}
+        with self._lock:
+            return {
+                'version': 1,
+                'capacity': self.capacity,
+                'retention_days': self.retention_days,
+                'precision': self.precision,
+                'last_rowid': self.last_rowid,
+                'all_time': window_dict(self.all_time),
+                'days': {str(day): window_dict(window) for day, window in self.days.items()},
+            }
+
+    def _load_dict(self, data: Dict[str, Any]):
+        def load_window(window):
+            return {
+                'keywords': SpaceSaving.from_dict(window['keywords']),
+                'users': SpaceSaving.from_dict(window['users']),
+                'distinct_users': HyperLogLog.from_dict(window['distinct_users']),
+            }
+        with self._lock:
+            self.last_rowid = data['last_rowid']
+            self.all_time = load_window(data['all_time'])
+            self.days = {int(day): load_window(window) for day, window in data['days'].items()}
+
+    def save(self, path: str):
+        """Write a checkpoint atomically, so a crash mid-write keeps the previous one."""
+        data = self.to_dict()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Restore state from a checkpoint written with the same settings.
+        Returns:
+            True if the checkpoint was loaded, False if it is missing or incompatible
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        settings = (data.get('version'), data.get('capacity'), data.get('retention_days'), data.get('precision'))
+        if settings != (1, self.capacity, self.retention_days, self.precision):
+            return False
+        self._load_dict(data)
+        return True
+
+    def start_checkpointing(self, path: str, interval_seconds: float):
+        """Save a checkpoint to `path` every `interval_seconds` on a daemon thread."""
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.save(path)
+                except Exception as e:
+                    print(f"Error checkpointing analytics sketches: {e}")
+
+        self._checkpoint_path = path
+        self._checkpoint_thread = threading.Thread(target=run, name="analytics-sketch-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+
+    def close(self):
+        """Stop checkpointing and write a final checkpoint."""
+        if self._checkpoint_thread is None:
+            return
+        self._stop.set()
+        self._checkpoint_thread.join()
+        self._checkpoint_thread = None
+        self.save(self._checkpoint_path)
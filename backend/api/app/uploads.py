@@ -0,0 +1,142 @@
+import hashlib
+import os
+from typing import Callable, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+class UploadTooLarge(ValueError):
+    pass
+
+def part_file_path(file_path: str) -> str:
+    """Hidden temporary path an upload to `file_path` is written to until it is complete."""
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.part")
+
+def remove_partial_uploads(directory: str) -> int:
+    """Delete `.part` files left in `directory` by uploads interrupted by a restart; returns how many."""
+    removed = 0
+    for name in os.listdir(directory):
+        if name.startswith('.') and name.endswith('.part'):
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
+
+class StreamedUpload:
+    """A file part written to disk while the request body was still arriving."""
+
+    def __init__(self):
+        self.file_name: Optional[str] = None
+        self.file_path: Optional[str] = None
+        self.size = 0
+        self.hash = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self.hash.hexdigest()
+
+async def stream_upload(
+    request: Request,
+    field: str,
+    destination: Callable[[str], str],
+    max_bytes: int,
+    chunk_bytes: int = 1024 * 1024
+) -> StreamedUpload:
+    """
+    Stream the file of a multipart/form-data field to disk as the body arrives.
+
+    Only the parser state and one write buffer of `chunk_bytes` are held in
+    memory, whatever the upload size. The size and SHA-256 are computed on
+    the fly, and the upload is rejected as soon as it passes `max_bytes`
+    (immediately, if the Content-Length already says so). The body goes to a
+    hidden `.part` file next to the destination, which is renamed into place
+    only once the whole body has been parsed, so an interrupted upload never
+    appears under its final name. On any error the partial file is removed.
+    Args:
+        request: Request with a multipart/form-data body
+        field: Form field holding the file
+        destination: Maps the uploaded file name to the path to write
+        max_bytes: Largest accepted file
+        chunk_bytes: Size of the writes to disk
+    Returns:
+        The written file's name, path, size and hash
+    """
+    content_type, params = parse_options_header(request.headers.get('content-type'))
+    if content_type != b'multipart/form-data' or b'boundary' not in params:
+        raise ValueError("Expected a multipart/form-data body")
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise UploadTooLarge(f"Upload exceeds the maximum size of {max_bytes} bytes")
+
+    upload = StreamedUpload()
+    state = {'headers': {}, 'header': b'', 'value': b'', 'file': None, 'part_path': None}
+
+    def on_part_begin():
+        state['headers'] = {}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        state['header'] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        state['value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['header'].lower()] = state['value']
+        state['header'], state['value'] = b'', b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state['headers'].get(b'content-disposition'))
+        name = disposition.get(b'name', b'').decode('utf-8')
+        file_name = disposition.get(b'filename')
+        if name == field and file_name is not None and upload.file_path is None:
+            # Browsers may send a full client path; keep the base name only
+            upload.file_name = os.path.basename(file_name.decode('utf-8').replace('\\', '/'))
+            file_path = destination(upload.file_name)
+            if os.path.exists(file_path):
+                raise FileExistsError(f"File '{os.path.basename(file_path)}' already exists")
+            part_path = part_file_path(file_path)
+            # Exclusive create: never overwrite, or on error delete, a file this request didn't write
+            state['file'] = open(part_path, 'xb', buffering=chunk_bytes)
+            state['part_path'] = part_path
+            upload.file_path = file_path
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if state['file'] is None:
+            return
+        upload.size += end - start
+        if upload.size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        chunk = data[start:end]
+        upload.hash.update(chunk)
+        state['file'].write(chunk)
+
+    def on_part_end():
+        if state['file'] is not None:
+            state['file'].close()
+            state['file'] = None
+
+    parser = MultipartParser(params[b'boundary'], {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if upload.file_path is None:
+            raise ValueError(f"No file in form field '{field}'")
+        if state['file'] is not None:
+            raise ValueError("Upload ended before the file part was complete")
+        os.replace(state['part_path'], upload.file_path)
+    except BaseException:
+        if state['file'] is not None:
+            state['file'].close()
+        if state['part_path'] and os.path.exists(state['part_path']):
+            os.remove(state['part_path'])
+        raise
+    return upload
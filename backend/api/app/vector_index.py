@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.arrays import GrowableArray
+from app.embedding_store import EmbeddingStore, top_k
+
+IVF_META_FILE = "ivf_meta.json"
+
+class ExactIndex:
+    """Brute-force search over every row of the store; always returns the true top k."""
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+
+    def update(self):
+        pass
+
+    def search(self, vector: Sequence[float], k: int = 4, **kwargs) -> List[Tuple[int, float]]:
+        return self.store.search(vector, k)
+
+class _IVFState:
+    """Trained centroids and the rows assigned to each of them; replaced whole on retraining."""
+
+    def __init__(self, generation: int, centroids: np.ndarray, trained_rows: int, assignments: np.ndarray):
+        self.generation = generation
+        self.centroids = centroids
+        self.trained_rows = trained_rows
+        self.assigned = len(assignments)
+        order = np.argsort(assignments, kind='stable').astype(np.int32)
+        bounds = np.cumsum(np.bincount(assignments, minlength=len(centroids)))[:-1]
+        self.lists = []
+        for rows in np.split(order, bounds):
+            column = GrowableArray(np.int32, max(len(rows), 16))
+            column.extend(rows)
+            self.lists.append(column)
+
+    def add(self, assignments: np.ndarray):
+        """Append rows `assigned`, `assigned + 1`, ... to the lists of their centroids."""
+        rows = np.arange(self.assigned, self.assigned + len(assignments), dtype=np.int32)
+        order = np.argsort(assignments, kind='stable')
+        lists, starts = np.unique(assignments[order], return_index=True)
+        for centroid, chunk in zip(lists, np.split(rows[order], starts[1:])):
+            self.lists[centroid].extend(chunk)
+        self.assigned += len(assignments)
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are clustered around `nlist` k-means centroids,
+    and a query scores only the rows of its `nprobe` nearest centroids.
+
+    Raising `nprobe` trades latency for recall; `nprobe == nlist` is exact.
+    Until the store holds `min_rows` rows the index is untrained and searches
+    fall back to exact search. Rows appended later are assigned to their
+    nearest centroid by `update()`, and the centroids are retrained once the
+    store has grown to `retrain_factor` times the rows they were trained on.
+
+    With `background`, training runs on a thread over a snapshot of the rows,
+    so `update()` (and the ingestion adding the rows) never waits for k-means.
+    The previous generation keeps serving, and keeps indexing new rows, until
+    the new one has caught up with the rows appended meanwhile and is swapped
+    in; before the first training finishes, searches are exact.
+
+    Centroids and per-row assignments are kept next to the vectors as
+    `ivf_centroids.<generation>.f32` and `ivf_assign.<generation>.i32`;
+    `ivf_meta.json` names the current generation and is replaced last, so
+    a crash during retraining leaves the previous generation in use, and the
+    unfinished generation's files are removed on the next open.
+    """
+
+    def __init__(
+        self,
+        store: EmbeddingStore,
+        nlist: int = 0,
+        nprobe: int = 16,
+        min_rows: int = 20000,
+        retrain_factor: float = 4.0,
+        iterations: int = 10,
+        seed: int = 0,
+        background: bool = True
+    ):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.retrain_factor = retrain_factor
+        self.iterations = iterations
+        self.seed = seed
+        self.background = background
+        self._lock = threading.Lock()
+        self._training: Optional[threading.Thread] = None
+        self._state: Optional[_IVFState] = self._load()
+        self.update()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.store.directory, name)
+
+    def _load(self) -> Optional[_IVFState]:
+        if not os.path.exists(self._path(IVF_META_FILE)):
+            # Left by a first training that never finished
+            self._remove_generations(-1)
+            return None
+        with open(self._path(IVF_META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['dim'] != self.store.dim:
+            return None
+        generation = meta['generation']
+        self._remove_generations(generation)
+        centroids = np.fromfile(self._path(f"ivf_centroids.{generation}.f32"), dtype=np.float32).reshape(-1, meta['dim'])
+        assign_path = self._path(f"ivf_assign.{generation}.i32")
+        # The store may have dropped a torn tail on open; forget assignments past its end
+        rows = min(os.path.getsize(assign_path) // 4, len(self.store))
+        with open(assign_path, 'ab') as f:
+            f.truncate(rows * 4)
+        assignments = np.fromfile(assign_path, dtype=np.int32, count=rows)
+        return _IVFState(generation, centroids, meta['trained_rows'], assignments)
+
+    def _remove_generations(self, keep: int):
+        """Delete the files of every generation but `keep`."""
+        for name in os.listdir(self.store.directory):
+            if name.startswith('ivf_') and name != IVF_META_FILE and f".{keep}." not in name:
+                os.remove(self._path(name))
+
+    def update(self):
+        """Index the rows appended to the store since the last call, training or retraining when due."""
+        with self._lock:
+            rows = len(self.store)
+            state = self._state
+            if state is None:
+                due = rows >= self.min_rows
+            else:
+                due = rows > self.retrain_factor * state.trained_rows
+            if due and self._training is None:
+                generation = state.generation + 1 if state else 0
+                if not self.background:
+                    self._install(generation, *self._train(self.store.matrix))
+                    return
+                self._training = threading.Thread(
+                    target=self._train_in_background, args=(generation,), name="ivf-train", daemon=True
+                )
+                self._training.start()
+            if state is not None and rows > state.assigned:
+                self._assign_new_rows(state, rows)
+
+    def _assign_new_rows(self, state: _IVFState, rows: int):
+        """Add rows `state.assigned` to `rows` to `state` and to its assignment file."""
+        assignments = self._assign(state.centroids, self.store.matrix[state.assigned:rows])
+        with open(self._path(f"ivf_assign.{state.generation}.i32"), 'ab') as f:
+            f.write(assignments.tobytes())
+        state.add(assignments)
+
+    def _train(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster the rows of `matrix`; returns the centroids and every row's assignment."""
+        rows = len(matrix)
+        nlist = min(self.nlist or max(1, int(math.sqrt(rows))), rows)
+        rng = np.random.default_rng(self.seed)
+        # k-means converges on a sample; 64 points per centroid is plenty
+        sample_size = min(rows, 64 * nlist)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, sample_size, replace=False))])
+        centroids = self._kmeans(sample, nlist, rng)
+        return centroids, self._assign(centroids, matrix)
+
+    def _train_in_background(self, generation: int):
+        try:
+            # The store replaces its mapping on append, so this snapshot stays fixed
+            centroids, assignments = self._train(self.store.matrix)
+            with self._lock:
+                self._install(generation, centroids, assignments)
+        except Exception as e:
+            print(f"Error training IVF index generation {generation}: {e}")
+        finally:
+            with self._lock:
+                self._training = None
+
+    def _install(self, generation: int, centroids: np.ndarray, assignments: np.ndarray):
+        """Persist a trained generation, index the rows appended since its snapshot, and make it current."""
+        centroids.tofile(self._path(f"ivf_centroids.{generation}.f32"))
+        assignments.tofile(self._path(f"ivf_assign.{generation}.i32"))
+        state = _IVFState(generation, centroids, len(assignments), assignments)
+        rows = len(self.store)
+        if rows > state.assigned:
+            self._assign_new_rows(state, rows)
+        tmp_path = self._path(IVF_META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'generation': generation, 'dim': self.store.dim, 'trained_rows': state.trained_rows}, f)
+        os.replace(tmp_path, self._path(IVF_META_FILE))
+        self._state = state
+        self._remove_generations(generation)
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a background training, if one is running, to be swapped in.
+        Args:
+            timeout: Seconds to wait at most (forever if None)
+        Returns:
+            Whether no training is running any more
+        """
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+            return not training.is_alive()
+        return True
+
+    def _kmeans(self, sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+        """Spherical k-means: centroids are unit vectors and points join the one with the highest cosine."""
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = self._assign(centroids, sample)
+            order = np.argsort(labels, kind='stable')
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            centroids[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+            # Re-seed empty clusters from random points so no list stays unused
+            empty = np.flatnonzero(~filled)
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+            centroids = EmbeddingStore.normalize(centroids)
+        return centroids
+
+    @staticmethod
+    def _assign(centroids: np.ndarray, vectors: np.ndarray, block: int = 16384) -> np.ndarray:
+        """Nearest centroid of every vector, in blocks to bound the score matrix."""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block):
+            labels[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return labels
+
+    def search(self, vector: Sequence[float], k: int = 4, nprobe: Optional[int] = None, **kwargs) -> List[Tuple[int, float]]:
+        """
+        Approximate cosine search over the lists of the nearest centroids.
+        Args:
+            vector: Query embedding
+            k: Number of rows to return
+            nprobe: Lists to scan (defaults to the index's `nprobe`)
+        Returns:
+            (row, cosine similarity) pairs, most similar first
+        """
+        state = self._state
+        if state is None:
+            return self.store.search(vector, k)
+        query = EmbeddingStore.normalize(vector)[0]
+        probes = top_k(state.centroids @ query, nprobe or self.nprobe)
+        # Sorted rows read the memory-mapped matrix front to back
+        rows = np.sort(np.concatenate([state.lists[probe].view() for probe in probes]))
+        scores = self.store.matrix[rows] @ query
+        return [(int(rows[i]), float(scores[i])) for i in top_k(scores, k)]
+
+VECTOR_INDEXES = {'exact': ExactIndex, 'ivf': IVFIndex}
+
+def recall_at_k(index, queries: np.ndarray, k: int = 10, **search_kwargs) -> Dict[str, float]:
+    """
+    Measure an index against exact search.
+    Args:
+        index: Index to measure
+        queries: Query embeddings, one per row
+        k: Number of results compared per query
+        search_kwargs: Passed to index.search, e.g. nprobe
+    Returns:
+        Mean recall@k and median latencies in milliseconds of the index and of exact search
+    """
+    hits, index_ms, exact_ms = 0, [], []
+    for query in queries:
+        started = time.perf_counter()
+        expected = {row for row, _ in index.store.search(query, k)}
+        exact_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        found = {row for row, _ in index.search(query, k, **search_kwargs)}
+        index_ms.append((time.perf_counter() - started) * 1000)
+        hits += len(expected & found)
+    return {
+        'recall': hits / max(1, len(queries) * min(k, len(index.store))),
+        'latency_ms': float(np.median(index_ms)),
+        'exact_latency_ms': float(np.median(exact_ms)),
+    }
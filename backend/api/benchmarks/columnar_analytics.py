@@ -0,0 +1,80 @@
+"""
+Analytics panels from SQL against the NumPy columnar engine, at 1M and 10M events.
+
+Every panel is computed by both engines, with the analytics cache off and
+the clock stopped so both see the same window, and the results are compared. Databases are kept in `--workdir` between runs,
+since loading 10M events takes a while.
+
+    python -m benchmarks.columnar_analytics [--events 1000000 10000000] [--workdir DIR]
+"""
+import argparse
+import json
+import os
+import time
+from unittest import mock
+
+from benchmarks.common import conversation_records, isolate
+
+PANELS = [
+    ('get_hot_keywords', {}),
+    ('get_hourly_query_count', {'days': 7}),
+    ('get_top_users', {'days': 30}),
+    ('get_top_users', {}),
+    ('get_daily_average_scores', {'days': 30}),
+    ('get_citation_counts', {'days': 30}),
+    ('get_daily_top_keywords', {'days': 7}),
+    ('get_daily_user_engagement', {'days': 7}),
+    ('get_dashboard', {'days': 7}),
+]
+
+def timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--workdir', help="Directory for the benchmark databases (default: a temporary one)")
+    args = parser.parse_args()
+
+    isolate(args.workdir, keep=True)
+    from app.clients.db import ConversationDB
+    from app.columnar import ColumnarEvents
+
+    for events in args.events:
+        path = f'events_{events}.db'
+        fresh = not os.path.exists(path)
+        db = ConversationDB(path, analytics_cache_size=0, analytics_sketches=False, sketch_path=None, analytics_engine='sql')
+        if fresh:
+            # End the generated history now, so the day windows cover it
+            _, load_ms = timed(lambda: db.import_records(
+                conversation_records(1000, 0, events, users=20000, days=60, end_ms=db._now_ms()),
+                defer_indexes=True
+            ))
+            print(f"Loaded {events} events in {load_ms / 1000:.1f}s")
+        # A panel takes seconds at 10M events; without this the window would move between the engines
+        now_ms = db._now_ms()
+        with mock.patch.object(ConversationDB, '_now_ms', staticmethod(lambda: now_ms)):
+            columnar = ColumnarEvents(db)
+            try:
+                _, refresh_ms = timed(columnar.refresh)
+                print(json.dumps({'events': events, 'columnar_load_ms': round(refresh_ms)}))
+                for method, kwargs in PANELS:
+                    sql, sql_ms = timed(lambda: getattr(db, method)(**kwargs))
+                    vectorized, columnar_ms = timed(lambda: getattr(columnar, method)(**kwargs))
+                    print(json.dumps({
+                        'events': events,
+                        'panel': method,
+                        **kwargs,
+                        'sql_ms': round(sql_ms, 1),
+                        'columnar_ms': round(columnar_ms, 1),
+                        'speedup': round(sql_ms / columnar_ms, 1),
+                        'identical': sql == vectorized,
+                    }))
+            finally:
+                columnar.close()
+                db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Shared setup of the benchmark scripts, which run from backend/api as
+
+    python -m benchmarks.<name> [options]
+
+`isolate()` has to run before anything under `app` is imported. It moves the
+process into a scratch working directory, since DATA_DIR and the default
+DB_PATH are relative to it, and registers the `app.clients` package without
+running its `__init__`, whose module-level singletons (the OpenAI-backed
+vector store among them) the benchmarks never touch.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import types
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+API_DIR = Path(__file__).resolve().parents[1]
+HOUR_MS = 60 * 60 * 1000
+
+WORDS = [
+    'deploy', 'pipeline', 'latency', 'index', 'cache', 'retry', 'timeout', 'schema', 'vector', 'embedding',
+    'partition', 'rollup', 'keyword', 'citation', 'dashboard', 'token', 'upload', 'parser', 'session', 'quota',
+    'replica', 'shard', 'backup', 'restore', 'migration', 'cluster', 'gateway', 'webhook', 'slack', 'channel',
+]
+
+def isolate(workdir: Optional[str] = None, keep: bool = False) -> str:
+    """
+    Run the benchmark in `workdir` (a fresh temporary directory by default).
+    Args:
+        workdir: Working directory for the databases and data files
+        keep: Keep an existing `workdir` instead of emptying it
+    Returns:
+        The working directory
+    """
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix='benchmark-')
+    elif not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, str(API_DIR))
+    clients = types.ModuleType('app.clients')
+    clients.__path__ = [str(API_DIR / 'app' / 'clients')]
+    sys.modules['app.clients'] = clients
+    return workdir
+
+def text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(words))
+
+def conversation_records(
+    conversations: int,
+    messages: int,
+    events: int,
+    users: int = 1000,
+    days: int = 30,
+    end_ms: int = 1_760_000_000_000,
+    seed: int = 0,
+) -> Iterator[Dict]:
+    """
+    Generate bulk records (see `ConversationDB.import_records`) spread over the
+    last `days` days before `end_ms`.
+    """
+    rng = random.Random(seed)
+    start_ms = end_ms - days * 24 * HOUR_MS
+    for i in range(conversations):
+        yield {'type': 'conversation', 'id': f'c{i}', 'user_id': f'u{i % users}'}
+    for i in range(messages):
+        yield {
+            'type': 'message',
+            'conversation_id': f'c{i % conversations}',
+            'user_id': f'u{rng.randrange(users)}',
+            'content': text(rng, rng.randint(5, 40)),
+            'created_at_ms': start_ms + (end_ms - start_ms) * i // max(messages, 1),
+        }
+    for i in range(events):
+        yield {
+            'type': 'event',
+            'conversation_id': f'c{rng.randrange(conversations)}',
+            'user_id': f'u{rng.randrange(users)}',
+            'query': text(rng, rng.randint(1, 6)),
+            'score': round(rng.random(), 3),
+            'citations': [f'doc{rng.randrange(200)}.pdf' for _ in range(rng.randint(0, 3))],
+            'ts': start_ms + (end_ms - start_ms) * i // max(events, 1),
+        }
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -0,0 +1,70 @@
+"""
+Keyword search over one large conversation with `ConversationDB.get_messages`:
+scanning with `content LIKE '%keyword%'`, the trigram full-text index, and the
+default of scanning MESSAGE_SEARCH_SCAN_ROWS messages before using the index.
+
+All messages go into one conversation, like the shared Slack conversation.
+Each keyword is searched for the first page (`--limit`) and for every match;
+all three must return the same messages. The database is kept in
+`--workdir` between runs.
+
+    python -m benchmarks.message_search [--messages 1000000] [--limit 50]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import conversation_records, isolate
+
+# A rare token, a common one, a very common one, one that never occurs and a two-character one
+KEYWORDS = ['backup17 restore3', 'backup17', 'restore', 'kubernetes', 'ta']
+
+def timed(search, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = search()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=50, help="Page size of the paged searches")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', help="Directory for the benchmark database (default: a temporary one)")
+    args = parser.parse_args()
+
+    isolate(args.workdir, keep=True)
+    from app.clients.db import ConversationDB
+
+    db = ConversationDB('search.db', analytics_sketches=False, sketch_path=None)
+    if not db._fetchall("SELECT 1 FROM conversations WHERE id = 'c0'"):
+        started = time.perf_counter()
+        db.import_records(conversation_records(1, args.messages, 0), defer_indexes=True)
+        print(f"Loaded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+    scan_rows = db.search_scan_rows
+    try:
+        for keyword in KEYWORDS:
+            for limit in (args.limit, None):
+                search = lambda: db.get_messages('c0', [keyword], limit=limit)
+                default, default_ms = timed(search, args.repeat)
+                # Without a full-text query get_messages only scans
+                db._fts_query = lambda keywords: None
+                like, like_ms = timed(search, args.repeat)
+                del db._fts_query
+                db.search_scan_rows = 0
+                fts, fts_ms = timed(search, args.repeat)
+                db.search_scan_rows = scan_rows
+                assert like == fts == default, keyword
+                print(json.dumps({
+                    'keyword': keyword,
+                    'limit': limit,
+                    'matches': len(fts),
+                    'like_ms': round(like_ms, 2),
+                    'fts_ms': round(fts_ms, 2),
+                    'default_ms': round(default_ms, 2),
+                }))
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Mixed read/write throughput of ConversationDB, before and after the pooled
+access layer.
+
+Reader threads page through messages and analytics threads run a keyword
+aggregate (with the analytics cache off) while writer threads persist chat
+turns. "serialized" runs the same workload with every call behind one lock,
+the way the single shared connection and cursor used to serialize all
+traffic; "pooled" uses the connection pool as is.
+
+    python -m benchmarks.mixed_read_write [--readers 8] [--analytics 1] [--writers 2] [--seconds 10]
+"""
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.common import conversation_records, isolate, percentile
+
+class SerializedDB:
+    """ConversationDB with every call taking one global lock, like the old shared cursor."""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        def call(*args, **kwargs):
+            with self.lock:
+                return method(*args, **kwargs)
+        return call
+
+def run(db, args) -> dict:
+    stop = threading.Event()
+    latencies = defaultdict(list)
+    lock = threading.Lock()
+
+    def loop(kind, operation):
+        samples = []
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            operation(i)
+            samples.append(time.perf_counter() - started)
+            i += 1
+        with lock:
+            latencies[kind].extend(samples)
+
+    def read(i):
+        db.get_messages(f'c{i % args.conversations}', limit=50)
+
+    def analytics(i):
+        db.get_hot_keywords(limit=10)
+
+    def write(i):
+        db.add_message_with_response_and_event(
+            f'c{i % args.conversations}', 'how do I rotate the backup keys', f'u{i % 100}',
+            'see the runbook', 'rotate backup keys', 0.8, ['runbook.pdf']
+        )
+
+    threads = [threading.Thread(target=loop, args=('read', read)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=loop, args=('analytics', analytics)) for _ in range(args.analytics)]
+    threads += [threading.Thread(target=loop, args=('write', write)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        kind: {
+            'ops_per_s': round(len(samples) / args.seconds, 1),
+            'p50_ms': round(percentile(samples, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+        }
+        for kind, samples in sorted(latencies.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--analytics', type=int, default=1)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--conversations', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--workdir', help="Directory for the benchmark databases (default: a temporary one)")
+    args = parser.parse_args()
+
+    isolate(args.workdir)
+    from app.clients.db import ConversationDB
+
+    for mode in ('serialized', 'pooled'):
+        db = ConversationDB(f'{mode}.db', max_readers=args.readers, analytics_cache_size=0, analytics_sketches=False, sketch_path=None)
+        db.import_records(conversation_records(args.conversations, args.messages, args.events), defer_indexes=True)
+        print(json.dumps({'mode': mode, **run(SerializedDB(db) if mode == 'serialized' else db, args)}))
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Sustained chat-turn write throughput of ConversationDB.
+
+Each thread persists chat turns with `add_message_with_response_and_event`
+(two messages and one event in one transaction) as fast as it can; the run
+is repeated for every thread count, with group commit off and on.
+
+    python -m benchmarks.write_throughput [--threads 1 4 16 64] [--turns 3200] [--interval-ms 5]
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.common import isolate, percentile
+
+def run(db, threads: int, turns: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    conversation_id = db.create_conversation('bench')
+
+    def work(worker: int):
+        samples = []
+        for _ in range(turns // threads):
+            started = time.perf_counter()
+            db.add_message_with_response_and_event(
+                conversation_id, 'how do I rotate the backup keys', f'u{worker}',
+                'see the runbook', 'rotate backup keys', 0.8, ['runbook.pdf']
+            )
+            samples.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(samples)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'threads': threads,
+        'turns_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--turns', type=int, default=3200, help="Chat turns written per run, split across the threads")
+    parser.add_argument('--interval-ms', type=int, default=5, help="Group commit flush interval")
+    parser.add_argument('--workdir', help="Directory for the benchmark databases (default: a temporary one)")
+    args = parser.parse_args()
+
+    isolate(args.workdir)
+    from app.clients.db import ConversationDB
+
+    for threads in args.threads:
+        for group_commit in (False, True):
+            db = ConversationDB(
+                f'writes_{threads}_{group_commit}.db', analytics_sketches=False, sketch_path=None,
+                group_commit=group_commit, group_commit_interval_ms=args.interval_ms
+            )
+            print(json.dumps({'group_commit': group_commit, **run(db, threads, args.turns)}))
+            db.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,33 @@
+import time
+# Measured before the app imports, which open the databases and stores
+STARTUP_STARTED = time.perf_counter()
+
 import uvicorn
 import os
-import shutil
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routers import material, conversations, analytics, auth
+from app.clients import CONVERSATION_DB, ASYNC_CONVERSATION_DB
+from app.repository import INGESTION_QUEUE
 from app.constant import DATA_DIR
 from fastapi.middleware.cors import CORSMiddleware
 
 def init_data_directory():
-    """Initialize data directory by removing existing one and creating fresh."""
-    # Remove existing data directory if it exists
-    if os.path.exists(DATA_DIR):
-        shutil.rmtree(DATA_DIR)
-    # Create fresh data directory
+    """Create the data directory if missing; uploaded materials are kept across restarts."""
     os.makedirs(DATA_DIR, exist_ok=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"API started in {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} ms")
+    yield
+    # Finish running ingestion jobs; queued uploads are resumed on the next start
+    INGESTION_QUEUE.close()
+    # Let in-flight DB calls finish before closing the connections
+    ASYNC_CONVERSATION_DB.close()
+    CONVERSATION_DB.close()
+
 app = FastAPI(
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url=None,
     openapi_url="/openapi.json"
@@ -0,0 +1,162 @@
+"""
+Command line bulk import and export of the conversation database, and
+database and vector index maintenance.
+
+    python manage.py export -o dump.ndjson [--types message event] [--conversation-id ID]
+    python manage.py import dump.ndjson [--batch-size N] [--no-defer-indexes]
+    python manage.py compact [--retention-days N] [--message-retention-days N]
+    python manage.py rebuild-rollups
+    python manage.py backfill-indexes [--batch-size N]
+    python manage.py vector-recall [--k 10] [--queries 100] [--nprobe 1 4 16 64]
+
+Records are newline-delimited JSON objects, one per row, with a `type` of
+conversation, message or event; `-` (the default) reads stdin or writes stdout.
+compact archives and deletes the raw rows of months older than the retention
+period (EVENT_RETENTION_DAYS and MESSAGE_RETENTION_DAYS by default).
+rebuild-rollups regenerates the hourly and daily event rollups from the raw
+events, keeping the buckets of compacted months. backfill-indexes adds the
+keyword and citation index rows of events that have none.
+vector-recall compares the IVF vector index with exact search, using stored
+chunks as queries.
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from app.clients.db import BULK_RECORDS, CONVERSATION_DB
+from app.constant import VECTOR_STORE_DIR, VECTOR_IVF_NLIST, VECTOR_IVF_NPROBE, VECTOR_IVF_MIN_ROWS
+from app.embedding_store import EmbeddingStore
+from app.vector_index import IVFIndex, recall_at_k
+
+def export_records(args) -> int:
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    count = 0
+    try:
+        for record in CONVERSATION_DB.export_records(tuple(args.types), args.conversation_id):
+            output.write(json.dumps(record) + '\n')
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return count
+
+def read_records(lines):
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}")
+
+def import_records(args) -> dict:
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        return CONVERSATION_DB.import_records(
+            read_records(source),
+            batch_size=args.batch_size,
+            defer_indexes=args.defer_indexes
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+def compact_partitions(args) -> list:
+    kwargs = {}
+    if args.retention_days is not None:
+        kwargs['retention_days'] = args.retention_days
+    if args.message_retention_days is not None:
+        kwargs['message_retention_days'] = args.message_retention_days
+    return CONVERSATION_DB.compact_partitions(**kwargs)
+
+def backfill_indexes(args) -> dict:
+    return {
+        'keywords': CONVERSATION_DB.backfill_keyword_index(args.batch_size),
+        'citations': CONVERSATION_DB.backfill_citation_index(args.batch_size),
+    }
+
+def vector_recall(args) -> list:
+    store = EmbeddingStore(VECTOR_STORE_DIR)
+    try:
+        if not len(store):
+            raise ValueError(f"No chunks in {VECTOR_STORE_DIR}")
+        index = IVFIndex(store, nlist=VECTOR_IVF_NLIST, nprobe=VECTOR_IVF_NPROBE, min_rows=min(VECTOR_IVF_MIN_ROWS, len(store)), background=False)
+        rows = np.random.default_rng(0).choice(len(store), min(args.queries, len(store)), replace=False)
+        queries = np.asarray(store.matrix[np.sort(rows)])
+        return [
+            {'nprobe': nprobe, **recall_at_k(index, queries, args.k, nprobe=nprobe)}
+            for nprobe in args.nprobe or [index.nprobe]
+        ]
+    finally:
+        store.close()
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import and export of conversations, messages and events, and database maintenance")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help="Stream records to NDJSON")
+    export_parser.add_argument('-o', '--output', default='-', help="Output file (default stdout)")
+    export_parser.add_argument('--types', nargs='+', choices=list(BULK_RECORDS), default=list(BULK_RECORDS), help="Record types to export")
+    export_parser.add_argument('--conversation-id', help="Only export this conversation")
+
+    import_parser = commands.add_parser('import', help="Load records from NDJSON")
+    import_parser.add_argument('input', nargs='?', default='-', help="Input file (default stdin)")
+    import_parser.add_argument('--batch-size', type=int, default=50000, help="Records per executemany batch")
+    import_parser.add_argument(
+        '--defer-indexes',
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Load in one transaction and rebuild the indexes at the end; other writers wait until it commits"
+    )
+
+    compact_parser = commands.add_parser('compact', help="Archive and delete the raw rows of months older than the retention period")
+    compact_parser.add_argument('--retention-days', type=positive_int, help="Keep raw events of months ending within this many days (default EVENT_RETENTION_DAYS)")
+    compact_parser.add_argument('--message-retention-days', type=positive_int, help="Keep messages of months ending within this many days (default MESSAGE_RETENTION_DAYS)")
+
+    commands.add_parser('rebuild-rollups', help="Regenerate the hourly and daily rollups from the raw events")
+
+    backfill_parser = commands.add_parser('backfill-indexes', help="Index the keywords and citations of events missing from their indexes")
+    backfill_parser.add_argument('--batch-size', type=positive_int, default=1000, help="Events indexed per transaction")
+
+    recall_parser = commands.add_parser('vector-recall', help="Measure recall@k and latency of the vector index against exact search")
+    recall_parser.add_argument('--k', type=int, default=10, help="Results compared per query")
+    recall_parser.add_argument('--queries', type=int, default=100, help="Stored chunks used as queries")
+    recall_parser.add_argument('--nprobe', type=int, nargs='+', help="Lists scanned per query (default VECTOR_IVF_NPROBE)")
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    try:
+        if args.command == 'export':
+            count = export_records(args)
+            print(f"Exported {count} records in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        elif args.command == 'compact':
+            for result in compact_partitions(args):
+                print(json.dumps(result))
+        elif args.command == 'rebuild-rollups':
+            result = CONVERSATION_DB.rebuild_rollups()
+            print(f"Rebuilt rollups {json.dumps(result)} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        elif args.command == 'backfill-indexes':
+            counts = backfill_indexes(args)
+            print(f"Indexed events {json.dumps(counts)} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        elif args.command == 'vector-recall':
+            for result in vector_recall(args):
+                print(json.dumps(result))
+        else:
+            counts = import_records(args)
+            print(f"Imported {json.dumps(counts)} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        CONVERSATION_DB.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Test setup, run from backend/api with `python -m pytest tests`.
+
+The app's modules read their paths relative to the working directory (DATA_DIR,
+DB_PATH, ARCHIVE_DIR) and create module-level singletons on import, so the
+session runs in a scratch directory. `app.clients` is registered without its
+package `__init__`, which builds the OpenAI-backed vector store; the tests
+import the client modules they need directly.
+"""
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(API_DIR))
+os.chdir(tempfile.mkdtemp(prefix='api-tests-'))
+os.environ.setdefault('ANALYTICS_SKETCHES', 'false')
+
+clients = types.ModuleType('app.clients')
+clients.__path__ = [str(API_DIR / 'app' / 'clients')]
+sys.modules['app.clients'] = clients
+
+@pytest.fixture
+def make_db(tmp_path):
+    """Factory of ConversationDBs on files under `tmp_path`, closed after the test."""
+    from app.clients.db import ConversationDB
+    opened = []
+
+    def make(name: str = 'conversations.db', **kwargs):
+        kwargs.setdefault('sketch_path', None)
+        db = ConversationDB(str(tmp_path / name), **kwargs)
+        opened.append(db)
+        return db
+    yield make
+    for db in opened:
+        db.close()
@@ -0,0 +1,64 @@
+import asyncio
+import importlib
+import json
+import sys
+
+import pytest
+from fastapi import FastAPI
+
+from app.clients.async_db import AsyncConversationDB
+
+@pytest.fixture
+def app(make_db, monkeypatch):
+    """An app serving the analytics router on a database with sketches and a few events."""
+    db = make_db(analytics_sketches=True, analytics_cache_size=0)
+    conversation_id = db.create_conversation('u1')
+    for user_id, query in [('u1', 'deploy cache'), ('u2', 'deploy'), ('u1', 'retry')]:
+        db.create_event(user_id, conversation_id, query, 0.5, ['a.pdf'])
+    async_db = AsyncConversationDB(db, max_workers=1, analytics_workers=1)
+    monkeypatch.setattr(sys.modules['app.clients'], 'ASYNC_CONVERSATION_DB', async_db, raising=False)
+    monkeypatch.delitem(sys.modules, 'app.routers.analytics', raising=False)
+    app = FastAPI()
+    # Imported afresh, so the router binds this test's database
+    app.include_router(importlib.import_module('app.routers.analytics').router)
+    yield app
+    async_db.close()
+
+def get(app, path: str, query: str = '') -> dict:
+    """Send a GET through the ASGI app and return the decoded JSON body."""
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'headers': [], 'scheme': 'http', 'server': ('test', 80),
+        'http_version': '1.1', 'asgi': {'version': '3.0'},
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]['status'] == 200
+    return json.loads(b''.join(message.get('body', b'') for message in sent[1:]))
+
+def test_exact_answers_keep_their_shape(app):
+    assert get(app, '/v1/analytics/hot-keywords', 'limit=2') == {
+        'keywords': [{'keyword': 'deploy', 'frequency': 2}, {'keyword': 'cache', 'frequency': 1}]
+    }
+    assert get(app, '/v1/analytics/top-users') == {
+        'days': None,
+        'users': [{'user_id': 'u1', 'count': 2}, {'user_id': 'u2', 'count': 1}],
+    }
+
+def test_approximate_answers_carry_their_error(app):
+    keywords = get(app, '/v1/analytics/hot-keywords', 'limit=1&approximate=true')
+    assert keywords == {'keywords': [{'keyword': 'deploy', 'frequency': 2, 'error': 0}], 'approximate': True}
+    users = get(app, '/v1/analytics/top-users', 'days=1&limit=1&approximate=true')
+    assert users == {
+        'days': 1,
+        'users': [{'user_id': 'u1', 'count': 2, 'error': 0}],
+        'approximate': True,
+        'distinct_users': 2,
+    }
@@ -0,0 +1,70 @@
+import threading
+
+from app import cache as cache_module
+from app.cache import TTLCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_hits_and_misses_are_counted():
+    cache = TTLCache(maxsize=4, ttl=60)
+    assert cache.get_or_set('a', lambda: 1) == 1
+    assert cache.get_or_set('a', lambda: 2) == 1
+    assert cache.get_or_set('b', lambda: 3) == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+    assert stats['hit_rate'] == round(1 / 3, 4)
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.get_or_set('a', lambda: 'old')
+    clock.now += 9.9
+    assert cache.get_or_set('a', lambda: 'new') == 'old'
+    clock.now += 0.2
+    assert cache.get_or_set('a', lambda: 'new') == 'new'
+    assert cache.stats()['misses'] == 2
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.get_or_set('a', lambda: 1)
+    cache.get_or_set('b', lambda: 2)
+    # Touching 'a' leaves 'b' as the least recently used
+    cache.get_or_set('a', lambda: None)
+    cache.get_or_set('c', lambda: 3)
+    assert cache.stats()['evictions'] == 1
+    assert cache.get_or_set('a', lambda: 'recomputed') == 1
+    assert cache.get_or_set('b', lambda: 'recomputed') == 'recomputed'
+
+def test_clear_during_a_slow_factory_does_not_store_its_value():
+    cache = TTLCache(maxsize=4, ttl=60)
+    computing, cleared = threading.Event(), threading.Event()
+
+    def slow():
+        computing.set()
+        assert cleared.wait(10)
+        return 'stale'
+
+    caller = threading.Thread(target=cache.get_or_set, args=('a', slow))
+    caller.start()
+    assert computing.wait(10)
+    cache.clear()
+    cleared.set()
+    caller.join()
+    assert cache.stats()['size'] == 0
+    assert cache.get_or_set('a', lambda: 'fresh') == 'fresh'
+
+def test_analytics_cache_keys_bind_defaults(make_db):
+    db = make_db(analytics_cache_size=16)
+    db.get_hourly_query_count(7)
+    db.get_hourly_query_count(days=7)
+    db.get_hourly_query_count()
+    db.get_top_users(None, 10)
+    db.get_top_users(limit=10)
+    stats = db.analytics_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (3, 2, 2)
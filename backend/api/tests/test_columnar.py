@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from app.columnar import ColumnarEvents
+
+HOUR_MS = 60 * 60 * 1000
+
+QUERIES = [
+    ('get_hot_keywords', {}),
+    ('get_hot_keywords', {'limit': 3, 'conversation_id': 'c1'}),
+    ('get_hourly_query_count', {'days': 2}),
+    ('get_top_users', {}),
+    ('get_top_users', {'days': 3, 'limit': 5, 'conversation_id': 'c2'}),
+    ('get_daily_average_scores', {'days': 7}),
+    ('get_citation_counts', {}),
+    ('get_citation_counts', {'days': 1, 'conversation_id': 'c0'}),
+    ('get_daily_top_keywords', {'days': 7, 'limit': 4}),
+    ('get_daily_user_engagement', {'days': 7}),
+    ('get_dashboard', {'days': 3, 'limit': 5}),
+]
+
+def events(count: int, end_ms: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'type': 'event',
+            'conversation_id': f'c{rng.randrange(4)}',
+            'user_id': f'u{rng.randrange(30)}',
+            'query': ' '.join(rng.choice(['deploy', 'cache', 'index', 'retry', 'shard', 'quota']) for _ in range(rng.randint(1, 4))),
+            'score': rng.choice([None, 0.0, 0.25, 0.5, 0.875, 1.0]),
+            'citations': rng.sample(['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf'], rng.randint(0, 2)),
+            'ts': end_ms - rng.randrange(10 * 24 * HOUR_MS),
+        }
+
+@pytest.fixture
+def db(make_db):
+    db = make_db(analytics_cache_size=0, analytics_engine='sql')
+    db.import_records(
+        [{'type': 'conversation', 'id': f'c{i}', 'user_id': 'admin'} for i in range(4)] + list(events(2000, db._now_ms(), 0))
+    )
+    return db
+
+def assert_identical(db, columnar):
+    for method, kwargs in QUERIES:
+        assert getattr(columnar, method)(**kwargs) == getattr(db, method)(**kwargs), (method, kwargs)
+
+def test_columnar_results_match_sql(db):
+    columnar = ColumnarEvents(db)
+    try:
+        assert_identical(db, columnar)
+    finally:
+        columnar.close()
+
+def test_columnar_appends_new_events(db):
+    columnar = ColumnarEvents(db)
+    try:
+        columnar.refresh()
+        loaded = len(columnar)
+        # Out-of-order timestamps as well as live writes
+        db.import_records(list(events(300, db._now_ms(), 1)))
+        db.create_event('u1', 'c1', 'deploy deploy retry', 0.5, ['a.pdf'])
+        assert columnar.refresh() == 301
+        assert len(columnar) == loaded + 301
+        assert_identical(db, columnar)
+    finally:
+        columnar.close()
+
+def test_columnar_engine_serves_analytics(make_db, db):
+    columnar_db = make_db('columnar.db', analytics_cache_size=0, analytics_engine='columnar')
+    columnar_db.import_records(db.export_records())
+    for method, kwargs in QUERIES:
+        assert getattr(columnar_db, method)(**kwargs) == getattr(db, method)(**kwargs), (method, kwargs)
@@ -0,0 +1,17 @@
+import os
+
+from app.embedding_store import CHUNKS_FILE, EmbeddingStore
+
+def test_scan_records_reads_committed_matches(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append([[1.0, 0.0], [0.0, 1.0]], [
+        {'id': 'a', 'text': 'first', 'metadata': {'source': '12345'}},
+        {'id': 'b', 'text': 'second', 'metadata': {'source': '67890'}},
+    ])
+    # A record written by an append that never committed its offsets
+    with open(os.path.join(tmp_path, CHUNKS_FILE), 'ab') as f:
+        f.write(b'{"id": "c", "text": "torn", "metadata": {"source": "12345"}}\n')
+    assert [record['id'] for record in store.scan_records(b'"source": "12345"')] == ['a']
+    assert [record['id'] for record in store.scan_records(b'"source"')] == ['a', 'b']
+    assert list(store.scan_records(b'"source": "00000"')) == []
+    store.close()
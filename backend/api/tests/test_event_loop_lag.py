@@ -0,0 +1,139 @@
+import asyncio
+import sys
+import time
+import types
+
+import pytest
+
+from app.clients.async_db import AsyncConversationDB
+
+HOUR_MS = 60 * 60 * 1000
+
+def seed(db, events: int = 30000):
+    end_ms = db._now_ms()
+    db.import_records(
+        [{'type': 'conversation', 'id': f'c{i}', 'user_id': f'u{i}'} for i in range(20)] + [
+            {
+                'type': 'event',
+                'conversation_id': f'c{i % 20}',
+                'user_id': f'u{i % 500}',
+                'query': f'deploy{i % 300} pipeline{i % 70} cache',
+                'score': (i % 100) / 100,
+                'citations': [f'doc{i % 40}.pdf'],
+                'ts': end_ms - (i * 7 * 24 * HOUR_MS) // events,
+            }
+            for i in range(events)
+        ],
+        defer_indexes=True
+    )
+
+async def measure_lag(load, seconds: float = 1.5, tick: float = 0.005) -> float:
+    """Run `load` tasks for `seconds` and return the worst delay of a `tick` sleep on the loop."""
+    stop = asyncio.Event()
+    lags = []
+
+    async def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - started - tick)
+
+    async def stopper():
+        await asyncio.sleep(seconds)
+        stop.set()
+
+    await asyncio.gather(probe(), stopper(), *(task(stop) for task in load))
+    return max(lags)
+
+def workload(db):
+    """Dashboard readers and chat turns, each a coroutine running until `stop` is set."""
+    async def analytics(stop):
+        while not stop.is_set():
+            await db.get_dashboard(days=7)
+
+    async def chat(stop):
+        i = 0
+        while not stop.is_set():
+            await db.add_message_with_response_and_event(f'c{i % 20}', 'how do I deploy', f'u{i}', 'like this', 'deploy pipeline', 0.7, ['doc1.pdf'])
+            await db.get_messages(f'c{i % 20}', limit=50)
+            i += 1
+    return [analytics, analytics, chat, chat, chat, chat]
+
+class BlockingDB:
+    """Calls ConversationDB on the event loop thread, as the routers used to."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            # Let the other tasks run between calls, as a real await would
+            await asyncio.sleep(0)
+            return result
+        return call
+
+@pytest.mark.parametrize('engine', ['sql', 'columnar'])
+def test_db_calls_do_not_stall_the_event_loop(make_db, engine):
+    db = make_db(analytics_cache_size=0, analytics_engine=engine)
+    seed(db)
+    async_db = AsyncConversationDB(db, max_workers=4, analytics_workers=2)
+    try:
+        blocking_lag = asyncio.run(measure_lag(workload(BlockingDB(db))))
+        lag = asyncio.run(measure_lag(workload(async_db)))
+    finally:
+        async_db.close()
+    # Inline, every dashboard holds the loop for the whole query
+    assert blocking_lag > 0.02
+    # Through the executors the loop only waits for the GIL between bytecodes
+    assert lag < blocking_lag / 2
+    assert lag < 0.1
+
+class SlowMessage:
+    def __init__(self, content: str):
+        self.content = content
+        self.additional_kwargs = {'citations': ['doc1.pdf'], 'context': 'doc1'}
+
+    def pretty_print(self):
+        pass
+
+def blocking(seconds: float, result):
+    """A stand-in for an OpenAI call: holds its thread for `seconds`."""
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+    return call
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="the router uses PEP 701 f-strings")
+def test_model_calls_do_not_stall_the_event_loop(make_db, monkeypatch):
+    """The chat and summary routes with a graph and evaluator that block for 200 ms per call."""
+    graph = types.ModuleType('app.graph')
+    graph.GRAPH = types.SimpleNamespace(stream=lambda *args, **kwargs: iter(
+        [{'messages': [blocking(0.2, SlowMessage('like this'))()]}]
+    ))
+    evaluate = types.ModuleType('app.evaluate')
+    evaluate.evaluate_answer = blocking(0.2, 0.9)
+    evaluate.summarize_messages = blocking(0.2, 'a summary')
+    monkeypatch.setitem(sys.modules, 'app.graph', graph)
+    monkeypatch.setitem(sys.modules, 'app.evaluate', evaluate)
+    monkeypatch.delitem(sys.modules, 'app.routers.conversations', raising=False)
+    db = make_db()
+    async_db = AsyncConversationDB(db, max_workers=4, analytics_workers=1)
+    monkeypatch.setattr(sys.modules['app.clients'], 'ASYNC_CONVERSATION_DB', async_db, raising=False)
+    from app.routers import conversations
+    conversation_id = db.create_conversation('u1')
+
+    async def chat(stop):
+        while not stop.is_set():
+            payload = conversations.Message(user_id='u1', content='how do I deploy')
+            assert await conversations.post_messages(conversation_id, payload) == {'message': 'like this\n\nsource: [doc1.pdf]'}
+            assert (await conversations.get_conversation_summary(conversation_id)).summary == 'a summary'
+
+    try:
+        lag = asyncio.run(measure_lag([chat, chat]))
+    finally:
+        async_db.close()
+    # Inline, every turn would hold the loop for at least 200 ms
+    assert lag < 0.1
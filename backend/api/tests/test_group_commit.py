@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from app.clients.group_commit import GroupCommitWriter
+from app.clients.pool import ConnectionPool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'writes.db'), max_readers=2)
+    with pool.writer() as cursor:
+        cursor.execute('CREATE TABLE items (name TEXT UNIQUE)')
+    yield pool
+    pool.close()
+
+def committed(pool):
+    with pool.reader() as cursor:
+        cursor.execute('SELECT name FROM items ORDER BY rowid')
+        return [row[0] for row in cursor.fetchall()]
+
+def insert(name):
+    def operation(cursor):
+        cursor.execute('INSERT INTO items (name) VALUES (?)', (name,))
+        return name
+    return operation
+
+def test_callers_are_acknowledged_only_after_the_commit(pool):
+    writer = GroupCommitWriter(pool, flush_interval_ms=200, batch_size=2)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(cursor):
+        started.set()
+        assert release.wait(10)
+        return insert('b')(cursor)
+
+    try:
+        first = writer.submit(insert('a'))
+        second = writer.submit(slow)
+        assert started.wait(10)
+        # 'a' has run, but its transaction is still open
+        assert not first.done()
+        assert committed(pool) == []
+        release.set()
+        assert first.result(10) == 'a'
+        # Visible to other connections by the time the caller hears back
+        assert committed(pool) == ['a', 'b']
+        assert second.result(10) == 'b'
+    finally:
+        release.set()
+        writer.close()
+
+def test_a_failed_operation_does_not_undo_its_batch(pool):
+    writer = GroupCommitWriter(pool, flush_interval_ms=50, batch_size=3)
+    try:
+        futures = [writer.submit(insert(name)) for name in ('a', 'a', 'b')]
+        assert futures[0].result(10) == 'a'
+        with pytest.raises(Exception, match='UNIQUE'):
+            futures[1].result(10)
+        assert futures[2].result(10) == 'b'
+        assert committed(pool) == ['a', 'b']
+    finally:
+        writer.close()
+
+def test_close_flushes_queued_writes(pool):
+    writer = GroupCommitWriter(pool, flush_interval_ms=10000, batch_size=1000)
+    futures = [writer.submit(insert(f'n{i}')) for i in range(20)]
+    writer.close()
+    assert [future.result(0) for future in futures] == [f'n{i}' for i in range(20)]
+    assert len(committed(pool)) == 20
+    with pytest.raises(RuntimeError):
+        writer.submit(insert('late'))
+
+def test_group_commit_db_persists_chat_turns(make_db):
+    db = make_db(group_commit=True, group_commit_interval_ms=2)
+    conversation_id = db.create_conversation('u1')
+    threads = [
+        threading.Thread(target=db.add_message_with_response_and_event, args=(
+            conversation_id, f'question {i}', 'u1', 'answer', 'question', 0.5, ['a.pdf']
+        ))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(db.get_messages(conversation_id)) == 16
+    assert db.get_citation_counts() == [{'citation': 'a.pdf', 'count': 8}]
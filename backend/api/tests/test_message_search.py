@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+MESSAGES = [
+    'Deploying the pipeline', 'redeploy now', 'a_b test', 'ab', 'Résumé upload',
+    'nothing here', 'x%y', 'say "hi" there', '部署完成',
+]
+
+def like(keywords):
+    """What `content LIKE '%keyword%' OR ...` returns for MESSAGES."""
+    conn = sqlite3.connect(':memory:')
+    return [
+        content for content in MESSAGES
+        if any(conn.execute('SELECT ? LIKE ?', (content, f'%{keyword}%')).fetchone()[0] for keyword in keywords)
+    ]
+
+# 0 sends every search through the full-text index, 3 scans a few messages before
+# falling back to it, and the default scans the whole (small) conversation
+@pytest.fixture(params=[0, 3, 20000], ids=['indexed', 'partly-scanned', 'scanned'])
+def conversation(make_db, request):
+    db = make_db(search_scan_rows=request.param)
+    conversation_id = db.create_conversation('u1')
+    for content in MESSAGES:
+        db.add_message(conversation_id, 'u1', content)
+    return db, conversation_id
+
+@pytest.mark.parametrize('keywords', [
+    ['deploy'], ['PLOY'], ['eploying the'], ['"hi"'], ['部署完'], ['kubernetes'], ['deploy', 'upload'],
+    # Too short for a trigram, or LIKE wildcards: scanned with LIKE
+    ['ab'], ['部署'], ['a_b'], ['%'],
+])
+def test_keywords_match_substrings_like_like(conversation, keywords):
+    db, conversation_id = conversation
+    assert [m['content'] for m in db.get_messages(conversation_id, keywords)] == like(keywords)
+
+def test_blank_keywords_are_ignored(conversation):
+    db, conversation_id = conversation
+    assert [m['content'] for m in db.get_messages(conversation_id, ['deploy', ' '])] == like(['deploy'])
+    assert len(db.get_messages(conversation_id, ['', '  '])) == len(MESSAGES)
+
+def test_ranked_matches_are_highlighted(conversation):
+    db, conversation_id = conversation
+    messages = db.get_messages(conversation_id, ['deploy'], rank=True, highlight=True)
+    assert sorted(m['content'] for m in messages) == ['Deploying the pipeline', 'redeploy now']
+    assert {m['snippet'] for m in messages} == {'re<mark>deploy</mark> now', '<mark>Deploy</mark>ing the pipe...'}
+
+@pytest.mark.parametrize('keywords', [['e'], ['her', 'load']])
+def test_keyword_pages_follow_cursors(conversation, keywords):
+    db, conversation_id = conversation
+    first = db.get_messages(conversation_id, keywords, limit=2)
+    rest = db.get_messages(conversation_id, keywords, after=db.encode_cursor(first[-1]))
+    assert [m['content'] for m in first + rest] == like(keywords)
+    last = db.get_messages(conversation_id, keywords, limit=2, before=db.encode_cursor(rest[-1]))
+    assert [m['content'] for m in last] == like(keywords)[-3:-1]
+
+def test_version_1_search_index_is_migrated(make_db, tmp_path):
+    db = make_db('v1.db')
+    conversation_id = db.create_conversation('u1')
+    db.add_message(conversation_id, 'u1', 'redeploy now')
+    db.close()
+    # Put back the unicode61 index and version of schema 1
+    conn = sqlite3.connect(tmp_path / 'v1.db')
+    conn.execute('DROP TABLE messages_fts')
+    conn.execute("CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='rowid')")
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    db = make_db('v1.db', search_scan_rows=0)
+    assert db._fetchall('PRAGMA user_version') == [(2,)]
+    assert [m['content'] for m in db.get_messages(conversation_id, ['ploy'])] == ['redeploy now']
+    db.add_message(conversation_id, 'u1', 'deployment done')
+    assert [m['content'] for m in db.get_messages(conversation_id, ['ploym'])] == ['deployment done']
@@ -0,0 +1,121 @@
+import asyncio
+import base64
+import importlib
+import random
+import sys
+import types
+import uuid
+
+import pytest
+
+from app.clients.async_db import AsyncConversationDB
+
+START_MS = 1_780_000_000_000
+
+def encoded(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+MALFORMED = [
+    'not base64!', 'é', encoded('not json'), encoded('{"a": 1}'), encoded('[1]'), encoded('[1, "a", 2]'),
+    encoded('["soon", "a"]'), encoded('[1, 2]'), encoded('[1, null]'), encoded('[Infinity, "a"]'),
+    encoded('[1e30, "a"]'), encoded('[9223372036854775808, "a"]'),
+]
+
+@pytest.fixture
+def conversation(make_db):
+    """A conversation of 23 messages, most sharing their timestamp with others."""
+    db = make_db()
+    rng = random.Random(0)
+    db.import_records([{'type': 'conversation', 'id': 'c1', 'user_id': 'u1'}] + [
+        {
+            'type': 'message',
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'conversation_id': 'c1',
+            'user_id': 'u1',
+            'content': f'message {i}',
+            'created_at_ms': START_MS + (i // 5) * 1000,
+        }
+        for i in range(23)
+    ])
+    return db, [m['id'] for m in db.get_messages('c1')]
+
+def test_messages_are_ordered_by_time_then_id(conversation):
+    db, ids = conversation
+    messages = db.get_messages('c1')
+    assert [(m['created_at_ms'], m['id']) for m in messages] == sorted((m['created_at_ms'], m['id']) for m in messages)
+    assert len(set(ids)) == 23
+
+@pytest.mark.parametrize('limit', [1, 4, 5, 7])
+def test_pages_cover_tied_timestamps_without_duplicates_or_gaps(conversation, limit):
+    db, ids = conversation
+    forward, page = [], db.get_messages('c1', limit=limit)
+    while page:
+        forward.append([m['id'] for m in page])
+        page = db.get_messages('c1', limit=limit, after=db.encode_cursor(page[-1]))
+    assert sum(forward, []) == ids
+
+    backward, page = [], db.get_messages('c1', limit=limit, before=db.encode_cursor(db.get_messages('c1')[-1]))
+    while page:
+        backward.insert(0, [m['id'] for m in page])
+        page = db.get_messages('c1', limit=limit, before=db.encode_cursor(page[0]))
+    assert sum(backward, []) == ids[:-1]
+
+@pytest.mark.parametrize('cursor', MALFORMED)
+def test_malformed_cursors_are_rejected(conversation, cursor):
+    db, _ = conversation
+    with pytest.raises(ValueError, match='Invalid message cursor'):
+        db.get_messages('c1', limit=5, after=cursor)
+
+@pytest.fixture
+def router(conversation, monkeypatch):
+    """The conversations router on the `conversation` database, with the model modules stubbed out."""
+    if sys.version_info < (3, 12):
+        pytest.skip("the router uses PEP 701 f-strings")
+    monkeypatch.setitem(sys.modules, 'app.graph', types.SimpleNamespace(GRAPH=None))
+    monkeypatch.setitem(sys.modules, 'app.evaluate', types.SimpleNamespace(evaluate_answer=None, summarize_messages=None))
+    monkeypatch.delitem(sys.modules, 'app.routers.conversations', raising=False)
+    async_db = AsyncConversationDB(conversation[0], max_workers=1, analytics_workers=1)
+    monkeypatch.setattr(sys.modules['app.clients'], 'ASYNC_CONVERSATION_DB', async_db, raising=False)
+    # Imported afresh, so the router binds this test's database
+    yield importlib.import_module('app.routers.conversations')
+    async_db.close()
+
+def page(router, limit=None, before=None, after=None, keywords=None, rank=False):
+    return asyncio.run(router.get_messages(
+        'c1', keywords=keywords, rank=rank, highlight=False, limit=limit, before=before, after=after
+    ))
+
+@pytest.mark.parametrize('limit', [4, 23, 30])
+def test_route_walks_forward_and_back_through_every_page(router, conversation, limit):
+    _, ids = conversation
+    pages = [page(router, limit)]
+    assert pages[0].prev_cursor is None
+    while pages[-1].next_cursor:
+        pages.append(page(router, limit, after=pages[-1].next_cursor))
+    assert [m.id for p in pages for m in p.messages] == ids
+    # The last page has no cursor past it, even when it is full
+    assert pages[-1].messages and pages[-1].next_cursor is None
+
+    back = [page(router, limit, before=pages[-1].prev_cursor)] if pages[-1].prev_cursor else []
+    while back and back[0].prev_cursor:
+        back.insert(0, page(router, limit, before=back[0].prev_cursor))
+    assert [m.id for p in back + pages[-1:] for m in p.messages] == ids
+    assert all(p.next_cursor for p in back)
+
+def test_route_without_a_limit_has_no_cursors(router, conversation):
+    response = page(router)
+    assert len(response.messages) == 23
+    assert (response.prev_cursor, response.next_cursor) == (None, None)
+
+def test_ranked_pages_have_no_cursors(router):
+    response = page(router, limit=2, keywords=['message'], rank=True)
+    assert len(response.messages) == 2
+    assert (response.prev_cursor, response.next_cursor) == (None, None)
+
+@pytest.mark.parametrize('cursor', MALFORMED)
+def test_malformed_cursor_is_a_bad_request(router, cursor):
+    for kwargs in ({'before': cursor}, {'after': cursor}):
+        with pytest.raises(router.HTTPException) as raised:
+            page(router, 5, **kwargs)
+        assert raised.value.status_code == 400
+        assert 'Invalid message cursor' in raised.value.detail
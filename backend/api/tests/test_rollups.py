@@ -0,0 +1,206 @@
+import random
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import pytest
+
+from app.clients.db import ConversationDB
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+NOW = int(datetime(2026, 6, 15, 13, 37, 12, 345000, tzinfo=timezone.utc).timestamp() * 1000)
+
+WORDS = ['deploy', 'cache', 'index', 'retry', 'shard', 'quota']
+CITATIONS = ['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf']
+
+class Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+def event(rng, ts: int) -> dict:
+    return {
+        'type': 'event',
+        'conversation_id': f'c{rng.randrange(4)}',
+        'user_id': f'u{rng.randrange(12)}',
+        'query': ' '.join(rng.sample(WORDS, rng.randint(1, 3))),
+        'score': rng.choice([None, 0.0, 0.25, 0.5, 0.875, 1.0]),
+        'citations': rng.sample(CITATIONS, rng.randint(0, 2)),
+        'ts': ts,
+    }
+
+def seed(db, days: int, count: int = 1500):
+    rng = random.Random(days)
+    # Events on the edges of the 7-day window and its first full hour and day
+    cutoff = NOW - 7 * DAY_MS
+    edges = [
+        cutoff - 1, cutoff, cutoff + 1,
+        cutoff + (-cutoff) % HOUR_MS - 1, cutoff + (-cutoff) % HOUR_MS,
+        cutoff + (-cutoff) % DAY_MS - 1, cutoff + (-cutoff) % DAY_MS,
+        NOW - NOW % HOUR_MS, NOW,
+    ]
+    db.import_records(
+        [{'type': 'conversation', 'id': f'c{i}', 'user_id': 'admin'} for i in range(4)]
+        + [event(rng, NOW - rng.randrange(days * DAY_MS)) for _ in range(count)]
+        + [event(rng, ts) for ts in edges],
+        batch_size=400
+    )
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ConversationDB, '_now_ms', staticmethod(clock))
+    return clock
+
+@pytest.fixture
+def db(make_db, clock):
+    return make_db(analytics_cache_size=0, analytics_engine='sql')
+
+class RawEvents:
+    """The analytics answers computed in Python from the rows of `events`."""
+
+    def __init__(self, db):
+        with db.pool.reader() as cursor:
+            cursor.execute('SELECT ts, user_id, conversation_id, score, key_words, citations FROM events')
+            self.rows = cursor.fetchall()
+
+    def select(self, days=None, conversation_id=None):
+        cutoff = None if days is None else NOW - days * DAY_MS
+        return [
+            row for row in self.rows
+            if (cutoff is None or row[0] >= cutoff) and conversation_id in (None, row[2])
+        ]
+
+    @staticmethod
+    def ranked(counts: Counter, limit=None):
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    @staticmethod
+    def split(value):
+        return [token for token in (value or '').split('|') if token]
+
+    @staticmethod
+    def format(ms: int, pattern: str) -> str:
+        return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime(pattern)
+
+    def hourly_query_count(self, days):
+        counts = Counter(self.format(ts, '%Y-%m-%d %H:00:00') for ts, *_ in self.select(days))
+        return [{'hour': hour, 'count': counts[hour]} for hour in sorted(counts)]
+
+    def top_users(self, days=None, limit=10, conversation_id=None):
+        counts = Counter(row[1] for row in self.select(days, conversation_id))
+        return [{'user_id': user_id, 'count': count} for user_id, count in self.ranked(counts, limit)]
+
+    def daily_average_scores(self, days):
+        scores = defaultdict(list)
+        for ts, _, _, score, _, _ in self.select(days):
+            if score is not None and score > 0:
+                scores[self.format(ts, '%Y-%m-%d')].append(score)
+        return [(day, sum(scores[day]) / len(scores[day])) for day in sorted(scores, reverse=True)]
+
+    def daily_user_engagement(self, days):
+        counts = defaultdict(Counter)
+        for ts, user_id, *_ in self.select(days):
+            counts[self.format(ts, '%Y-%m-%d')][user_id] += 1
+        return [
+            {'date': day, 'users': [{'user_id': u, 'count': c} for u, c in self.ranked(counts[day])]}
+            for day in sorted(counts, reverse=True)
+        ]
+
+    def citation_counts(self, days=None, conversation_id=None):
+        counts = Counter(
+            citation
+            for *_, citations in self.select(days, conversation_id)
+            for citation in self.split(citations)
+        )
+        return [{'citation': citation, 'count': count} for citation, count in self.ranked(counts)]
+
+    def hot_keywords(self, limit=10, days=None, conversation_id=None):
+        counts = Counter(
+            keyword
+            for _, _, _, _, key_words, _ in self.select(days, conversation_id)
+            for keyword in self.split(key_words)
+        )
+        return self.ranked(counts, limit)
+
+    def daily_top_keywords(self, days, limit):
+        counts = defaultdict(Counter)
+        for ts, _, _, _, key_words, _ in self.select(days):
+            for keyword in self.split(key_words):
+                counts[self.format(ts, '%Y-%m-%d')][keyword] += 1
+        return [
+            {'date': day, 'keywords': [{'keyword': k, 'count': c} for k, c in self.ranked(counts[day], limit)]}
+            for day in sorted(counts, reverse=True)
+        ]
+
+def assert_average_scores(actual, expected):
+    assert [row['date'] for row in actual] == [day for day, _ in expected]
+    for row, (_, average) in zip(actual, expected):
+        # SQLite rounds halves away from zero
+        assert row['avg_score'] == pytest.approx(average, abs=0.005 + 1e-9)
+
+def assert_windowed_analytics_match(db, raw, days):
+    assert db.get_hourly_query_count(days) == raw.hourly_query_count(days)
+    assert db.get_top_users(days, 5) == raw.top_users(days, 5)
+    assert db.get_top_users(days, 5, 'c1') == raw.top_users(days, 5, 'c1')
+    assert_average_scores(db.get_daily_average_scores(days), raw.daily_average_scores(days))
+    assert db.get_daily_user_engagement(days) == raw.daily_user_engagement(days)
+    assert db.get_citation_counts(days) == raw.citation_counts(days)
+    assert db.get_citation_counts(days, 'c2') == raw.citation_counts(days, 'c2')
+    assert db.get_daily_top_keywords(days, 3) == raw.daily_top_keywords(days, 3)
+
+    dashboard = db.get_dashboard(days, 5)
+    assert dashboard['hot_keywords'] == raw.hot_keywords(5, days)
+    assert dashboard['top_users'] == raw.top_users(days, 5)
+    assert dashboard['hourly_query_count'] == raw.hourly_query_count(days)
+    assert dashboard['citation_counts'] == raw.citation_counts(days)
+    assert_average_scores(dashboard['daily_scores'], raw.daily_average_scores(days))
+    assert dashboard['daily_top_keywords'] == raw.daily_top_keywords(days, 5)
+    assert dashboard['daily_user_engagement'] == raw.daily_user_engagement(days)
+
+def assert_all_time_analytics_match(db, raw):
+    assert db.get_top_users(limit=20) == raw.top_users(limit=20)
+    assert db.get_top_users(limit=20, conversation_id='c3') == raw.top_users(limit=20, conversation_id='c3')
+    assert db.get_citation_counts() == raw.citation_counts()
+    assert db.get_hot_keywords(20) == raw.hot_keywords(20)
+    assert db.get_hot_keywords(3, 'c0') == raw.hot_keywords(3, conversation_id='c0')
+
+@pytest.mark.parametrize('days', [1, 7, 30])
+def test_imported_rollups_match_the_raw_events(db, days):
+    seed(db, 10)
+    raw = RawEvents(db)
+    assert_windowed_analytics_match(db, raw, days)
+    assert_all_time_analytics_match(db, raw)
+
+def test_live_writes_keep_the_rollups_in_step(db, clock):
+    seed(db, 10, count=300)
+    conversation_id = db.create_conversation('u1')
+    # Writes landing in earlier hours, days and an existing bucket
+    for offset in (0, 1, HOUR_MS, 5 * HOUR_MS + 1, DAY_MS + 7, 7 * DAY_MS - 1):
+        clock.now = NOW - offset
+        db.create_event('u1', conversation_id, 'cache retry', 0.5, ['a.pdf'])
+        db.add_message_with_response_and_event(
+            conversation_id, 'question', 'u2', 'answer', 'shard index', 0.875, ['b.pdf', 'c.pdf']
+        )
+    clock.now = NOW
+    raw = RawEvents(db)
+    for days in (1, 7):
+        assert_windowed_analytics_match(db, raw, days)
+    assert_all_time_analytics_match(db, raw)
+
+    db.rebuild_rollups()
+    for days in (1, 7):
+        assert_windowed_analytics_match(db, raw, days)
+    assert_all_time_analytics_match(db, raw)
+
+def test_compacted_months_keep_their_totals(db, tmp_path):
+    seed(db, 100)
+    raw = RawEvents(db)
+    compacted = db.compact_partitions(retention_days=30, archive_dir=str(tmp_path / 'archive'))
+    assert [result['month'] for result in compacted] == ['2026-03', '2026-04']
+    # The raw events of March and April are gone, but not their counts
+    assert len(RawEvents(db).rows) < len(raw.rows)
+    assert_all_time_analytics_match(db, raw)
+    assert_windowed_analytics_match(db, raw, 7)
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from starlette.requests import Request
+
+from app.uploads import UploadTooLarge, part_file_path, remove_partial_uploads, stream_upload
+
+BOUNDARY = 'test-boundary'
+
+def multipart(content: bytes, field: str = 'file', file_name: str = 'notes.txt') -> bytes:
+    return (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+        'Content-Type: text/plain\r\n\r\n'
+    ).encode() + content + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+def request(body: bytes, chunk: int = 7, content_length=None, on_chunk=None) -> Request:
+    """Request whose body arrives `chunk` bytes at a time; `on_chunk` runs before each one."""
+    chunks = [body[start:start + chunk] for start in range(0, len(body), chunk)]
+    headers = [(b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode())]
+    if content_length is not None:
+        headers.append((b'content-length', str(content_length).encode()))
+
+    async def receive():
+        if on_chunk:
+            on_chunk()
+        data = chunks.pop(0) if chunks else b''
+        return {'type': 'http.request', 'body': data, 'more_body': bool(chunks)}
+    return Request({'type': 'http', 'method': 'POST', 'headers': headers}, receive)
+
+def upload(tmp_path, req, max_bytes: int = 1024):
+    return asyncio.run(stream_upload(req, 'file', lambda name: str(tmp_path / f'12345_{name}'), max_bytes))
+
+def test_upload_is_renamed_into_place_when_complete(tmp_path):
+    content = b'hello upload ' * 20
+    final = tmp_path / '12345_notes.txt'
+    seen = []
+
+    def on_chunk():
+        seen.append((final.exists(), os.path.exists(part_file_path(str(final)))))
+
+    result = upload(tmp_path, request(multipart(content), on_chunk=on_chunk))
+    assert result.file_name == 'notes.txt'
+    assert result.file_path == str(final)
+    assert result.size == len(content)
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+    assert final.read_bytes() == content
+    assert os.listdir(tmp_path) == ['12345_notes.txt']
+    # Only the .part file exists while the body is arriving
+    assert (False, True) in seen
+    assert not any(exists for exists, _ in seen)
+
+def test_upload_past_the_size_limit_is_removed(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        upload(tmp_path, request(multipart(b'x' * 2000)))
+    assert os.listdir(tmp_path) == []
+
+def test_content_length_over_the_limit_is_rejected_before_reading(tmp_path):
+    def on_chunk():
+        raise AssertionError("body read")
+
+    with pytest.raises(UploadTooLarge):
+        upload(tmp_path, request(multipart(b'x'), content_length=1024 + 65 * 1024, on_chunk=on_chunk))
+
+def test_truncated_body_leaves_no_file(tmp_path):
+    body = multipart(b'x' * 500)
+    with pytest.raises(ValueError):
+        upload(tmp_path, request(body[:300]))
+    assert os.listdir(tmp_path) == []
+
+def test_missing_file_field_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="No file in form field 'file'"):
+        upload(tmp_path, request(multipart(b'data', field='other')))
+    assert os.listdir(tmp_path) == []
+
+def test_existing_file_is_never_overwritten(tmp_path):
+    (tmp_path / '12345_notes.txt').write_bytes(b'original')
+    with pytest.raises(FileExistsError):
+        upload(tmp_path, request(multipart(b'new')))
+    assert os.listdir(tmp_path) == ['12345_notes.txt']
+    assert (tmp_path / '12345_notes.txt').read_bytes() == b'original'
+
+def test_partial_uploads_are_removed(tmp_path):
+    (tmp_path / '.12345_notes.txt.part').write_bytes(b'torn')
+    (tmp_path / '12345_done.txt').write_bytes(b'done')
+    assert remove_partial_uploads(str(tmp_path)) == 1
+    assert os.listdir(tmp_path) == ['12345_done.txt']
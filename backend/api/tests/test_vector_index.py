@@ -0,0 +1,91 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.embedding_store import EmbeddingStore
+from app.vector_index import IVFIndex
+
+class HeldIVFIndex(IVFIndex):
+    """IVFIndex whose trainings wait for `release`, so a test controls when a generation finishes."""
+
+    def __init__(self, *args, **kwargs):
+        self.release = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _train(self, matrix):
+        assert self.release.wait(10)
+        return super()._train(matrix)
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    yield store
+    store.close()
+
+def add(store, rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    store.append(rng.standard_normal((rows, 16), dtype=np.float32), [{'id': i} for i in range(rows)])
+
+def assert_indexes_every_row(index):
+    rows = np.sort(np.concatenate([column.view() for column in index._state.lists]))
+    assert rows.tolist() == list(range(len(index.store)))
+
+def test_training_runs_in_the_background(store):
+    index = HeldIVFIndex(store, nlist=8, nprobe=8, min_rows=200)
+    add(store, 250, 0)
+    index.update()
+    # Exact search until the first generation is in
+    query = np.ones(16)
+    assert index._state is None
+    assert index.search(query, 5) == store.search(query, 5)
+    add(store, 50, 1)
+    index.update()
+
+    index.release.set()
+    assert index.wait_for_training(10)
+    assert index._state.generation == 0
+    assert index._state.trained_rows == 250
+    assert_indexes_every_row(index)
+    # nprobe == nlist scans every list, so it matches exact search
+    assert index.search(query, 5) == store.search(query, 5)
+
+def test_retraining_keeps_the_previous_generation_serving(store, tmp_path):
+    index = HeldIVFIndex(store, nlist=8, min_rows=100)
+    index.release.set()
+    add(store, 100, 0)
+    index.update()
+    assert index.wait_for_training(10)
+
+    index.release.clear()
+    add(store, 350, 1)
+    index.update()
+    add(store, 50, 2)
+    index.update()
+    # Generation 0 still indexes the appended rows while 1 trains
+    assert index._state.generation == 0
+    assert_indexes_every_row(index)
+
+    index.release.set()
+    assert index.wait_for_training(10)
+    assert index._state.generation == 1
+    assert index._state.trained_rows == 450
+    assert_indexes_every_row(index)
+    assert not any('.0.' in name for name in os.listdir(tmp_path))
+
+    reopened = IVFIndex(store, nlist=8, min_rows=100)
+    assert reopened._state.generation == 1
+    assert_indexes_every_row(reopened)
+
+def test_unfinished_generations_are_removed_on_open(store, tmp_path):
+    add(store, 100, 0)
+    IVFIndex(store, nlist=4, min_rows=100, background=False)
+    # Files of a training interrupted before it was swapped in
+    for name in ('ivf_centroids.1.f32', 'ivf_assign.1.i32', 'ivf_meta.json.tmp'):
+        (tmp_path / name).write_bytes(b'')
+    index = IVFIndex(store, nlist=4, min_rows=100)
+    assert index._state.generation == 0
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith('ivf_')) == [
+        'ivf_assign.0.i32', 'ivf_centroids.0.f32', 'ivf_meta.json'
+    ]